@@ -2,6 +2,8 @@
 ASGI config for plant_wms project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve through this (e.g. ``uvicorn plant_wms.asgi:application``) so the live
+dashboard streams (warehouse/live.py) are coroutines rather than threads.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
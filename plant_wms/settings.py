@@ -56,11 +56,14 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     #'warehouse.middleware.DebugCSRFOriginMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    # WhiteNoise, async-capable so ASGI requests don't hold a thread
+    'warehouse.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Server-Timing header, per-view stats, ?profile=1 for staff
+    'warehouse.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     
@@ -90,13 +93,125 @@ WSGI_APPLICATION = 'plant_wms.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# SQLite by default.  For a server database set DB_ENGINE (postgresql, mysql)
+# and DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT.  DB_REPLICA_HOST (or
+# DB_REPLICA_NAME) adds a "replica" alias with the same credentials, which
+# warehouse/routers.py sends the read-heavy pages to.
+DB_ENGINE = env("DB_ENGINE", "sqlite3")
+DB_NAME   = env("DB_NAME", BASE_DIR / 'db.sqlite3' if DB_ENGINE == "sqlite3" else "its")
+
+# Server connections: kept open DB_CONN_MAX_AGE seconds and health-checked
+# before reuse, or, on PostgreSQL with DB_POOL=True, drawn from a psycopg
+# pool of DB_POOL_MIN–DB_POOL_MAX per worker (needs psycopg[pool])
+DB_CONN_MAX_AGE = env("DB_CONN_MAX_AGE", 60, cast=int)
+DB_POOL         = env("DB_POOL", "False", cast=lambda v: v.lower() == "true")
+DB_POOL_MIN     = env("DB_POOL_MIN", 2, cast=int)
+DB_POOL_MAX     = env("DB_POOL_MAX", 10, cast=int)
+
+# SQLite tuned for many scanners at once (SQLITE_TUNING=False for the stock
+# setup).  WAL lets dashboard and export reads run alongside scan writes;
+# IMMEDIATE transactions take the write lock at BEGIN, so a scan waits up to
+# SQLITE_BUSY_TIMEOUT ms for it instead of failing "database is locked" when
+# its read turns into a write.  synchronous=NORMAL is safe under WAL (a power
+# cut can lose the last commits, not corrupt the file).
+SQLITE_TUNING       = env("SQLITE_TUNING", "True", cast=lambda v: v.lower() == "true")
+SQLITE_BUSY_TIMEOUT = env("SQLITE_BUSY_TIMEOUT", 20000, cast=int)
+SQLITE_MMAP_SIZE    = env("SQLITE_MMAP_SIZE", 256 * 1024 * 1024, cast=int)
+SQLITE_CACHE_KB     = env("SQLITE_CACHE_KB", 64 * 1024, cast=int)
+
+
+def _database(name, host):
+    db = {'ENGINE': f'django.db.backends.{DB_ENGINE}', 'NAME': name}
+    if DB_ENGINE == "sqlite3":
+        if SQLITE_TUNING:
+            db['OPTIONS'] = {
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': ';'.join([
+                    'PRAGMA journal_mode=WAL',
+                    'PRAGMA synchronous=NORMAL',
+                    f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}',
+                    f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}',
+                    f'PRAGMA cache_size=-{SQLITE_CACHE_KB}',
+                    'PRAGMA temp_store=MEMORY',
+                ]),
+            }
+        return db
+    db.update({
+        'USER':     env("DB_USER", ""),
+        'PASSWORD': env("DB_PASSWORD", ""),
+        'HOST':     host,
+        'PORT':     env("DB_PORT", ""),
+        'CONN_MAX_AGE':       DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    })
+    if DB_ENGINE == "postgresql" and DB_POOL:
+        # the pool keeps the connections; Django must not hold on to them
+        db['CONN_MAX_AGE'] = 0
+        db['OPTIONS'] = {'pool': {'min_size': DB_POOL_MIN, 'max_size': DB_POOL_MAX}}
+    return db
+
+
+DATABASES = {'default': _database(DB_NAME, env("DB_HOST", ""))}
+if env("DB_REPLICA_HOST") or env("DB_REPLICA_NAME"):
+    DATABASES['replica'] = {
+        **_database(env("DB_REPLICA_NAME", DB_NAME), env("DB_REPLICA_HOST", env("DB_HOST", ""))),
+        # tests run against the primary's test database only
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['warehouse.routers.PrimaryReplicaRouter']
+
+# Scan commits of one process queue for the write lock in Python, one at a
+# time, rather than polling for it in SQLite's busy handler (see stock.py);
+# a scan that waits longer than SCAN_WRITE_QUEUE_WAIT seconds is refused
+# as busy, and the handheld sends it again
+SCAN_WRITE_QUEUE      = env("SCAN_WRITE_QUEUE", str(SQLITE_TUNING), cast=lambda v: v.lower() == "true")
+SCAN_WRITE_QUEUE_WAIT = env("SCAN_WRITE_QUEUE_WAIT", 15, cast=float)
+
+# Cache (access contexts, reference data). Point this at a shared backend,
+# e.g. DJANGO_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# with DJANGO_CACHE_LOCATION=/var/tmp/its-cache, when running several workers.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND':  env("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': env("DJANGO_CACHE_LOCATION", "its-default"),
     }
 }
 
+# Seconds a user's resolved roles/department stay cached (see warehouse/access.py)
+ACCESS_CACHE_TIMEOUT = env("ACCESS_CACHE_TIMEOUT", 300, cast=int)
+
+# Seconds the “about N rolls” total on the print search screen is cached (0 = off)
+PRINT_SEARCH_TOTAL_TTL = env("PRINT_SEARCH_TOTAL_TTL", 60, cast=int)
+
+# Scans older than this many days move to TransactionArchive (see archive.py);
+# each roll's latest scan per action/location always stays in the hot table
+TRANSACTION_RETENTION_DAYS = env("TRANSACTION_RETENTION_DAYS", 180, cast=int)
+
+# How long a stored Idempotency-Key answers retries (seconds), and how long
+# an identical (roll, action, location) scan is folded into the first one
+IDEMPOTENCY_KEY_TTL = env("IDEMPOTENCY_KEY_TTL", 24 * 3600, cast=int)
+SCAN_DEDUP_WINDOW   = env("SCAN_DEDUP_WINDOW", 10, cast=float)
+
+# Change feed (see warehouse/changes.py): days of history kept for clients
+# to catch up from, and how long a gap in the sequence is waited on
+CHANGELOG_RETENTION_DAYS = env("CHANGELOG_RETENTION_DAYS", 7, cast=int)
+CHANGES_SETTLE           = env("CHANGES_SETTLE", 5, cast=float)
+
+# Live dashboard (see warehouse/live.py).  LIVE_LAYER decides which scans
+# reach the streams: LocalLayer (this process) or ChangeLogLayer (any
+# process, polled every LIVE_POLL_INTERVAL seconds)
+LIVE_LAYER         = env("LIVE_LAYER", "warehouse.live.LocalLayer")
+LIVE_DEBOUNCE      = env("LIVE_DEBOUNCE", 0.25, cast=float)
+LIVE_POLL_INTERVAL = env("LIVE_POLL_INTERVAL", 1, cast=float)
+
+# Request profiling (warehouse/middleware.py): on/off, and how many recent
+# requests per view the in-memory stats table keeps
+PROFILING_ENABLED = env("PROFILING_ENABLED", "True", cast=lambda v: v.lower() == "true")
+PROFILING_WINDOW  = env("PROFILING_WINDOW", 500, cast=int)
+
+# Bearer token Prometheus presents at /metrics (empty: staff sessions only)
+METRICS_TOKEN = env("METRICS_TOKEN", "")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
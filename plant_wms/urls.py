@@ -3,8 +3,14 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from warehouse.views import (
     MaterialViewSet, BatchViewSet, CustomerViewSet,
-    RollViewSet, LocationViewSet, TransactionViewSet, SignUpView
+    RollViewSet, LocationViewSet, TransactionViewSet, SignUpView,
+    AutocompleteView,
+    StockAsOfView,
+    ChangesView,
+    ProfilingStatsView,
+    MetricsView,
 )
+from warehouse import scan_api
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -34,6 +40,17 @@ urlpatterns = [
     path('accounts/', include('django.contrib.auth.urls')),
     # your signup view (we’ll add shortly)
     path('accounts/signup/', SignUpView.as_view(), name='signup'),
+    path('api/autocomplete/<str:kind>/', AutocompleteView.as_view(), name='autocomplete'),
+    path('api/stock/as-of/', StockAsOfView.as_view(), name='stock-as-of'),
+    path('api/changes/', ChangesView.as_view(), name='changes'),
+    path('api/profiling/', ProfilingStatsView.as_view(), name='profiling-stats'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    # async scan endpoints (warehouse/scan_api.py), for the ASGI app
+    path('api/scan/rolls/<uuid:roll_id>/', scan_api.verify_roll, name='scan-api-roll'),
+    path('api/scan/rolls/<uuid:roll_id>/qr.png', scan_api.roll_qr, name='scan-api-roll-qr'),
+    path('api/scan/rolls/<uuid:roll_id>/print/', scan_api.print_label, name='scan-api-print'),
+    path('api/scan/locations/<str:code>/rolls/', scan_api.location_rolls, name='scan-api-location-rolls'),
+    path('api/scan/transactions/', scan_api.commit, name='scan-api-commit'),
     path('api/', include(router.urls)),
     path('', include('warehouse.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
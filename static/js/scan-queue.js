@@ -0,0 +1,147 @@
+/* static/js/scan-queue.js
+ *
+ * Durable queue for scans.  Every scan is written to IndexedDB first and
+ * then uploaded in batches to /api/transactions/sync/, so a scan made in a
+ * dead spot of the plant is kept until the handheld is back on Wi‑Fi.
+ *
+ * Loaded by the mobile pages and by the service worker (scan-sw.js), so it
+ * only uses what both a window and a worker have.
+ */
+(function (scope) {
+  const DB_NAME  = 'its-scans';
+  const STORE    = 'queue';
+  const SYNC_URL = '/api/transactions/sync/';
+  const BATCH    = 100;                 // server takes up to 200 per call
+  // outcomes the server won't change its mind about; anything else is retried
+  const FINAL    = ['applied', 'duplicate', 'conflict', 'rejected', 'invalid'];
+  const OK       = ['applied', 'duplicate'];
+
+  function openDb() {
+    return new Promise((resolve, reject) => {
+      const req = indexedDB.open(DB_NAME, 1);
+      req.onupgradeneeded = () => req.result.createObjectStore(STORE, { keyPath: 'id' });
+      req.onsuccess = () => resolve(req.result);
+      req.onerror   = () => reject(req.error);
+    });
+  }
+
+  // run fn(store) in one IndexedDB transaction; resolves with the request result
+  function withStore(mode, fn) {
+    return openDb().then(db => new Promise((resolve, reject) => {
+      const t   = db.transaction(STORE, mode);
+      const req = fn(t.objectStore(STORE));
+      t.oncomplete = () => { db.close(); resolve(req ? req.result : undefined); };
+      t.onerror    = () => { db.close(); reject(t.error); };
+    }));
+  }
+
+  function changed() {
+    scope.dispatchEvent(new Event('scanqueue:change'));
+  }
+
+  function newId() {
+    return (scope.crypto && crypto.randomUUID)
+      ? crypto.randomUUID()
+      : Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+  }
+
+  let flushing = null;
+  const awaiting = new Set();       // ids a submit() call reports on itself
+
+  const ScanQueue = {
+    /* Queue scans ({roll, action, location?, customer?, user}) and try to
+     * send them now.  Resolves with {sent, results, failed}: sent is false
+     * when they stayed queued for later. */
+    async submit(scans, csrf) {
+      const now     = new Date().toISOString();
+      const entries = scans.map(s => Object.assign(
+        { id: newId(), scanned_at: now, csrf: csrf || '' }, s));
+      await withStore('readwrite', store => { entries.forEach(e => store.put(e)); });
+      changed();
+      ScanQueue.requestSync();
+
+      let byId = {};
+      entries.forEach(e => awaiting.add(e.id));
+      try {
+        byId = await ScanQueue.flush();
+      } catch (e) {
+        console.warn('[SCANQ] offline, queued', entries.length, e);
+      } finally {
+        entries.forEach(e => awaiting.delete(e.id));
+      }
+      const results = entries.map(e => byId[e.id]).filter(Boolean);
+      return {
+        sent:    results.length === entries.length,
+        results: results,
+        failed:  results.filter(r => !OK.includes(r.status)),
+      };
+    },
+
+    pending() {
+      return withStore('readonly', store => store.count());
+    },
+
+    /* Upload everything queued, oldest first.  Resolves with {id: outcome}
+     * for what the server answered; rejects if it couldn't be reached. */
+    flush() {
+      if (!flushing) {
+        flushing = ScanQueue._flush().finally(() => { flushing = null; });
+      }
+      return flushing;
+    },
+
+    async _flush() {
+      const queued = (await withStore('readonly', store => store.getAll()) || [])
+        .sort((a, b) => a.scanned_at.localeCompare(b.scanned_at));
+      const byId = {};
+      for (let i = 0; i < queued.length; i += BATCH) {
+        const batch = queued.slice(i, i + BATCH);
+        const res = await fetch(SYNC_URL, {
+          method: 'POST',
+          credentials: 'same-origin',
+          headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': batch[batch.length - 1].csrf,
+          },
+          body: JSON.stringify({
+            scans: batch.map(({ csrf, ...scan }) => scan),
+          }),
+        });
+        if (!res.ok) throw new Error(`sync failed: HTTP ${res.status}`);
+
+        const { results } = await res.json();
+        const done = results.filter(r => FINAL.includes(r.status)).map(r => r.id);
+        await withStore('readwrite', store => { done.forEach(id => store.delete(id)); });
+        changed();
+        results.forEach(r => { byId[r.id] = r; });
+        // outcomes of scans queued earlier; nobody is waiting on these
+        const late = results.filter(r => !awaiting.has(r.id));
+        if (late.length) {
+          scope.dispatchEvent(new CustomEvent('scanqueue:result', { detail: late }));
+        }
+      }
+      return byId;
+    },
+
+    requestSync() {
+      // Background Sync lets the service worker upload with the page closed
+      if (scope.navigator && navigator.serviceWorker && 'SyncManager' in scope) {
+        navigator.serviceWorker.ready
+          .then(reg => reg.sync.register('scan-sync'))
+          .catch(() => {});
+      }
+    },
+  };
+
+  scope.ScanQueue = ScanQueue;
+
+  // pages: retry when the connection comes back and every half minute
+  if (typeof scope.document !== 'undefined') {
+    const retry = () => ScanQueue.pending()
+      .then(n => n && ScanQueue.flush())
+      .catch(() => {});
+    scope.addEventListener('online', retry);
+    setInterval(retry, 30000);
+    retry();
+  }
+})(self);
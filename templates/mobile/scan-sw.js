@@ -0,0 +1,61 @@
+{% load static %}/* Service worker for the scan pages (served at /scan-sw.js for root scope).
+ *
+ * Keeps the scan pages usable without signal: the page shell is served
+ * from cache when the network is down, and queued scans are uploaded by
+ * Background Sync even after the page was closed.  /api/ is never cached.
+ */
+importScripts('{% static "js/scan-queue.js" %}');
+
+const SHELL_CACHE = 'its-shell-v1';
+const SHELL = [
+  '/scan/qa/', '/scan/store/', '/scan/dispatch/', '/scan/view/',
+  '{% static "js/scan-queue.js" %}',
+  'https://unpkg.com/html5-qrcode@2.3.8/html5-qrcode.min.js',
+];
+
+function fetchForCache(url) {
+  const crossOrigin = url.startsWith('http');
+  return fetch(url, crossOrigin ? { mode: 'no-cors' } : { credentials: 'same-origin' })
+    .then(res => (res.ok || res.type === 'opaque') ? res : Promise.reject(res));
+}
+
+self.addEventListener('install', event => {
+  event.waitUntil(caches.open(SHELL_CACHE).then(cache => Promise.all(
+    // one page the user may not open (QA) mustn't fail the install
+    SHELL.map(url => fetchForCache(url).then(res => cache.put(url, res)).catch(() => null))
+  )).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+  event.waitUntil(caches.keys()
+    .then(keys => Promise.all(keys.filter(k => k !== SHELL_CACHE).map(k => caches.delete(k))))
+    .then(() => self.clients.claim()));
+});
+
+self.addEventListener('fetch', event => {
+  const req = event.request;
+  const url = new URL(req.url);
+  if (req.method !== 'GET' || url.pathname.startsWith('/api/')) return;
+
+  if (req.mode === 'navigate' && url.pathname.startsWith('/scan/')) {
+    // network first, so a fresh CSRF token and user; cache when offline
+    event.respondWith(fetch(req).then(res => {
+      if (res.ok && !res.redirected) {
+        const copy = res.clone();
+        caches.open(SHELL_CACHE).then(cache => cache.put(url.pathname, copy));
+      }
+      return res;
+    }).catch(() => caches.match(url.pathname)));
+    return;
+  }
+
+  if (SHELL.includes(req.url) || SHELL.includes(url.pathname)) {
+    event.respondWith(caches.match(req.url).then(hit => hit || fetch(req)));
+  }
+});
+
+self.addEventListener('sync', event => {
+  if (event.tag === 'scan-sync') {
+    event.waitUntil(ScanQueue.flush());
+  }
+});
@@ -0,0 +1,187 @@
+# warehouse/access.py
+"""
+Per-request access context.
+
+Everything the permission checks need about a user – group names, home
+department and the Stock Keeper ``extra_access`` codes – is loaded once,
+kept on the request, and cached across requests under the user's id.
+The cache entry is dropped whenever the user's Profile, group membership
+or a Department changes, so every check after that is a set lookup.
+"""
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Department, Profile
+from .routers import primary
+
+FULL_ACCESS_GROUPS = ('Factory Admin', 'Forklift Driver')
+
+_CACHE_PREFIX  = 'its:access'
+_GENERATION    = f'{_CACHE_PREFIX}:gen'
+_REQUEST_ATTR  = '_its_access'
+
+
+class AccessContext:
+    """
+    Immutable snapshot of a user's roles and department scope.
+    """
+    __slots__ = (
+        'user_id', 'is_superuser', 'groups',
+        'department_id', 'department_code', 'department_name',
+        'extra_access',
+    )
+
+    def __init__(self, user_id=None, is_superuser=False, groups=(),
+                 department_id=None, department_code='', department_name='',
+                 extra_access=()):
+        self.user_id         = user_id
+        self.is_superuser    = is_superuser
+        self.groups          = frozenset(groups)
+        self.department_id   = department_id
+        self.department_code = department_code or ''
+        self.department_name = department_name or ''
+        self.extra_access    = tuple(extra_access)
+
+    def in_group(self, *names):
+        return not self.groups.isdisjoint(names)
+
+    @property
+    def has_full_access(self):
+        """Superuser, Factory Admin or Forklift Driver."""
+        return self.is_superuser or self.in_group(*FULL_ACCESS_GROUPS)
+
+    @property
+    def is_admin(self):
+        """Superuser or Factory Admin (may pick any department)."""
+        return self.is_superuser or self.in_group('Factory Admin')
+
+    @property
+    def has_department(self):
+        return bool(self.department_code)
+
+    @property
+    def department_label(self):
+        """“FM – Film” rather than just “FM”."""
+        return f"{self.department_code} – {self.department_name}"
+
+    @property
+    def allowed_departments(self):
+        """Home department plus extra_access codes for Stock Keepers."""
+        if not self.department_code:
+            return []
+        allowed = [self.department_code]
+        if self.in_group('Stock Keeper'):
+            allowed += list(self.extra_access)
+        return allowed
+
+    # ── cache (de)serialisation ─────────────────────────────────────────
+    def to_tuple(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    @classmethod
+    def from_tuple(cls, values):
+        return cls(*values)
+
+
+ANONYMOUS = AccessContext()
+
+
+def _cache_key(user_id):
+    gen = cache.get_or_set(_GENERATION, 1, None)
+    return f'{_CACHE_PREFIX}:{gen}:{user_id}'
+
+
+@primary()  # cached past the request: never from a lagging replica
+def _load(user):
+    groups = list(user.groups.values_list('name', flat=True))
+    prof = (
+        Profile.objects
+        .filter(user_id=user.pk)
+        .select_related('department')
+        .first()
+    )
+    dept = prof.department if prof else None
+    return AccessContext(
+        user_id         = user.pk,
+        is_superuser    = user.is_superuser,
+        groups          = groups,
+        department_id   = dept.pk if dept else None,
+        department_code = dept.code if dept else '',
+        department_name = dept.name if dept else '',
+        extra_access    = prof.get_extra_access_list() if prof else (),
+    )
+
+
+def get_access(request):
+    """
+    Return the AccessContext for ``request.user``, resolving it at most once
+    per request and at most once per cache lifetime across requests.
+    """
+    ctx = getattr(request, _REQUEST_ATTR, None)
+    if ctx is not None:
+        return ctx
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        ctx = ANONYMOUS
+    else:
+        key    = _cache_key(user.pk)
+        cached = cache.get(key)
+        if cached is not None:
+            ctx = AccessContext.from_tuple(cached)
+        else:
+            ctx = _load(user)
+            cache.set(key, ctx.to_tuple(),
+                      getattr(settings, 'ACCESS_CACHE_TIMEOUT', 300))
+
+    setattr(request, _REQUEST_ATTR, ctx)
+    return ctx
+
+
+def invalidate_user(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def invalidate_all():
+    """Bump the generation so every cached context is ignored."""
+    try:
+        cache.incr(_GENERATION)
+    except ValueError:
+        cache.set(_GENERATION, 1, None)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Invalidation
+# ─────────────────────────────────────────────────────────────────────────────
+
+@receiver([post_save, post_delete], sender=Profile)
+def _profile_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def _user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def _membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_user(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            invalidate_user(user_id)
+    else:
+        # group.user_set.clear(): we don't know who was in it
+        invalidate_all()
+
+
+@receiver([post_save, post_delete], sender=Group)
+@receiver([post_save, post_delete], sender=Department)
+def _names_changed(sender, **kwargs):
+    invalidate_all()
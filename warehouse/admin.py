@@ -2,13 +2,12 @@ from django.contrib import admin
 from django.urls import reverse
 from django.http import HttpResponse
 from io import BytesIO
-import qrcode
-from .models import SiteConfig, ReconciliationLog
+from .models import SiteConfig, ReconciliationLog, TransactionArchive, StockSnapshot
 
 from .models import Material, Batch, Customer, Roll, Location, Transaction, Department, Profile
 import io
 from django.urls import path
-from openpyxl import Workbook
+from . import routers
 
 
 
@@ -60,6 +59,7 @@ def download_location_qr(modeladmin, request, queryset):
         reverse('location-scan', args=[loc.location_code])
     )
     # Generate QR image
+    import qrcode
     img = qrcode.make(url)
     buf = BytesIO()
     img.save(buf, format='PNG')
@@ -79,6 +79,8 @@ class LocationAdmin(admin.ModelAdmin):
         'row',
         'column',
         'type',
+        'roll_count',
+        'total_kg',
     )
     search_fields = ('location_code',)
     list_filter   = ('type', 'department__code')  # you can also filter by dept
@@ -93,9 +95,41 @@ class LocationAdmin(admin.ModelAdmin):
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display  = ('roll', 'action', 'location', 'user', 'scanned_at')
+    list_display  = ('roll', 'action', 'location', 'user', 'department', 'scanned_at')
     search_fields = ('roll__roll_id', 'user', 'action')
-    list_filter   = ('action',)
+    list_filter   = ('action', 'department')
+    list_select_related = ('roll', 'location', 'department')
+
+    # view only: a scan is recorded through stock.commit_scan, which also
+    # moves the roll, the rack counters and the change feed
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # only along with its roll, whose delete page cascades to the scans
+        match = getattr(request, 'resolver_match', None)
+        return (super().has_delete_permission(request, obj) and match is not None
+                and not match.url_name.startswith('warehouse_transaction_'))
+
+
+@admin.register(TransactionArchive)
+class TransactionArchiveAdmin(admin.ModelAdmin):
+    list_display  = ('roll', 'month', 'tx_count', 'archived_at')
+    search_fields = ('roll__roll_id',)
+    date_hierarchy = 'month'
+    exclude       = ('payload',)
+    readonly_fields = ('roll', 'month', 'tx_count', 'archived_at')
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display  = ('taken_at', 'roll_count')
+    date_hierarchy = 'taken_at'
+    exclude       = ('payload',)
+    readonly_fields = ('taken_at', 'roll_count')
 
 
 # Department
@@ -174,6 +208,7 @@ class ReconciliationLogAdmin(admin.ModelAdmin):
 
 # ───  MASTER AUDIT EXPORT VIEW  ───────────────────────────────────────────────
 
+@routers.replica()
 def master_export(request):
     """
     In‑memory Excel export:
@@ -181,6 +216,9 @@ def master_export(request):
       • Sheet2: Full Transactions log
       • Sheet3: Summary aggregates
     """
+    # openpyxl is only needed here; keep it out of every worker's start-up
+    from openpyxl import Workbook
+
     # 1) workbook + first sheet (Materials)
     wb  = Workbook()
     ws1 = wb.active
@@ -193,17 +231,18 @@ def master_export(request):
     ])
     # defer models import until runtime
     from .models import Roll, Transaction
-    for r in Roll.objects.select_related('batch__material'):
-        last_tx = r.transaction_set.order_by('-scanned_at').first()
-        posting_date   = last_tx.scanned_at if last_tx else None
-        dispatch_cust  = (last_tx.customer.name if last_tx and last_tx.action=="DISPATCH" else "")
+    from .serializers import annotate_last_scan
+    # newest scan of each roll as columns of the roll query, not a query per roll
+    for r in annotate_last_scan(Roll.objects.all()):
+        posting_date   = r.last_scan_at
+        dispatch_cust  = (r.last_scan_customer or "") if r.last_scan_action == "DISPATCH" else ""
         ws1.append([
             str(r.roll_id),
             r.batch.material.material_number,
             r.batch.material.description,
             r.batch.batch_number,
             r.weight_kg,
-            r.current_location or "",
+            r.current_location_id or "",
             r.status,
             posting_date.strftime("%Y-%m-%d %H:%M") if posting_date else "",
             dispatch_cust,
@@ -1,16 +1,25 @@
 # warehouse/apps.py
+import time
 
 from django.apps import AppConfig
 from django.core.mail import mail_admins
 from django.db.models import Max
 
+from .routers import replica
+
 # 1) Module‐level: define the job function, but defer all model imports till call time
+@replica()
 def reconcile_roll_counts():
     """
     Compare dashboard vs API roll counts and email ADMINS if they diverge.
+    Reads from the replica when there is one.
     """
     # Now that this is running _after_ Django startup, we can import models safely
     from .models import Transaction, Location, Roll
+    from django.db.models import Count
+    from . import metrics
+
+    started = time.perf_counter()
 
     # 1) Build dashboard counts (latest tx per roll → location)
     latest = (
@@ -20,25 +29,33 @@ def reconcile_roll_counts():
     )
     latest_txs = Transaction.objects.filter(
         scanned_at__in=[l['last_ts'] for l in latest]
-    )
+    ).select_related('location')
 
     dash_map = { loc.location_code: 0 for loc in Location.objects.all() }
     for tx in latest_txs:
         if tx.location:
             dash_map[tx.location.location_code] += 1
 
-    # 2) Build API counts (Roll.current_location)
-    api_map = {
-        loc.location_code: Roll.objects.filter(current_location=loc.location_code).count()
-        for loc in Location.objects.all()
-    }
+    # 2) Build API counts (Roll.current_location), one GROUP BY
+    api_map = dict(
+        Roll.objects.exclude(current_location=None)
+            .values_list('current_location')
+            .annotate(n=Count('id'))
+    )
 
-    # 3) Find mismatches
+    # 3) Find mismatches, including the per-rack occupancy counters
     mismatches = [
         f"{code}: dashboard={dash_map[code]} vs api={api_map.get(code,0)}"
         for code in dash_map
         if dash_map[code] != api_map.get(code,0)
     ]
+    mismatches += [
+        f"{code}: counter={n} vs api={api_map.get(code,0)}"
+        for code, n in Location.objects.values_list('location_code', 'roll_count')
+        if n != api_map.get(code,0)
+    ]
+
+    metrics.reconciled(time.perf_counter() - started, len(mismatches))
 
     # 4) If any, email ADMINS
     if mismatches:
@@ -51,6 +68,9 @@ class WarehouseConfig(AppConfig):
     name = 'warehouse'
 
     def ready(self):
+        # Signal receivers that keep our caches honest
+        from . import access, autocomplete, changes, live, refdata, search, stock  # noqa: F401
+
         # Defer all heavyweight imports until after apps are loaded
         import os
         # Under `runserver`, Django spawns two processes:
@@ -81,6 +101,45 @@ class WarehouseConfig(AppConfig):
             replace_existing=True,
         )
 
+        # Nightly: move scans past the retention window to the archive
+        sched.add_job(
+            'warehouse.archive:archive_transactions',
+            trigger='cron',
+            hour=2,
+            minute=30,
+            id='archive_transactions_job',
+            replace_existing=True,
+        )
+
+        # Nightly: stock snapshot that as‑of queries replay from
+        sched.add_job(
+            'warehouse.snapshots:take_snapshot',
+            trigger='cron',
+            hour=0,
+            minute=0,
+            id='stock_snapshot_job',
+            replace_existing=True,
+        )
+
+        # Hourly: forget Idempotency-Keys past their TTL
+        sched.add_job(
+            'warehouse.idempotency:purge_expired',
+            trigger='cron',
+            minute=15,
+            id='purge_idempotency_keys_job',
+            replace_existing=True,
+        )
+
+        # Nightly: trim the change feed to its retention window
+        sched.add_job(
+            'warehouse.changes:purge_expired',
+            trigger='cron',
+            hour=3,
+            minute=0,
+            id='purge_changelog_job',
+            replace_existing=True,
+        )
+
         # Run in background so migrations/tests aren’t blocked
         threading.Thread(target=sched.start, daemon=True).start()
         self.scheduler_started = True
@@ -0,0 +1,138 @@
+# warehouse/archive.py
+"""
+Moving old scans out of the hot Transaction table.
+
+Transactions older than TRANSACTION_RETENTION_DAYS are packed into
+TransactionArchive – one row per roll per month holding the scans as
+zlib‑compressed JSON – and deleted from the hot table.  The newest scan of
+every (roll, action, location) is never moved, so everything the
+dashboard, reconciliation and scan validation ask (“last scan of this
+roll”, “was it ever put away in FM”, “was it dispatched”) is still
+answered from the hot table alone.
+
+history() stitches both back together for the roll detail page and API.
+"""
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import refdata
+from .models import Transaction, TransactionArchive
+
+FIELDS = ('id', 'action', 'location__location_code', 'user', 'scanned_at',
+          'customer_id', 'performed_by_id', 'department_id')
+
+
+def pack(rows):
+    """JSON, zlib‑compressed – the payload format of the archive tables."""
+    return zlib.compress(json.dumps(rows, separators=(',', ':')).encode(), 9)
+
+
+def unpack(payload):
+    return json.loads(zlib.decompress(bytes(payload)))
+
+
+def _month(dt):
+    return timezone.localtime(dt).date().replace(day=1)
+
+
+def archivable(cutoff):
+    """Scans older than ``cutoff`` that have a newer one in their group."""
+    newer = Transaction.objects.filter(
+        roll=OuterRef('roll'),
+        action=OuterRef('action'),
+        scanned_at__gt=OuterRef('scanned_at'),
+    )
+    old = Transaction.objects.filter(scanned_at__lt=cutoff)
+    # NULL locations (dispatch, QA) need their own branch: NULL = NULL is false
+    return (
+        old.filter(Exists(newer.filter(location=OuterRef('location'))),
+                   location__isnull=False)
+        | old.filter(Exists(newer.filter(location__isnull=True)),
+                     location__isnull=True)
+    )
+
+
+def _archive_rolls(roll_ids, cutoff):
+    rows = list(archivable(cutoff).filter(roll_id__in=roll_ids)
+                                  .order_by('roll_id', 'scanned_at')
+                                  .values('roll_id', *FIELDS))
+    groups = {}
+    for row in rows:
+        roll_id = row.pop('roll_id')
+        row['location'] = row.pop('location__location_code')
+        month = _month(row['scanned_at'])
+        row['scanned_at'] = row['scanned_at'].isoformat()
+        groups.setdefault((roll_id, month), []).append(row)
+
+    for (roll_id, month), txs in groups.items():
+        arc, _ = (TransactionArchive.objects.select_for_update()
+                  .get_or_create(roll_id=roll_id, month=month,
+                                 defaults={'payload': pack([])}))
+        merged = {tx['id']: tx for tx in unpack(arc.payload)}
+        merged.update((tx['id'], tx) for tx in txs)
+        arc.payload  = pack(sorted(merged.values(), key=lambda t: t['scanned_at']))
+        arc.tx_count = len(merged)
+        arc.save()
+
+    Transaction.objects.filter(id__in=[r['id'] for r in rows]).delete()
+    return len(rows)
+
+
+def archive_transactions(days=None, batch_size=500, dry_run=False):
+    """
+    Archive everything older than ``days`` (default from settings), a
+    batch of rolls per database transaction.  Returns the number of scans
+    moved (or that would be, with ``dry_run``).
+    """
+    if days is None:
+        days = settings.TRANSACTION_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=days)
+    if dry_run:
+        return archivable(cutoff).count()
+
+    roll_ids = list(archivable(cutoff).order_by('roll_id')
+                                      .values_list('roll_id', flat=True)
+                                      .distinct())
+    moved = 0
+    for i in range(0, len(roll_ids), batch_size):
+        with transaction.atomic():
+            moved += _archive_rolls(roll_ids[i:i + batch_size], cutoff)
+    return moved
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Reading it back
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _restore(roll, tx):
+    """An unsaved Transaction standing in for an archived scan."""
+    loc = refdata.location(tx['location']) if tx['location'] else None
+    obj = Transaction(
+        id=tx['id'], roll=roll, action=tx['action'], location=loc,
+        user=tx['user'], customer_id=tx['customer_id'],
+        performed_by_id=tx['performed_by_id'], department_id=tx['department_id'],
+    )
+    obj.scanned_at = datetime.fromisoformat(tx['scanned_at'])
+    obj.archived   = True
+    return obj
+
+
+def history(roll):
+    """Every scan of ``roll``, hot and archived, newest first."""
+    hot = list(Transaction.objects.filter(roll=roll)
+                                  .select_related('location')
+                                  .order_by('-scanned_at'))
+    for tx in hot:
+        tx.archived = False
+    cold = [
+        _restore(roll, tx)
+        for arc in roll.archives.order_by('-month')
+        for tx in unpack(arc.payload)
+    ]
+    return sorted(hot + cold, key=lambda tx: tx.scanned_at, reverse=True)
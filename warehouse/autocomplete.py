@@ -0,0 +1,221 @@
+# warehouse/autocomplete.py
+"""
+In‑memory prefix indexes for typeahead.
+
+Each index is a sorted list of case‑folded keys searched with bisect, so a
+suggestion is two binary searches and a slice – no database round trip.
+Indexes are built on first use in each process and then kept current by
+the model signals below, once the saving transaction commits.  A version
+stamp in the shared cache tells other processes to rebuild when somebody
+else changed the data.
+
+Materials, batches and locations remember each value's department, so a
+department-scoped user is only offered their own (see AutocompleteView);
+customers are shared by every department.
+"""
+import bisect
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Batch, Customer, Location, Material
+from .routers import primary
+
+
+class PrefixIndex:
+    """
+    Case‑insensitive prefix search over a multiset of strings, tracked per
+    primary key so renames and deletes drop the old value.  ``dept_field``
+    is the path from the model to its Department, if it has one.
+    """
+
+    def __init__(self, model, field, dept_field=None):
+        self.model      = model
+        self.field      = field
+        self.dept_field = dept_field
+        self._lock      = threading.RLock()
+        self._keys      = []    # sorted casefolded values
+        self._display   = {}    # casefolded → original spelling
+        self._refs      = {}    # casefolded → number of rows using it
+        self._depts     = {}    # casefolded → Counter of department ids
+        self._by_pk     = {}    # pk → (casefolded value, department id)
+        self._version   = None
+
+    @property
+    def _version_key(self):
+        return f'its:autocomplete:{self.model._meta.model_name}.{self.field}'
+
+    # ── building ────────────────────────────────────────────────────────
+    def _shared_version(self):
+        version = cache.get(self._version_key)
+        if version is None:
+            version = time.time_ns()
+            if not cache.add(self._version_key, version, None):
+                version = cache.get(self._version_key, version)
+        return version
+
+    @primary()
+    def build(self):
+        if self.dept_field:
+            rows = self.model.objects.values_list('pk', self.field, self.dept_field)
+        else:
+            rows = self.model.objects.values_list('pk', self.field)
+        with self._lock:
+            self._keys, self._display, self._refs, self._depts, self._by_pk = [], {}, {}, {}, {}
+            for pk, value, *dept in rows.iterator():
+                self._add(pk, value, *dept)
+            self._keys.sort()
+            self._version = self._shared_version()
+
+    def _ensure_fresh(self):
+        if self._version is None or self._version != self._shared_version():
+            self.build()
+
+    # ── incremental maintenance ─────────────────────────────────────────
+    def department_of(self, instance):
+        """Department id of a saved row, following ``dept_field``."""
+        if not self.dept_field:
+            return None
+        *hops, last = self.dept_field.split('__')
+        for hop in hops:
+            instance = getattr(instance, hop)
+            if instance is None:
+                return None
+        return getattr(instance, f'{last}_id')
+
+    def _add(self, pk, value, dept=None, keep_sorted=False):
+        if not value:
+            return
+        key = value.casefold()
+        self._by_pk[pk] = (key, dept)
+        self._depts.setdefault(key, Counter())[dept] += 1
+        if key in self._refs:
+            self._refs[key] += 1
+            return
+        self._refs[key]    = 1
+        self._display[key] = value
+        if keep_sorted:
+            bisect.insort(self._keys, key)
+        else:
+            self._keys.append(key)
+
+    def _discard(self, pk):
+        key, dept = self._by_pk.pop(pk, (None, None))
+        if key is None:
+            return
+        self._depts[key][dept] -= 1
+        if not self._depts[key][dept]:
+            del self._depts[key][dept]
+        self._refs[key] -= 1
+        if self._refs[key] == 0:
+            del self._refs[key]
+            del self._display[key]
+            del self._depts[key]
+            i = bisect.bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+
+    def _publish(self, was_current):
+        # tell the other processes their copy is stale; if ours already
+        # was (someone else wrote first), rebuild on next use as well
+        version = time.time_ns()
+        cache.set(self._version_key, version, None)
+        self._version = version if was_current else None
+
+    def update(self, pk, value, dept=None):
+        with self._lock:
+            if self._version is None:
+                return          # not built yet; first use loads it fresh
+            was_current = self._version == self._shared_version()
+            self._discard(pk)
+            self._add(pk, value, dept, keep_sorted=True)
+            self._publish(was_current)
+
+    def remove(self, pk):
+        with self._lock:
+            if self._version is None:
+                return
+            was_current = self._version == self._shared_version()
+            self._discard(pk)
+            self._publish(was_current)
+
+    # ── querying ────────────────────────────────────────────────────────
+    def suggest(self, prefix, limit=10, departments=None):
+        """``departments``: ids the values must belong to; None for all."""
+        prefix = prefix.strip().casefold()
+        if not prefix:
+            return []
+        with self._lock:
+            self._ensure_fresh()
+            lo = bisect.bisect_left(self._keys, prefix)
+            hi = bisect.bisect_left(self._keys, prefix + '\U0010ffff', lo)
+            if departments is None or not self.dept_field:
+                return [self._display[k] for k in self._keys[lo:min(hi, lo + limit)]]
+            found = []
+            for k in self._keys[lo:hi]:
+                if not self._depts[k].keys().isdisjoint(departments):
+                    found.append(self._display[k])
+                    if len(found) == limit:
+                        break
+            return found
+
+
+INDEXES = {
+    'materials': PrefixIndex(Material, 'material_number', 'department'),
+    'batches':   PrefixIndex(Batch,    'batch_number',    'material__department'),
+    'customers': PrefixIndex(Customer, 'name'),
+    'locations': PrefixIndex(Location, 'location_code',   'department'),
+}
+
+_BY_MODEL = {index.model: index for index in INDEXES.values()}
+
+
+def suggest(kind, prefix, limit=10, departments=None):
+    """
+    Up to ``limit`` values of ``kind`` starting with ``prefix``, only from
+    the given department ids unless ``departments`` is None.
+    """
+    return INDEXES[kind].suggest(prefix, limit, departments)
+
+
+def warm():
+    """Build every index now rather than on the first keystroke."""
+    for index in INDEXES.values():
+        index.build()
+
+
+def _warm_on_first_request(sender, **kwargs):
+    # once per process, as soon as it starts serving
+    request_started.disconnect(_warm_on_first_request)
+    warm()
+
+
+request_started.connect(_warm_on_first_request)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Signals
+# ─────────────────────────────────────────────────────────────────────────────
+
+# after commit: a rolled-back save must not leave its value in the index
+
+@receiver(post_save)
+def _row_saved(sender, instance, using, **kwargs):
+    index = _BY_MODEL.get(sender)
+    if index is not None:
+        pk, value, dept = instance.pk, getattr(instance, index.field), index.department_of(instance)
+        transaction.on_commit(lambda: index.update(pk, value, dept), using=using)
+
+
+@receiver(post_delete)
+def _row_deleted(sender, instance, using, **kwargs):
+    index = _BY_MODEL.get(sender)
+    if index is not None:
+        pk = instance.pk
+        transaction.on_commit(lambda: index.remove(pk), using=using)
@@ -3,6 +3,8 @@
 import requests
 from django.conf import settings
 
+from . import metrics
+
 def print_roll_label(roll):
     """
     Send a single‐record JSON job to BarTender’s REST API,
@@ -23,6 +25,13 @@ def print_roll_label(roll):
       ]
     }
 
-    resp = requests.post(url, json=payload, timeout=5)
-    resp.raise_for_status()
-    return resp.json()
+    with metrics.PRINT_SECONDS.time(result='failed') as labels:
+        try:
+            resp = requests.post(url, json=payload, timeout=5)
+            resp.raise_for_status()
+            result = resp.json()
+        except Exception:
+            metrics.PRINT_FAILURES.inc()
+            raise
+        labels['result'] = 'ok'
+    return result
@@ -0,0 +1,147 @@
+# warehouse/changes.py
+"""
+Delta feed for clients that mirror roll / location / scan state.
+
+Every write appends a ChangeLog row (kind, key); its id is a change
+sequence.  A client keeps the last id it has seen as its cursor and asks
+for what happened after it – collapsed to the current state of each object
+that changed, so a roll scanned five times since comes back once.
+
+Rows come from the model signals below and, for the writes that bypass
+signals (stock.commit_scan, the occupancy counters), from stock.py calling
+record() itself.  Archiving moves scans out of the hot table but isn't a
+change to them, so Transaction deletes are not logged.
+
+ids are handed out when a row is inserted, not when its transaction
+commits, so on a database with concurrent writers id 11 can be visible
+before id 10.  since() therefore stops in front of a gap that is younger
+than CHANGES_SETTLE seconds; an older gap was a rollback and is skipped.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ChangeLog, Location, Roll, Transaction
+
+ROLL_FIELDS        = ('roll_id', 'batch_id', 'weight_kg', 'status', 'current_location_id',
+                      'last_action', 'customer_id')
+LOCATION_FIELDS    = ('location_code', 'type', 'department_id', 'row', 'column',
+                      'roll_count', 'total_kg')
+TRANSACTION_FIELDS = ('id', 'roll__roll_id', 'action', 'location__location_code',
+                      'customer_id', 'user', 'scanned_at')
+
+
+class CursorExpired(Exception):
+    """The cursor points before the oldest change still kept."""
+
+    def __init__(self, head):
+        super().__init__(head)
+        self.head = head
+
+
+def record(entries, deleted=False):
+    """Log ``(kind, key)`` pairs, skipping empty keys; one INSERT."""
+    rows = [ChangeLog(kind=kind, key=str(key), deleted=deleted)
+            for kind, key in entries if key is not None and key != '']
+    if rows:
+        ChangeLog.objects.bulk_create(rows)
+
+
+def head():
+    """The newest change id, i.e. the cursor of a client that is up to date."""
+    return ChangeLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _settled(rows, cursor):
+    """Cut ``rows`` in front of the first gap that may still be filling in."""
+    settle = timezone.now() - timedelta(seconds=settings.CHANGES_SETTLE)
+    expected = cursor + 1
+    for i, row in enumerate(rows):
+        if row['id'] != expected and row['changed_at'] > settle:
+            return rows[:i]
+        expected = row['id'] + 1
+    return rows
+
+
+def since(cursor, limit=500):
+    """
+    What changed after ``cursor``, at most ``limit`` log rows' worth:
+    ``{cursor, more, rolls, locations, transactions, deleted}``.  Raises
+    CursorExpired when the log no longer reaches back that far.
+    """
+    # rows before ``oldest`` were purged (or, rarely, rolled back – a
+    # needless resync is the worst that does)
+    oldest = ChangeLog.objects.order_by('id').values_list('id', flat=True).first()
+    if oldest is not None and cursor < oldest - 1:
+        raise CursorExpired(head())
+
+    rows = list(ChangeLog.objects.filter(id__gt=cursor).order_by('id')
+                                 .values('id', 'kind', 'key', 'deleted', 'changed_at')[:limit + 1])
+    more = len(rows) > limit
+    settled = _settled(rows[:limit], cursor)
+    more = more or len(settled) < len(rows[:limit])
+
+    # latest entry per object wins
+    latest = {}
+    for row in settled:
+        latest[(row['kind'], row['key'])] = row['deleted']
+    wanted  = {'roll': [], 'location': [], 'transaction': []}
+    deleted = {'roll': [], 'location': [], 'transaction': []}
+    for (kind, key), gone in latest.items():
+        (deleted if gone else wanted)[kind].append(key)
+
+    return {
+        'cursor':       settled[-1]['id'] if settled else cursor,
+        'more':         more,
+        'rolls':        list(Roll.objects.filter(roll_id__in=wanted['roll'])
+                                         .order_by('id').values(*ROLL_FIELDS)),
+        'locations':    list(Location.objects.filter(location_code__in=wanted['location'])
+                                             .order_by('location_code').values(*LOCATION_FIELDS)),
+        'transactions': list(Transaction.objects.filter(id__in=wanted['transaction'])
+                                                .order_by('id').values(*TRANSACTION_FIELDS)),
+        'deleted':      {kind: keys for kind, keys in deleted.items() if keys},
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Retention
+# ─────────────────────────────────────────────────────────────────────────────
+
+def purge_expired(days=None):
+    """Drop changes older than CHANGELOG_RETENTION_DAYS; run from the scheduler."""
+    if days is None:
+        days = settings.CHANGELOG_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=days)
+    # always keep the newest row: SQLite reuses the highest id once it's gone
+    deleted, _ = (ChangeLog.objects.filter(changed_at__lt=cutoff)
+                                   .exclude(id=head()).delete())
+    return deleted
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Signals
+# ─────────────────────────────────────────────────────────────────────────────
+
+_KEYS = {
+    Roll:        ('roll',        lambda obj: obj.roll_id),
+    Location:    ('location',    lambda obj: obj.location_code),
+    Transaction: ('transaction', lambda obj: obj.pk),
+}
+
+
+@receiver(post_save)
+def _row_saved(sender, instance, raw=False, **kwargs):
+    if raw or sender not in _KEYS or getattr(instance, '_change_logged', False):
+        return
+    kind, key = _KEYS[sender]
+    record([(kind, key(instance))])
+
+
+@receiver(post_delete, sender=Roll)
+@receiver(post_delete, sender=Location)
+def _row_deleted(sender, instance, **kwargs):
+    kind, key = _KEYS[sender]
+    record([(kind, key(instance))], deleted=True)
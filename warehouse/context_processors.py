@@ -1,8 +1,8 @@
 # warehouse/context_processors.py
-from .models import SiteConfig
+from . import refdata
 
 def site_config(request):
-    cfg = SiteConfig.objects.first()
+    cfg = refdata.site_config()
     return {
         'enable_qa_scan': cfg.enable_qa_scan if cfg else False
     }
@@ -0,0 +1,66 @@
+# warehouse/dashboard.py
+"""
+The numbers and rack cells on the manager dashboard.
+
+Shared by DashboardView (full page) and live.py (pushed updates), so a
+card or a cell reads the same whichever way it reached the screen.
+"""
+from django.db.models import Max
+from django.template.loader import render_to_string
+
+from .models import Roll, Transaction
+
+CARD_COLOURS = {
+    'Produced':         '#cce5ff',
+    'Stored':           '#d4edda',
+    'Dispatched':       '#f8d7da',
+    'Pending Storage':  '#fff3cd',
+    'Pending Dispatch': '#e2e3e5',
+}
+
+
+def cards(dept=''):
+    """The summary cards, scoped to ``dept`` ('' = whole plant)."""
+    # Produced: rolls whose material was created/registered by that department
+    produced_qs = Roll.objects.all()
+    if dept:
+        produced_qs = produced_qs.filter(batch__material__department__code=dept)
+    produced = produced_qs.count()
+
+    # Stored: PUTAWAYs into locations prefixed by the department code
+    stored_qs = Transaction.objects.filter(action='PUTAWAY')
+    if dept:
+        stored_qs = stored_qs.filter(location__location_code__startswith=dept)
+    stored = stored_qs.values('roll').distinct().count()
+
+    # Dispatched: dispatches performed by users of that department
+    # (department stamped on the transaction when it was posted)
+    dispatched_qs = Transaction.objects.filter(action='DISPATCH')
+    if dept:
+        dispatched_qs = dispatched_qs.filter(department__code=dept)
+    dispatched = dispatched_qs.values('roll').distinct().count()
+
+    counts = {
+        'Produced':         produced,
+        'Stored':           stored,
+        'Dispatched':       dispatched,
+        'Pending Storage':  produced - stored,
+        'Pending Dispatch': stored - dispatched,
+    }
+    return [{'label': label, 'count': counts[label], 'bg': bg}
+            for label, bg in CARD_COLOURS.items()]
+
+
+def cell_entries(code):
+    """What the grid cell of rack ``code`` lists: the rolls on it now."""
+    rolls = (Roll.objects.filter(current_location=code)
+                         .select_related('batch__material')
+                         .annotate(posting_date=Max('transaction__scanned_at'))
+                         .order_by('posting_date'))
+    return [{'roll': roll,
+             'description': roll.batch.material.description,
+             'posting_date': roll.posting_date} for roll in rolls]
+
+
+def render_cell(entries):
+    return render_to_string('partials/grid_cell.html', {'rolls': entries})
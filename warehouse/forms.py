@@ -3,6 +3,8 @@ from .models import Customer, Material, Department, Location
 from django.contrib.auth.models import User, Group
 from django.core.exceptions import ValidationError
 from .models import ROLE_CHOICES
+from .access import FULL_ACCESS_GROUPS, get_access
+from . import refdata
 
 
 
@@ -45,30 +47,13 @@ class BatchDataForm(forms.Form):
     def __init__(self, *args, request=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.request = request
-        
-        # If the user is NOT Factory Admin or Forklift Driver,
-        # lock the department to their profile.dept
-        user = getattr(request, 'user', None)
-        if user and not user.groups.filter(name__in=['Factory Admin','Forklift Driver']).exists():
-            user_dept = getattr(user.profile, 'dept', None)
-#            if user_dept:
-#                self.fields['department'].choices = [(user_dept, user_dept)]
-#                self.fields['department'].initial   = user_dept
-#                self.fields['department'].widget.attrs['readonly'] = True
-        dept_obj = getattr(user.profile, 'department', None)
-        if dept_obj:
-            code = dept_obj.code
-            name = dept_obj.name
-            # lock down to “FM – Film” rather than just “FM”
-            self.fields['department'].choices = [(code, f"{code} – {name}")]
-            self.fields['department'].initial   = code
-            self.fields['department'].widget.attrs['readonly'] = True
-        
+        access = get_access(request) if request is not None else None
+
         # 1) Lazy‑load department options (only after migrations have run)
         try:
-            qs = Department.objects.order_by('code')
+            qs = refdata.departments()
             dept_choices = [('', '— Select department —')] + [
-                (d.code, f"{d.code} – {d.name}") for d in qs
+                (d.code, f"{d.code} – {d.name}") for d in qs
             ]
         except Exception:
             # DB not ready yet; leave only the placeholder
@@ -76,17 +61,13 @@ class BatchDataForm(forms.Form):
         self.fields['department'].choices = dept_choices
 
         # 2) If not full‑access, lock them into their own dept
-        user = getattr(self.request, 'user', None)
-        if user and not user.groups.filter(
-            name__in=['Factory Admin','Forklift Driver']
-        ).exists():
-            prof = getattr(user, 'profile', None)
-            if prof and prof.department:
-                code = prof.department.code
-                label = f"{code} – {prof.department.name}"
-                self.fields['department'].choices = [(code, label)]
-                self.fields['department'].initial   = code
-                self.fields['department'].widget.attrs['readonly'] = True        
+        #    (show “FM – Film” rather than just “FM”)
+        if (access and access.has_department
+                and not access.in_group(*FULL_ACCESS_GROUPS)):
+            code = access.department_code
+            self.fields['department'].choices = [(code, access.department_label)]
+            self.fields['department'].initial   = code
+            self.fields['department'].widget.attrs['readonly'] = True
 
     def clean(self):
         cleaned = super().clean()
@@ -0,0 +1,145 @@
+# warehouse/idempotency.py
+"""
+Keeping retried and repeated scan POSTs from turning into extra scans.
+
+Two layers:
+
+* Idempotency-Key header – the client sends a fresh key per scan and the
+  same key on every retry of it.  The first request claims the key in the
+  IdempotencyKey table; retries get the stored response back.  The unique
+  (user, key) constraint makes the claim safe across processes.
+
+* De‑dup window – the camera decodes the same QR several times a second,
+  each decode a new POST with a new key.  Within SCAN_DEDUP_WINDOW seconds
+  an identical (roll, action, location) in this process is answered with
+  the first one's result; a duplicate that arrives while the first is
+  still running waits for it rather than racing it.
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+
+class KeyConflict(Exception):
+    """The key is in flight, or was used for a different request."""
+
+
+def fingerprint(data):
+    body = json.dumps(dict(data.items()), sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def begin(user_id, key, fp):
+    """
+    Claim ``key`` for this request.  Returns ``(record, None)`` when we own
+    it and should process the request, or ``(None, (status, body))`` when
+    it already has an answer.  Raises KeyConflict otherwise.
+    """
+    now = timezone.now()
+    rec = IdempotencyKey.objects.filter(user_id=user_id, key=key).first()
+    if rec is not None and rec.expires_at <= now:
+        rec.delete()
+        rec = None
+    if rec is None:
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user_id=user_id, key=key, fingerprint=fp,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                ), None
+        except IntegrityError:
+            # a concurrent retry claimed it between our read and insert
+            rec = IdempotencyKey.objects.get(user_id=user_id, key=key)
+
+    if rec.fingerprint != fp:
+        raise KeyConflict("Idempotency-Key was already used for a different request.")
+    if rec.status_code is None:
+        raise KeyConflict("A request with this Idempotency-Key is still being processed.")
+    return None, (rec.status_code, rec.response)
+
+
+def finish(rec, status, body):
+    """Store the answer; server errors free the key so a retry can run."""
+    if status >= 500:
+        abandon(rec)
+        return
+    rec.status_code = status
+    rec.response    = body
+    rec.save(update_fields=['status_code', 'response'])
+
+
+def abandon(rec):
+    IdempotencyKey.objects.filter(pk=rec.pk, status_code__isnull=True).delete()
+
+
+def purge_expired():
+    """Drop keys past their TTL; run from the scheduler."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# In‑process de‑dup window
+# ─────────────────────────────────────────────────────────────────────────────
+
+class _Entry:
+    __slots__ = ('done', 'response', 'expires')
+
+    def __init__(self, expires):
+        self.done     = threading.Event()
+        self.response = None
+        self.expires  = expires
+
+
+class DedupWindow:
+    def __init__(self, seconds):
+        self.seconds  = seconds
+        self._lock    = threading.Lock()
+        self._entries = {}
+
+    def _prune(self, now):
+        for key in [k for k, e in self._entries.items()
+                    if e.done.is_set() and e.expires <= now]:
+            del self._entries[key]
+
+    def claim(self, key):
+        """``(True, entry)`` if we're first; ``(False, entry)`` for a repeat."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (not entry.done.is_set() or entry.expires > now):
+                return False, entry
+            if len(self._entries) > 1000:
+                self._prune(now)
+            entry = self._entries[key] = _Entry(now + self.seconds)
+            return True, entry
+
+    def resolve(self, entry, status, body):
+        entry.response = (status, body)
+        entry.expires  = time.monotonic() + self.seconds
+        entry.done.set()
+
+    def release(self, key, entry):
+        """The first attempt didn't produce a reusable answer; forget it."""
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+window = DedupWindow(settings.SCAN_DEDUP_WINDOW)
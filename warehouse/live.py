@@ -0,0 +1,225 @@
+# warehouse/live.py
+"""
+Live dashboard updates over Server-Sent Events.
+
+Every open dashboard keeps a stream open (GET /dashboard/stream/).  When a
+scan is committed the hub recomputes, once per department scope being
+watched, the card counts and the rack cells the roll left and entered, and
+hands that one message to every viewer of the scope.  Scans arriving
+within LIVE_DEBOUNCE seconds share a round, so ten managers on the floor
+view cost one recount per burst of scans, not ten page renders.
+
+The hub lives in the process serving the streams.  Which commits reach it
+is up to the layer named by LIVE_LAYER:
+
+* LocalLayer – scans committed by this process (runserver, one worker).
+* ChangeLogLayer – scans committed by any process, picked up by polling
+  the change feed (changes.py) every LIVE_POLL_INTERVAL seconds.
+
+Streams are ASGI only (plant_wms/asgi.py): there a stream is an async
+generator, one coroutine per viewer.  Under WSGI (waitress) an open stream
+would hold one of a handful of worker threads for as long as the tab is
+open, so the stream answers 204 and the page polls /api/changes/ instead,
+re-reading itself when a scan has touched something.
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from . import changes, dashboard, metrics
+from .models import ChangeLog
+from .stock import scan_committed
+
+logger = logging.getLogger(__name__)
+
+# seconds between keep-alive comments, so a closed stream is noticed
+KEEPALIVE = 15
+
+
+class Subscriber:
+    """One open stream: fed by the hub thread, drained by the response."""
+
+    def __init__(self, scope, loop=None):
+        self.scope  = scope
+        self.loop   = loop
+        self._queue = asyncio.Queue() if loop else queue.SimpleQueue()
+
+    def put(self, message):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._queue.put_nowait, message)
+        else:
+            self._queue.put(message)
+
+    def get(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aget(self, timeout):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Hub:
+    def __init__(self, debounce):
+        self.debounce = debounce
+        self._lock    = threading.Lock()
+        self._subs    = {}          # scope ('' = whole plant) → set of Subscriber
+        self._pending = set()       # rack codes touched since the last round
+        self._dirty   = False
+        self._wake    = threading.Event()
+        self._thread  = None
+
+    def subscribe(self, sub):
+        with self._lock:
+            self._subs.setdefault(sub.scope, set()).add(sub)
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subs.get(sub.scope, set())
+            subs.discard(sub)
+            if not subs:
+                self._subs.pop(sub.scope, None)
+
+    def changed(self, codes=()):
+        """Something on these racks (or just the totals) changed."""
+        with self._lock:
+            if not self._subs:
+                return              # nobody watching, nothing to compute
+            self._pending.update(c for c in codes if c)
+            self._dirty = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name='live-dashboard')
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.debounce)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("live dashboard round failed")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Run one round now; returns the number of messages handed out."""
+        with self._lock:
+            if not self._dirty:
+                return 0
+            codes, self._pending, self._dirty = self._pending, set(), False
+            watched = {scope: list(subs) for scope, subs in self._subs.items()}
+        with metrics.DASHBOARD_SECONDS.time(view='live'):
+            return self._send(codes, watched)
+
+    def _send(self, codes, watched):
+        # each cell once, whichever scopes show it
+        cells = {code: dashboard.render_cell(dashboard.cell_entries(code)) for code in codes}
+        sent = 0
+        for scope, subs in watched.items():
+            message = {
+                'cards': {c['label']: c['count'] for c in dashboard.cards(scope)},
+                'cells': {code: html for code, html in cells.items() if code.startswith(scope)},
+            }
+            for sub in subs:
+                sub.put(message)
+            sent += len(subs)
+        return sent
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Layers: how committed scans reach the hub
+# ─────────────────────────────────────────────────────────────────────────────
+
+class LocalLayer:
+    """Scans committed in this process."""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def scan_committed(self, old, new):
+        self.hub.changed([old, new])
+
+
+class ChangeLogLayer:
+    """Scans committed by any process, read back from the change feed."""
+
+    def __init__(self, hub):
+        self.hub     = hub
+        self._lock   = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll, daemon=True,
+                                                name='live-changelog')
+                self._thread.start()
+
+    def scan_committed(self, old, new):
+        pass                        # the poller sees it like everyone else's
+
+    def _poll(self):
+        cursor = changes.head()
+        while True:
+            time.sleep(settings.LIVE_POLL_INTERVAL)
+            try:
+                rows = list(ChangeLog.objects.filter(id__gt=cursor).order_by('id')
+                                             .values_list('id', 'kind', 'key')[:5000])
+                if rows:
+                    cursor = rows[-1][0]
+                    self.hub.changed(key for _, kind, key in rows if kind == 'location')
+            except Exception:
+                logger.exception("live dashboard poll failed")
+            finally:
+                close_old_connections()
+
+
+hub   = Hub(settings.LIVE_DEBOUNCE)
+layer = import_string(settings.LIVE_LAYER)(hub)
+
+
+@receiver(scan_committed)
+def _scan_committed(sender, transaction, old, new, **kwargs):
+    layer.scan_committed(old, new)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Stream bodies
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _event(message):
+    if message is None:
+        return ': keepalive\n\n'
+    return f"event: update\ndata: {json.dumps(message)}\n\n"
+
+
+async def astream(scope):
+    """Response body for ASGI."""
+    sub = Subscriber(scope, asyncio.get_running_loop())
+    hub.subscribe(sub)
+    layer.start()
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            yield _event(await sub.aget(KEEPALIVE))
+    finally:
+        hub.unsubscribe(sub)
@@ -0,0 +1,28 @@
+# warehouse/management/commands/archive_transactions.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from warehouse import archive
+
+
+class Command(BaseCommand):
+    help = 'Move scans older than the retention window into TransactionArchive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.TRANSACTION_RETENTION_DAYS,
+                            help='Retention window in days (default: %(default)s)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rolls archived per database transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many scans would move')
+
+    def handle(self, *args, **options):
+        moved = archive.archive_transactions(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'would be archived' if options['dry_run'] else 'archived'
+        self.stdout.write(self.style.SUCCESS(
+            f"{moved} transaction(s) older than {options['days']} days {verb}"
+        ))
@@ -0,0 +1,155 @@
+# warehouse/management/commands/benchmark_scan_api.py
+"""
+How many scanners one worker keeps up with: the DRF endpoints on a fixed
+pool of threads (a WSGI worker with --threads) against the async endpoints
+of scan_api.py on one event loop (an ASGI worker).
+
+Each simulated scanner loops verify roll → commit a PUTAWAY or TRANSFER
+→ list the rack, with --think-ms between scans.  Requests go through Django's handlers
+in‑process, so this measures the worker, not the network.  A scanner count
+is "sustained" while p95 scan latency stays under --target-ms and nothing
+failed.  "threads" is the most threads the process had alive at once: the
+async side should stay well under one per scanner.
+
+Works on throw‑away BENCH rolls and racks, removed afterwards.
+"""
+import asyncio
+import logging
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+
+from warehouse import idempotency
+from warehouse.models import Batch, Location, Material, Roll
+
+
+class Command(BaseCommand):
+    help = 'Scanners sustained per worker: sync DRF on a thread pool vs the async scan API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scanners', default='5,10,25,50',
+                            help='Comma-separated scanner counts to try')
+        parser.add_argument('--threads', type=int, default=4, help='Threads of the sync worker')
+        parser.add_argument('--seconds', type=float, default=5, help='Per scanner count and mode')
+        parser.add_argument('--think-ms', type=float, default=200, help='Pause between scans')
+        parser.add_argument('--target-ms', type=float, default=500, help='p95 scan latency budget')
+
+    def handle(self, *args, **opts):
+        counts = sorted(int(n) for n in opts['scanners'].split(','))
+        tag = uuid.uuid4().hex[:6].upper()
+        material = Material.objects.create(material_number=f'BENCH-{tag}', description='scan api benchmark')
+        batch = Batch.objects.create(material=material, batch_number=tag)
+        racks = [Location.objects.create(location_code=f'BA{tag[:3]}{i:02d}', type='STORAGE')
+                 for i in (1, 2)]
+        user = User.objects.create_superuser(f'bench-{tag.lower()}', password=None)
+        rolls = [str(Roll.objects.create(batch=batch, weight_kg=10).roll_id)
+                 for _ in range(max(counts))]
+        self.codes = [r.location_code for r in racks]
+        self.turn  = dict.fromkeys(rolls, 0)       # alternates each roll's rack across runs
+        # rejected/failed requests are counted below, not logged one by one
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        window = idempotency.window.seconds
+        # the test clients send Host: testserver
+        hosts = override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'])
+        hosts.enable()
+        try:
+            for mode in ('sync', 'async'):
+                sustained = 0
+                for n in counts:
+                    lat, failed, threads = asyncio.run(self._run(mode, n, user, rolls[:n], opts))
+                    p95 = self._report(mode, n, lat, failed, threads, opts['seconds'])
+                    if p95 <= opts['target_ms'] and not failed:
+                        sustained = n
+                self.stdout.write(self.style.SUCCESS(
+                    f"{mode}: sustains {sustained or 'fewer than ' + str(counts[0])} scanners "
+                    f"(p95 ≤ {opts['target_ms']:.0f} ms)\n"))
+        finally:
+            hosts.disable()
+            idempotency.window.seconds = window
+            material.delete()
+            Location.objects.filter(pk__in=[r.pk for r in racks]).delete()
+            user.delete()
+
+    def _report(self, mode, n, lat, failed, threads, seconds):
+        lat.sort()
+        p50 = statistics.median(lat) * 1000 if lat else float('inf')
+        p95 = lat[max(int(len(lat) * 0.95) - 1, 0)] * 1000 if lat else float('inf')
+        self.stdout.write(f"{mode:5} {n:4} scanners: {len(lat) / seconds:7.1f} scans/s, "
+                          f"p50 {p50:7.1f} ms, p95 {p95:7.1f} ms, failed {failed}, threads {threads}")
+        return p95
+
+    async def _run(self, mode, n, user, rolls, opts):
+        # rolls bounce between two racks faster than real ones; don't let
+        # the de-dup window fold one PUTAWAY into the one before
+        idempotency.window.clear()
+        idempotency.window.seconds = 0
+        stop = time.perf_counter() + opts['seconds']
+        think = opts['think_ms'] / 1000
+        lat, failed = [], [0]
+
+        if mode == 'sync':
+            local = threading.local()
+            pool = ThreadPoolExecutor(opts['threads'])
+
+            def client():
+                if not hasattr(local, 'client'):
+                    local.client = Client(raise_request_exception=False)
+                    local.client.force_login(user)
+                return local.client
+
+            async def call(method, *args, **kwargs):
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    pool, lambda: getattr(client(), method)(*args, **kwargs))
+            paths = ('/api/rolls/{}/', '/api/transactions/', '/api/locations/{}/rolls/')
+        else:
+            aclient = AsyncClient(raise_request_exception=False)
+            await aclient.aforce_login(user)
+
+            async def call(method, *args, **kwargs):
+                # as ASGIHandler does per request; AsyncClient alone would
+                # run every request's sync work on one shared thread
+                async with ThreadSensitiveContext():
+                    return await getattr(aclient, method)(*args, **kwargs)
+            paths = ('/api/scan/rolls/{}/', '/api/scan/transactions/',
+                     '/api/scan/locations/{}/rolls/')
+
+        async def scanner(roll):
+            while time.perf_counter() < stop:
+                # PUTAWAY on one rack, TRANSFER to the other, and again
+                action, rack = (('PUTAWAY', self.codes[0]), ('TRANSFER', self.codes[1]))[self.turn[roll] % 2]
+                self.turn[roll] += 1
+                start = time.perf_counter()
+                responses = [
+                    await call('get', paths[0].format(roll)),
+                    await call('post', paths[1], {'roll': roll, 'action': action,
+                                                  'location': rack, 'user': 'bench'},
+                               content_type='application/json'),
+                    await call('get', paths[2].format(rack)),
+                ]
+                lat.append(time.perf_counter() - start)
+                if any(r.status_code >= 300 for r in responses):
+                    failed[0] += 1
+                await asyncio.sleep(think)
+
+        threads = [threading.active_count()]
+
+        async def count_threads():
+            while time.perf_counter() < stop:
+                threads[0] = max(threads[0], threading.active_count())
+                await asyncio.sleep(0.01)
+
+        try:
+            await asyncio.gather(count_threads(), *(scanner(roll) for roll in rolls))
+        finally:
+            if mode == 'sync':
+                pool.shutdown()
+        return lat, failed[0], threads[0]
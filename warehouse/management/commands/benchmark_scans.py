@@ -0,0 +1,122 @@
+# warehouse/management/commands/benchmark_scans.py
+"""
+Hammer stock.commit_scan from several threads at once and check nothing
+went wrong: every roll's current_location must match the replay of its
+transactions and every rack counter must match a recount.
+
+Works on throw‑away BENCH rolls and racks, removed afterwards unless --keep.
+"""
+import random
+import statistics
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+
+from warehouse import stock
+from warehouse.models import Batch, Location, Material, Roll, Transaction
+
+
+class Command(BaseCommand):
+    help = 'Concurrent scan-commit benchmark with a consistency check afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rolls',   type=int, default=20)
+        parser.add_argument('--racks',   type=int, default=4)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--scans',   type=int, default=100, help='Scans per thread')
+        parser.add_argument('--keep', action='store_true', help="Don't delete the BENCH data")
+
+    def handle(self, *args, **opts):
+        tag = uuid.uuid4().hex[:6].upper()
+        material = Material.objects.create(material_number=f'BENCH-{tag}',
+                                           description='scan benchmark')
+        batch = Batch.objects.create(material=material, batch_number=tag)
+        racks = [Location.objects.create(location_code=f'BN{tag[:3]}{i:02d}', type='STORAGE')
+                 for i in range(1, opts['racks'] + 1)]
+        rolls = [Roll.objects.create(batch=batch, weight_kg=random.randint(10, 500))
+                 for _ in range(opts['rolls'])]
+        try:
+            self._statements(rolls[0], racks)
+            self._run(rolls, racks, opts['threads'], opts['scans'])
+            self._check(rolls, racks)
+        finally:
+            if not opts['keep']:
+                material.delete()
+                Location.objects.filter(pk__in=[r.pk for r in racks]).delete()
+
+    def _statements(self, roll, racks):
+        with CaptureQueriesContext(connection) as ctx:
+            stock.commit_scan(roll, 'PUTAWAY', location=racks[0], user='bench')
+        sql = [q['sql'] for q in ctx.captured_queries
+               if not q['sql'].startswith(('BEGIN', 'COMMIT', 'SAVEPOINT', 'RELEASE'))]
+        self.stdout.write(f"statements per scan: {len(sql)} (plus BEGIN/COMMIT)")
+
+    def _run(self, rolls, racks, threads, scans):
+        latencies, outcome = [], {'committed': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker():
+            local, counts = [], {'committed': 0, 'rejected': 0, 'errors': 0}
+            try:
+                for _ in range(scans):
+                    roll = random.choice(rolls)
+                    action = random.choice(['PUTAWAY', 'TRANSFER'])
+                    start = time.perf_counter()
+                    try:
+                        stock.commit_scan(roll, action, location=random.choice(racks),
+                                          user='bench')
+                        counts['committed'] += 1
+                    except stock.ScanRejected:
+                        counts['rejected'] += 1
+                    except DatabaseError:
+                        counts['errors'] += 1
+                    local.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(local)
+                for k, v in counts.items():
+                    outcome[k] += v
+
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        t0 = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(
+            f"{len(latencies)} scans on {threads} threads in {elapsed:.2f}s "
+            f"({len(latencies) / elapsed:.0f}/s); p50 {statistics.median(latencies) * 1000:.1f} ms, "
+            f"p95 {p95 * 1000:.1f} ms; " + ', '.join(f"{k} {v}" for k, v in outcome.items())
+        )
+
+    def _check(self, rolls, racks):
+        bad = []
+        for roll in Roll.objects.filter(pk__in=[r.pk for r in rolls]):
+            where = None
+            for action, code in (Transaction.objects.filter(roll=roll)
+                                 .order_by('scanned_at', 'id')
+                                 .values_list('action', 'location__location_code')):
+                if action in stock.MOVES_TO_LOCATION:
+                    where = code
+                elif action in stock.CLEARS_LOCATION:
+                    where = None
+            if where != roll.current_location_id:
+                bad.append(f"roll {roll.pk}: at {roll.current_location_id}, ledger says {where}")
+        codes = [r.location_code for r in racks]
+        before = stock.occupancy(codes)
+        drift = [c for c in stock.recount() if c in codes]
+        bad += [f"rack {c}: counter {before[c]} drifted" for c in drift]
+
+        if bad:
+            self.stdout.write(self.style.ERROR('\n'.join(bad)))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ roll locations and rack counters consistent'))
@@ -0,0 +1,84 @@
+# warehouse/management/commands/benchmark_sqlite_tuning.py
+"""
+Scan throughput with the SQLite tuning off and on.
+
+Copies the database twice and runs loadtest_scanners in a child process
+against each copy: once with the stock setup (rollback journal, deferred
+transactions, no scan write queue) and once with SQLITE_TUNING and
+SCAN_WRITE_QUEUE as settings.py has them, then prints the two side by side.
+
+    manage.py benchmark_sqlite_tuning --operators 5,10,20,40 --seconds 30
+
+Nothing is written to the real database.  Other load test options pass
+straight through (--think-ms, --mix, --batch, --rolls).
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+MODES = {
+    'stock': {'SQLITE_TUNING': 'False', 'SCAN_WRITE_QUEUE': 'False'},
+    'tuned': {'SQLITE_TUNING': 'True',  'SCAN_WRITE_QUEUE': 'True'},
+}
+
+
+class Command(BaseCommand):
+    help = 'Scan throughput and lock errors with the SQLite tuning off and on.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operators', default='5,10,20,40')
+        parser.add_argument('--seconds', type=float, default=30)
+        parser.add_argument('--think-ms', type=float, default=1500)
+        parser.add_argument('--mix', default='store=40,transfer=20,dispatch=30,qa=10')
+        parser.add_argument('--batch', type=int, default=6)
+        parser.add_argument('--rolls', type=int, default=3000)
+
+    def handle(self, *args, **opts):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Only for SQLite databases.")
+        with tempfile.TemporaryDirectory() as tmp:
+            results = {mode: self._run(mode, Path(tmp), opts) for mode in MODES}
+
+        self.stdout.write(f"\n{'':10}{'stock':>36}   {'tuned':>36}")
+        self.stdout.write(f"{'operators':10}" + "   ".join(
+            [f"{'scans/s':>9} {'p95 ms':>9} {'p99 ms':>9} {'locks':>6}"] * 2))
+        stock, tuned = ({r['operators']: r for r in results[m]['levels']} for m in MODES)
+        for n in sorted(stock):
+            self.stdout.write(f"{n:<10}" + "   ".join(
+                f"{r['scans_per_s']:9.1f} {r['latency_ms']['p95']:9.1f} "
+                f"{r['latency_ms']['p99']:9.1f} {r['counts'].get('lock_errors', 0):6}"
+                for r in (stock[n], tuned[n])))
+
+    def _run(self, mode, tmp, opts):
+        db, output = tmp / f'{mode}.sqlite3', tmp / f'{mode}.json'
+        source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+        copy = sqlite3.connect(db)
+        try:
+            source.backup(copy)
+            # journal_mode sticks to the file: start both from the stock one
+            copy.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            source.close()
+            copy.close()
+
+        self.stdout.write(f"\n── {mode} ──")
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'loadtest_scanners',
+                   '--operators', opts['operators'], '--seconds', str(opts['seconds']),
+                   '--think-ms', str(opts['think_ms']), '--mix', opts['mix'],
+                   '--batch', str(opts['batch']), '--rolls', str(opts['rolls']),
+                   '--output', str(output), '--keep']
+        env = {**os.environ, **MODES[mode], 'DB_NAME': str(db)}
+        done = subprocess.run(command, env=env, stdout=subprocess.PIPE, text=True)
+        self.stdout.write(done.stdout)
+        if done.returncode:
+            raise CommandError(f"loadtest_scanners failed in {mode} mode")
+        with open(output) as f:
+            return json.load(f)
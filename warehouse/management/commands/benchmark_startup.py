@@ -0,0 +1,93 @@
+# warehouse/management/commands/benchmark_startup.py
+"""
+What a worker pays before its first request, from ``python -X importtime``.
+
+Starts a fresh interpreter --repeat times that sets Django up and imports
+the URLconf (--target setup stops after django.setup(), which is what a
+management command such as the reconcile cron pays) and reports the
+median wall time and import time, the heaviest top-level imports and
+their totals per package.
+
+HEAVY modules are only wanted on first use (an upload, a QR render, an
+Excel export); any of them loaded at start-up is flagged, and the test
+suite fails on it for the URLconf.
+
+    manage.py benchmark_startup --repeat 5 --top 15
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+HEAVY = ('pandas', 'numpy', 'openpyxl', 'qrcode', 'PIL')
+
+SCRIPTS = {
+    'setup': "import django; django.setup()",
+    'urls':  "import django; django.setup(); "
+             "from django.conf import settings; __import__(settings.ROOT_URLCONF)",
+}
+
+
+def profile(target='urls'):
+    """
+    One cold start: ``(wall seconds, [(cumulative µs, module), …] for the
+    top-level imports, HEAVY modules loaded)``.
+    """
+    script = SCRIPTS[target] + (
+        "; import sys; print(','.join(m for m in %r if m in sys.modules))" % (HEAVY,))
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+    env.pop('RUN_MAIN', None)           # no scheduler in the child
+    start = time.perf_counter()
+    done = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], env=env,
+                          cwd=settings.BASE_DIR, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+
+    imports = []
+    for line in done.stderr.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # nested imports are indented two more spaces per level
+        if not name.startswith('  '):
+            imports.append((int(cumulative), name.strip()))
+    return wall, imports, [m for m in done.stdout.strip().split(',') if m]
+
+
+class Command(BaseCommand):
+    help = 'Cold start time of a worker and its heaviest imports (python -X importtime).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=sorted(SCRIPTS), default='urls')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15)
+
+    def handle(self, *args, **opts):
+        runs = [profile(opts['target']) for _ in range(opts['repeat'])]
+        walls = [wall for wall, _, _ in runs]
+        totals = [sum(us for us, _ in imports) / 1e6 for _, imports, _ in runs]
+        _, imports, heavy = runs[-1]
+
+        self.stdout.write(f"{opts['target']}: wall {statistics.median(walls) * 1000:.0f} ms, "
+                          f"imports {statistics.median(totals) * 1000:.0f} ms "
+                          f"(median of {len(runs)})\n")
+        self.stdout.write("Heaviest top-level imports:")
+        for us, name in sorted(imports, reverse=True)[:opts['top']]:
+            self.stdout.write(f"  {us / 1000:8.1f} ms  {name}")
+
+        packages = defaultdict(int)
+        for us, name in imports:
+            packages[name.split('.')[0]] += us
+        self.stdout.write("\nBy package:")
+        for name, us in sorted(packages.items(), key=lambda p: -p[1])[:opts['top']]:
+            self.stdout.write(f"  {us / 1000:8.1f} ms  {name}")
+
+        if heavy:
+            self.stdout.write(self.style.ERROR(
+                f"\nLoaded at start-up, should be on first use: {', '.join(heavy)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"\nNone of {', '.join(HEAVY)} loaded at start-up"))
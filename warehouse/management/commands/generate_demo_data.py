@@ -0,0 +1,202 @@
+# warehouse/management/commands/generate_demo_data.py
+"""
+Fill the database with a plant's worth of made-up stock, for benchmarks
+and for trying the app out: a grid of racks per department, materials,
+batches, rolls and --months of scan history ending today.
+
+Each roll goes through a plausible life: produced, usually put away on a
+rack of its department, sometimes transferred, often dispatched.  Rolls,
+batches and their transactions are inserted with bulk_create() in chunks,
+then the rack counters and the search index are rebuilt once, so a million
+rolls take minutes rather than hours.  Bulk inserts write no change-feed
+entries; mirrored clients resync.
+
+Everything it creates is marked (DEMO- materials, DEMO customers), and
+--clear removes the lot before generating.  Racks are shared with real
+data of the same code and are left in place.
+
+Point it at a scratch database – it is not meant for production.
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from warehouse import search, stock
+from warehouse.models import (Batch, Customer, Department, Location, Material, Roll, Transaction,
+                              TransactionArchive)
+
+PREFIX = 'DEMO-'
+
+PRODUCTS = ['PP Film', 'BOPP Tape', 'HDPE Fabric', 'Laminated Fabric', 'FIBC Body',
+            'Tarpaulin', 'Belt Fabric', 'Pouch Film', 'Coated Fabric', 'Leno Mesh']
+COLOURS  = ['Natural', 'White', 'Black', 'Blue', 'Green', 'Printed']
+USERS    = [f'sk{i:02d}' for i in range(1, 21)]
+
+
+class Command(BaseCommand):
+    help = 'Generate demo racks, materials, rolls and scan history at a given scale.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rolls', type=int, default=10000)
+        parser.add_argument('--departments', default='FM,LM,TP,FL',
+                            help='Comma-separated department codes to spread the rolls over')
+        parser.add_argument('--rows', type=int, default=6, help='Rack rows per department')
+        parser.add_argument('--cols', type=int, default=10, help='Rack columns per department')
+        parser.add_argument('--months', type=int, default=6, help='Months of history')
+        parser.add_argument('--rolls-per-batch', type=int, default=20)
+        parser.add_argument('--batches-per-material', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--chunk', type=int, default=5000, help='Rolls per insert round')
+        parser.add_argument('--clear', action='store_true', help='Remove earlier demo data first')
+
+    def handle(self, *args, **opts):
+        self.rng = random.Random(opts['seed'])
+        codes = [c.strip().upper() for c in opts['departments'].split(',') if c.strip()]
+        depts = {d.code: d for d in Department.objects.filter(code__in=codes)}
+        missing = set(codes) - set(depts)
+        if missing:
+            raise CommandError(f"Unknown department(s): {', '.join(sorted(missing))}")
+        if opts['rows'] > 26:
+            raise CommandError("At most 26 rack rows (A–Z).")
+
+        started = time.perf_counter()
+        if opts['clear']:
+            self._clear()
+
+        self.racks     = self._racks(depts, opts['rows'], opts['cols'])
+        self.customers = self._customers()
+        self.now       = timezone.now()
+        self.span      = timedelta(days=30 * opts['months'])
+
+        per_material = opts['rolls_per_batch'] * opts['batches_per_material']
+        materials = self._materials(depts, -(-opts['rolls'] // per_material))
+        # whole batches per round, so no batch is split over two
+        chunk = max(opts['chunk'] // opts['rolls_per_batch'], 1) * opts['rolls_per_batch']
+
+        made, tx_count = 0, 0
+        while made < opts['rolls']:
+            n = min(chunk, opts['rolls'] - made)
+            tx_count += self._chunk(materials, made, n, opts['rolls_per_batch'],
+                                    opts['batches_per_material'])
+            made += n
+            self.stdout.write(f"  {made} rolls, {tx_count} transactions")
+
+        stock.recount()
+        search.rebuild()
+        racks = sum(len(r) for r in self.racks.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {made} rolls, {tx_count} transactions on {racks} racks "
+            f"in {time.perf_counter() - started:.1f}s"))
+
+    # ── setup ───────────────────────────────────────────────────────────
+
+    def _clear(self):
+        rolls = Roll.objects.filter(batch__material__material_number__startswith=PREFIX)
+        Transaction.objects.filter(roll__in=rolls).delete()
+        TransactionArchive.objects.filter(roll__in=rolls).delete()
+        # Roll.delete() signals fire per row (counters, search, change feed);
+        # drop them in one statement and rebuild what those keep below
+        with connection.cursor() as cur:
+            cur.execute(
+                f"DELETE FROM {Roll._meta.db_table} WHERE batch_id IN "
+                f"(SELECT b.id FROM {Batch._meta.db_table} b "
+                f"JOIN {Material._meta.db_table} m ON m.id = b.material_id "
+                f"WHERE m.material_number LIKE %s)", [PREFIX + '%'])
+        Material.objects.filter(material_number__startswith=PREFIX).delete()
+        Customer.objects.filter(name__startswith='DEMO ').delete()
+        stock.recount()
+        search.rebuild()
+
+    def _racks(self, depts, rows, cols):
+        racks = {}
+        for code, dept in depts.items():
+            racks[code] = []
+            for r in range(rows):
+                for c in range(1, cols + 1):
+                    loc, _ = Location.objects.get_or_create(
+                        location_code=f'{code}{chr(65 + r)}{c:02d}',
+                        defaults={'type': 'STORAGE', 'department': dept,
+                                  'row': chr(65 + r), 'column': str(c)},
+                    )
+                    racks[code].append(loc)
+        return racks
+
+    def _customers(self):
+        return [Customer.objects.get_or_create(name=f'DEMO Customer {i:02d}')[0]
+                for i in range(1, 41)]
+
+    def _materials(self, depts, count):
+        start = Material.objects.filter(material_number__startswith=PREFIX).count()
+        codes = list(depts)
+        rows = [Material(
+                    material_number=f'{PREFIX}{start + i:07d}',
+                    description=(f"{self.rng.choice(PRODUCTS)} {self.rng.choice(COLOURS)} "
+                                 f"{self.rng.choice([40, 50, 60, 75, 90, 120])} GSM "
+                                 f"{self.rng.choice([300, 600, 900, 1200, 1500])}mm"),
+                    department=depts[codes[i % len(codes)]],
+                ) for i in range(count)]
+        Material.objects.bulk_create(rows, batch_size=1000)
+        return list(Material.objects.filter(material_number__in=[m.material_number for m in rows])
+                                    .select_related('department').order_by('id'))
+
+    # ── one round of rolls ──────────────────────────────────────────────
+
+    def _chunk(self, materials, offset, n, per_batch, per_material):
+        with transaction.atomic():
+            first = offset // per_batch
+            batches, produced = [], []
+            for b in range(first, -(-(offset + n) // per_batch)):
+                material = materials[(b // per_material) % len(materials)]
+                batches.append(Batch(material=material, batch_number=f'B{b:08d}'))
+                produced.append(self.now - self.span * self.rng.random())
+            Batch.objects.bulk_create(batches, batch_size=1000)
+            # created_at is auto_now_add: back-date it afterwards
+            for batch, when in zip(batches, produced):
+                batch.created_at = when
+            Batch.objects.bulk_update(batches, ['created_at'], batch_size=1000)
+
+            rolls, lives = [], []
+            for i in range(offset, offset + n):
+                batch = batches[i // per_batch - first]
+                life = self._life(batch.material.department.code,
+                                  produced[i // per_batch - first])
+                last = life[-1] if life else (None, None, None, None)
+                rolls.append(Roll(batch=batch, weight_kg=round(self.rng.uniform(20, 900), 1),
+                                  current_location=last[1] if last[0] != 'DISPATCH' else None,
+                                  last_action=last[0]))
+                lives.append(life)
+            Roll.objects.bulk_create(rolls, batch_size=1000)
+
+            txs = [Transaction(roll=roll, action=action, location=loc, customer=customer,
+                               user=self.rng.choice(USERS), scanned_at=when,
+                               department=roll.batch.material.department)
+                   for roll, life in zip(rolls, lives)
+                   for action, loc, customer, when in life]
+            Transaction.objects.bulk_create(txs, batch_size=2000)
+        return len(txs)
+
+    def _life(self, dept, produced):
+        """The scans of one roll: ``[(action, location, customer, scanned_at), …]``."""
+        rng, racks = self.rng, self.racks[dept]
+        when = produced
+        def later(hours):
+            nonlocal when
+            when = min(when + timedelta(hours=rng.uniform(0.2, hours)), self.now)
+            return when
+
+        if rng.random() < 0.1:
+            return []                               # still waiting for putaway
+        rack = rng.choice(racks)
+        life = [('PUTAWAY', rack, None, later(12))]
+        if rng.random() < 0.3:
+            rack = rng.choice(racks)
+            life.append(('TRANSFER', rack, None, later(24 * 7)))
+            if rng.random() < 0.5:
+                life.append(('PUTAWAY', rack, None, later(4)))
+        if rng.random() < 0.55:
+            life.append(('DISPATCH', None, rng.choice(self.customers), later(24 * 30)))
+        return life
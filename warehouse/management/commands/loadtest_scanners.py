@@ -0,0 +1,296 @@
+# warehouse/management/commands/loadtest_scanners.py
+"""
+Load test: N operators on handhelds, doing what the mobile pages do.
+
+Each simulated operator runs one flow after another, picked by --mix:
+
+    store     scan 1–--batch rolls (GET /api/rolls/<id>/ each), PUTAWAY to a rack
+    transfer  the same, TRANSFER to another rack
+    dispatch  the same, DISPATCH to a customer
+    qa        GET /api/rolls/<id>/, the roll's last scan from
+              GET /api/transactions/, then QA_SCAN
+
+Scans are sent the way ScanQueue sends them, as one batch to
+POST /api/transactions/sync/.  Operators wait a log-normal think time
+(median --think-ms) before every scan, like someone walking to the next
+roll.  Rolls move through a shared pool, so every scan is one the floor
+could really make.
+
+Requests go through Django's handler in-process, one thread and one
+database connection per operator, as with a threaded worker.  For each
+--operators level the command reports throughput, p50/p95/p99 per request
+type, and SQLite lock errors: "database is locked" raised out of a view,
+or a scan the sync endpoint answered with "retry".  Business rejections
+(e.g. a transition the rules refuse) are counted separately.  The highest
+level whose p95 stays under --target-ms with lock errors under
+--max-lock-rate is reported as the ceiling.
+
+Works on throw‑away LOAD rolls and racks, removed afterwards unless --keep.
+"""
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from warehouse.models import Batch, Customer, Location, Material, Roll
+
+FLOWS = ('store', 'transfer', 'dispatch', 'qa')
+# what a roll's last action must be for a flow to pick it up
+TAKES = {
+    'store':    (None, 'TRANSFER'),
+    'transfer': (None, 'PUTAWAY'),
+    'dispatch': ('PUTAWAY', 'TRANSFER', 'QA_SCAN'),
+    'qa':       (None, 'PUTAWAY', 'TRANSFER', 'QA_SCAN'),
+}
+ACTION = {'store': 'PUTAWAY', 'transfer': 'TRANSFER', 'dispatch': 'DISPATCH', 'qa': 'QA_SCAN'}
+
+
+class Pool:
+    """Rolls by last action, shared by the operators so no two scan the same roll."""
+
+    def __init__(self, roll_ids):
+        self._lock  = threading.Lock()
+        self._rolls = defaultdict(deque)
+        self._rolls[None].extend(roll_ids)
+
+    def take(self, flow, n, rng):
+        with self._lock:
+            states = [s for s in TAKES[flow] if self._rolls[s]]
+            taken = []
+            while states and len(taken) < n:
+                state = rng.choice(states)
+                taken.append((self._rolls[state].popleft(), state))
+                if not self._rolls[state]:
+                    states.remove(state)
+            return taken
+
+    def put(self, roll_id, state):
+        if state == 'DISPATCH':
+            return                  # gone from the floor
+        with self._lock:
+            self._rolls[state].append(roll_id)
+
+
+class Command(BaseCommand):
+    help = 'Simulate concurrent handheld operators and find the capacity ceiling.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operators', default='5,10,20,40',
+                            help='Comma-separated operator counts, run in turn')
+        parser.add_argument('--seconds', type=float, default=30, help='Per operator count')
+        parser.add_argument('--mix', default='store=40,transfer=20,dispatch=30,qa=10',
+                            help='Relative weight of each flow')
+        parser.add_argument('--batch', type=int, default=6, help='Most rolls scanned per flow')
+        parser.add_argument('--think-ms', type=float, default=1500,
+                            help='Median pause before each scan')
+        parser.add_argument('--rolls', type=int, default=3000)
+        parser.add_argument('--racks', type=int, default=12)
+        parser.add_argument('--target-ms', type=float, default=500, help='p95 latency budget')
+        parser.add_argument('--max-lock-rate', type=float, default=0.01,
+                            help='Share of scans allowed to hit a lock error')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--output', help='Also write the results to this JSON file')
+        parser.add_argument('--keep', action='store_true', help="Don't delete the LOAD data")
+
+    def handle(self, *args, **opts):
+        self.mix = self._mix(opts['mix'])
+        levels = sorted(int(n) for n in opts['operators'].split(','))
+        self.rng = random.Random(opts['seed'])
+
+        tag = uuid.uuid4().hex[:6].upper()
+        material = Material.objects.create(material_number=f'LOAD-{tag}', description='load test')
+        batch = Batch.objects.create(material=material, batch_number=tag)
+        racks = [Location.objects.create(location_code=f'LD{tag[:3]}{i:02d}', type='STORAGE')
+                 for i in range(1, opts['racks'] + 1)]
+        customers = [Customer.objects.create(name=f'LOAD {tag} {i}') for i in range(5)]
+        rolls = Roll.objects.bulk_create(
+            [Roll(batch=batch, weight_kg=self.rng.randint(20, 900)) for _ in range(opts['rolls'])])
+        user = User.objects.create_superuser(f'load-{tag.lower()}', password=None)
+
+        self.codes     = [r.location_code for r in racks]
+        self.customers = [c.name for c in customers]
+        self.pool      = Pool([str(r.roll_id) for r in rolls])
+        # failed requests are counted below, not logged one by one
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        report = []
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for n in levels:
+                    report.append(self._level(n, user, opts))
+        finally:
+            if not opts['keep']:
+                material.delete()
+                Location.objects.filter(pk__in=[r.pk for r in racks]).delete()
+                Customer.objects.filter(pk__in=[c.pk for c in customers]).delete()
+                user.delete()
+
+        ok = [r['operators'] for r in report if r['within_budget']]
+        self.stdout.write(self.style.SUCCESS(
+            f"capacity ceiling: {ok[-1] if ok else 'below ' + str(levels[0])} operators "
+            f"(p95 ≤ {opts['target_ms']:.0f} ms, lock errors ≤ {opts['max_lock_rate']:.0%})"))
+        if opts['output']:
+            with open(opts['output'], 'w') as f:
+                json.dump({'started_at': timezone.now().isoformat(), 'options': {
+                    k: opts[k] for k in ('mix', 'batch', 'think_ms', 'seconds', 'target_ms')},
+                    'levels': report}, f, indent=2)
+
+    @staticmethod
+    def _mix(spec):
+        weights = {}
+        for part in spec.split(','):
+            flow, _, weight = part.partition('=')
+            if flow.strip() not in FLOWS:
+                raise CommandError(f"Unknown flow {flow!r}; choose from {', '.join(FLOWS)}")
+            weights[flow.strip()] = float(weight or 1)
+        return weights
+
+    # ── one operator count ──────────────────────────────────────────────
+
+    def _level(self, n, user, opts):
+        stop = time.perf_counter() + opts['seconds']
+        lock = threading.Lock()
+        latencies = defaultdict(list)           # request type → seconds
+        counts = defaultdict(int)
+        seeds = [self.rng.random() for _ in range(n)]
+
+        def operator(seed):
+            rng = random.Random(seed)
+            local_lat, local_counts = defaultdict(list), defaultdict(int)
+            client = Client(raise_request_exception=True)
+            client.force_login(user)
+            try:
+                while time.perf_counter() < stop:
+                    flow = rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+                    self._flow(flow, client, rng, opts, local_lat, local_counts)
+            finally:
+                connection.close()
+                with lock:
+                    for k, v in local_lat.items():
+                        latencies[k].extend(v)
+                    for k, v in local_counts.items():
+                        counts[k] += v
+
+        threads = [threading.Thread(target=operator, args=(s,)) for s in seeds]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        return self._report(n, elapsed, latencies, counts, opts)
+
+    def _flow(self, flow, client, rng, opts, lat, counts):
+        size = 1 if flow == 'qa' else rng.randint(1, opts['batch'])
+        taken = self.pool.take(flow, size, rng)
+        if not taken:
+            counts['starved'] += 1
+            self._think(rng, opts)
+            return
+        scans, done = [], set()
+        try:
+            for roll_id, _ in taken:
+                self._think(rng, opts)
+                if self._call(client.get, f'/api/rolls/{roll_id}/', 'verify', lat, counts) is None:
+                    continue
+                if flow == 'qa':
+                    # as roll_scan.html asks for the roll's last scan
+                    self._call(client.get, f'/api/transactions/?roll={roll_id}&ordering=-scanned_at&limit=1',
+                               'last_scan', lat, counts)
+                scan = {'id': uuid.uuid4().hex, 'roll': roll_id, 'action': ACTION[flow],
+                        'user': 'load', 'scanned_at': timezone.now().isoformat()}
+                if flow in ('store', 'transfer'):
+                    scan['location'] = rng.choice(self.codes)
+                elif flow == 'dispatch':
+                    scan['customer'] = rng.choice(self.customers)
+                scans.append(scan)
+
+            outcome = {}
+            if scans:
+                response = self._call(client.post, '/api/transactions/sync/', 'sync', lat, counts,
+                                      {'scans': scans}, content_type='application/json')
+                if response is not None and response.status_code == 200:
+                    outcome = {r['id']: r['status'] for r in response.json()['results']}
+            for scan in scans:
+                status = outcome.get(scan['id'], 'lost')
+                counts['scans'] += 1
+                counts[{'applied': 'applied', 'duplicate': 'applied', 'retry': 'lock_errors',
+                        'lost': 'lost'}.get(status, 'rejected')] += 1
+                if status == 'applied':
+                    counts[f'applied_{flow}'] += 1
+            done = {s['roll'] for s in scans if outcome.get(s['id']) == 'applied'}
+        finally:
+            # back into the pool where the server left it
+            for roll_id, state in taken:
+                self.pool.put(roll_id, ACTION[flow] if roll_id in done else state)
+
+    def _call(self, method, path, kind, lat, counts, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = method(path, *args, **kwargs)
+        except OperationalError as e:
+            counts['lock_errors' if 'locked' in str(e) else 'errors'] += 1
+            return None
+        except Exception:
+            counts['errors'] += 1
+            return None
+        finally:
+            lat[kind].append(time.perf_counter() - start)
+        if response.status_code >= 500:
+            counts['errors'] += 1
+            return None
+        return response
+
+    @staticmethod
+    def _think(rng, opts):
+        if opts['think_ms'] > 0:
+            time.sleep(rng.lognormvariate(math.log(opts['think_ms'] / 1000), 0.5))
+
+    # ── results ─────────────────────────────────────────────────────────
+
+    def _report(self, n, elapsed, latencies, counts, opts):
+        every = sorted(v for vs in latencies.values() for v in vs)
+        requests = {kind: _percentiles(sorted(vs)) for kind, vs in sorted(latencies.items())}
+        overall = _percentiles(every)
+        lock_rate = counts['lock_errors'] / counts['scans'] if counts['scans'] else 0
+        result = {
+            'operators':      n,
+            'seconds':        round(elapsed, 1),
+            'requests_per_s': round(len(every) / elapsed, 1),
+            'scans_per_s':    round(counts['applied'] / elapsed, 1),
+            'latency_ms':     overall,
+            'by_request':     requests,
+            'counts':         dict(counts),
+            'lock_rate':      round(lock_rate, 4),
+        }
+        result['within_budget'] = bool(every) and overall['p95'] <= opts['target_ms'] \
+            and lock_rate <= opts['max_lock_rate'] and not counts['errors']
+
+        self.stdout.write(
+            f"{n:4} operators: {result['requests_per_s']:7.1f} req/s, "
+            f"{result['scans_per_s']:6.1f} scans/s; p50 {overall['p50']:7.1f} ms, "
+            f"p95 {overall['p95']:7.1f} ms, p99 {overall['p99']:7.1f} ms; "
+            f"lock errors {counts['lock_errors']}, errors {counts['errors']}, "
+            f"rejected {counts['rejected']}, starved {counts['starved']}")
+        for kind, p in requests.items():
+            self.stdout.write(f"       {kind:10} n={p['n']:<6} p50 {p['p50']:7.1f}  "
+                              f"p95 {p['p95']:7.1f}  p99 {p['p99']:7.1f} ms")
+        return result
+
+
+def _percentiles(values):
+    def at(q):
+        return round(values[min(max(math.ceil(len(values) * q) - 1, 0), len(values) - 1)] * 1000, 1)
+    if not values:
+        return {'n': 0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+    return {'n': len(values), 'p50': at(0.50), 'p95': at(0.95), 'p99': at(0.99)}
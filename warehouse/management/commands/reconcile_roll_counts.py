@@ -1,53 +1,82 @@
 # warehouse/management/commands/reconcile_roll_counts.py
+import time
+
 from django.core.management.base import BaseCommand
 from django.core.mail import mail_admins
-from django.db.models import Max
+from django.db.models import Count, Max
+from warehouse import metrics
+from warehouse.routers import replica
 from warehouse.models import Location, Roll, Transaction
 
 class Command(BaseCommand):
     help = 'Reconcile per-location roll counts between API logic and dashboard logic.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Rebuild the per-location occupancy counters afterwards')
+
     def handle(self, *args, **options):
+        started = time.perf_counter()
         mismatches = []
 
-        # 1) Build dashboard counts: for each location, count rolls whose latest tx points here
-        #    (i.e. latest transaction per roll with action PUTAWAY/TRANSFER/TEMP_STORAGE whose location matches)
-        latest = (
-            Transaction.objects
-            .values('roll')
-            .annotate(last_ts=Max('scanned_at'))
-        )
-        latest_txs = Transaction.objects.filter(
-            scanned_at__in=[l['last_ts'] for l in latest]
-        )
-
-        dashboard_map = { loc.location_code: 0 for loc in Location.objects.all() }
-        # dispatched we ignore for this comparison (or you can add 'DISPATCHED' if you like)
-        for tx in latest_txs:
-            if tx.location:
-                dashboard_map[tx.location.location_code] += 1
-
-        # 2) Build API counts: count rolls whose current_location == each rack
-        api_map = {}
-        for loc in Location.objects.all():
-            api_map[loc.location_code] = Roll.objects.filter(current_location=loc.location_code).count()
-
-        # 3) Compare
-        for code in dashboard_map:
-            dcount = dashboard_map[code]
-            acount = api_map.get(code, 0)
-            if dcount != acount:
-                mismatches.append((code, dcount, acount))
+        # the comparison only reads: from the replica, when there is one
+        with replica():
+            # 1) Build dashboard counts: for each location, count rolls whose latest tx points here
+            #    (i.e. latest transaction per roll with action PUTAWAY/TRANSFER/TEMP_STORAGE whose location matches)
+            latest = (
+                Transaction.objects
+                .values('roll')
+                .annotate(last_ts=Max('scanned_at'))
+            )
+            latest_txs = Transaction.objects.filter(
+                scanned_at__in=[l['last_ts'] for l in latest]
+            ).select_related('location')
+
+            dashboard_map = { loc.location_code: 0 for loc in Location.objects.all() }
+            # dispatched we ignore for this comparison (or you can add 'DISPATCHED' if you like)
+            for tx in latest_txs:
+                if tx.location:
+                    dashboard_map[tx.location.location_code] += 1
+
+            # 2) Build API counts: rolls per current_location, one GROUP BY
+            api_map = dict(
+                Roll.objects.exclude(current_location=None)
+                    .values_list('current_location')
+                    .annotate(n=Count('id'))
+            )
+
+            # 3) Compare
+            for code in dashboard_map:
+                dcount = dashboard_map[code]
+                acount = api_map.get(code, 0)
+                if dcount != acount:
+                    mismatches.append((code, dcount, acount))
+
+            # 3b) The occupancy counters must agree with the roll table too
+            counter_off = [
+                (code, n, api_map.get(code, 0))
+                for code, n in Location.objects.values_list('location_code', 'roll_count')
+                if n != api_map.get(code, 0)
+            ]
+
+        metrics.reconciled(time.perf_counter() - started, len(mismatches) + len(counter_off))
 
         # 4) Report
-        if mismatches:
+        if mismatches or counter_off:
             subject = '‼️ Warehouse Roll‐Count Mismatch'
             body = 'Found count discrepancies:\n\n' + '\n'.join(
-                f"{loc}: Dashboard={dcount} vs API={acount}"
-                for loc, dcount, acount in mismatches
+                [f"{loc}: Dashboard={dcount} vs API={acount}"
+                 for loc, dcount, acount in mismatches] +
+                [f"{loc}: Counter={n} vs API={acount}"
+                 for loc, n, acount in counter_off]
             )
             # email all in ADMINS
             mail_admins(subject, body)
             self.stdout.write(self.style.ERROR(body))
         else:
             self.stdout.write(self.style.SUCCESS('✅ All location counts match'))
+
+        if options['fix']:
+            from warehouse import stock
+            fixed = stock.recount()
+            self.stdout.write(f"Recounted occupancy; corrected: {', '.join(fixed) or 'none'}")
@@ -0,0 +1,250 @@
+# warehouse/management/commands/run_benchmarks.py
+"""
+End-to-end timings of the heavy pages and jobs at several data sizes,
+written to a JSON report that can be compared across releases.
+
+For every --scales roll count it regenerates the demo data
+(generate_demo_data --clear) and times, through Django's test client:
+
+    dashboard, dashboard_dept      /dashboard/ for the plant and one department
+    print_search, print_search_q   /print/ plain and with a search term
+    roll_detail, roll_history      /api/rolls/<id>/ and …/history/
+    location_rolls                 /api/locations/<code>/rolls/
+    transaction_commit             POST /api/transactions/ (a PUTAWAY)
+    sap_import                     POST /entry/ with a --import-rows SAP sheet
+    master_export                  /admin/warehouse/master_export/
+    reconciliation                 reconcile_roll_counts
+
+The unpaginated list endpoints are left out: at these sizes they measure
+serializing the whole table.  Each case runs --repeat times (the last
+three --heavy-repeat times) and reports min / median / p95 / max
+milliseconds and the queries of one run.
+
+    manage.py run_benchmarks --scales 10000,100000 --compare logs/benchmarks/old.json
+
+Point it at a scratch database: it creates and deletes demo data.
+"""
+import io
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import uuid
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from warehouse.models import Location, Material, Roll, Transaction
+
+from .generate_demo_data import PREFIX
+
+HEAVY = ('sap_import', 'master_export', 'reconciliation')
+
+
+class Command(BaseCommand):
+    help = 'Time dashboard, search, APIs, import, export and reconciliation at several data sizes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='10000,100000,1000000',
+                            help='Comma-separated roll counts')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--heavy-repeat', type=int, default=1,
+                            help=f"Runs of {', '.join(HEAVY)}")
+        parser.add_argument('--import-rows', type=int, default=200)
+        parser.add_argument('--only', default='', help='Comma-separated cases to run')
+        parser.add_argument('--skip', default='', help='Comma-separated cases to leave out')
+        parser.add_argument('--no-generate', action='store_true',
+                            help='Benchmark the data already there, once')
+        parser.add_argument('--output', help='Report path (default LOGS_DIR/benchmarks/<time>.json)')
+        parser.add_argument('--compare', help='Earlier report to print the change against')
+
+    def handle(self, *args, **opts):
+        only = {c for c in opts['only'].split(',') if c}
+        skip = {c for c in opts['skip'].split(',') if c}
+        self.cases = [name for name in CASES if (not only or name in only) and name not in skip]
+        scales = [None] if opts['no_generate'] else [int(n) for n in opts['scales'].split(',')]
+
+        report = {
+            'started_at': timezone.now().isoformat(),
+            'git':        _git_revision(),
+            'python':     platform.python_version(),
+            'django':     django.get_version(),
+            'database':   connection.vendor,
+            'scales':     [],
+        }
+        media = tempfile.mkdtemp()
+        user = User.objects.create_superuser(f'bench-{uuid.uuid4().hex[:8]}', password=None)
+        try:
+            # QR files of imported rolls and reconciliation mail go nowhere
+            with override_settings(MEDIA_ROOT=media,
+                                   ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                                   EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+                self.client = Client(raise_request_exception=False)
+                self.client.force_login(user)
+                # the entry form only offers a profile's home department
+                self.import_dept = user.profile.department.code
+                for rolls in scales:
+                    report['scales'].append(self._scale(rolls, opts))
+        finally:
+            user.delete()
+            shutil.rmtree(media, ignore_errors=True)
+
+        path = self._write(report, opts['output'])
+        self.stdout.write(self.style.SUCCESS(f"Report written to {path}"))
+        if opts['compare']:
+            self._compare(report, opts['compare'])
+
+    # ── one data size ───────────────────────────────────────────────────
+
+    def _scale(self, rolls, opts):
+        entry = {}
+        if rolls is not None:
+            start = time.perf_counter()
+            call_command('generate_demo_data', rolls=rolls, clear=True, stdout=io.StringIO())
+            entry['generate_s'] = round(time.perf_counter() - start, 1)
+        entry.update(rolls=Roll.objects.count(), transactions=Transaction.objects.count())
+        entry['scale'] = rolls or entry['rolls']
+        self.stdout.write(f"\n{entry['rolls']} rolls, {entry['transactions']} transactions")
+
+        self.fixture = self._fixture()
+        entry['results'] = []
+        for name in self.cases:
+            runs = opts['heavy_repeat'] if name in HEAVY else opts['repeat']
+            result = self._time(name, runs, opts)
+            entry['results'].append(result)
+            self.stdout.write(
+                f"  {name:20} median {result['median_ms']:9.1f} ms  p95 {result['p95_ms']:9.1f} ms  "
+                f"{result['queries']:6} queries" + (f"  HTTP {result['status']}" if result['status'] >= 400 else ''))
+        return entry
+
+    def _fixture(self):
+        """A roll, a busy rack, a search word and rolls still to put away."""
+        roll = (Roll.objects.filter(transaction__isnull=False).order_by('-id')
+                            .values_list('roll_id', flat=True).first())
+        rack = (Location.objects.order_by('-roll_count').values_list('location_code', flat=True).first())
+        material = Material.objects.order_by('-id').first()
+        pending = list(Roll.objects.filter(last_action__isnull=True).order_by('-id')
+                                   .values_list('roll_id', flat=True)[:200])
+        return {
+            'roll': roll, 'rack': rack, 'pending': pending,
+            'word': material.description.split()[0] if material else 'roll',
+            'dept': rack[:2] if rack else '',
+        }
+
+    def _time(self, name, runs, opts):
+        samples, status = [], 0
+        for i in range(runs):
+            queries = [0]
+
+            def count(execute, sql, params, many, context):
+                queries[0] += 1
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count):
+                start = time.perf_counter()
+                status = CASES[name](self, i, opts)
+                samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return {
+            'case':      name,
+            'runs':      runs,
+            'min_ms':    round(samples[0], 1),
+            'median_ms': round(statistics.median(samples), 1),
+            'p95_ms':    round(samples[max(int(len(samples) * 0.95) - 1, 0)], 1),
+            'max_ms':    round(samples[-1], 1),
+            'queries':   queries[0],
+            'status':    status,
+        }
+
+    # ── cases (each returns an HTTP status) ─────────────────────────────
+
+    def _get(self, path):
+        response = self.client.get(path)
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def _commit(self, i, opts):
+        pending = self.fixture['pending']
+        if i >= len(pending) or not self.fixture['rack']:
+            return 0
+        return self.client.post('/api/transactions/', {
+            'roll': str(pending[i]), 'action': 'PUTAWAY',
+            'location': self.fixture['rack'], 'user': 'bench',
+        }, content_type='application/json').status_code
+
+    def _import(self, i, opts):
+        tag = uuid.uuid4().hex[:6].upper()
+        dept = self.import_dept
+        lines = ['Material,Material Description,Batch,Quantity in Kg,Posting Date,Storage Location']
+        lines += [f'{PREFIX}IMP{tag}{n % 50:03d},Imported {n % 50},{tag}{n:06d},{100 + n % 400},'
+                  f'{timezone.localdate():%Y-%m-%d},{dept}A01'
+                  for n in range(opts['import_rows'])]
+        sheet = io.BytesIO('\n'.join(lines).encode())
+        sheet.name = 'bench.csv'
+        status = self.client.post('/entry/', {'department': dept, 'data_file': sheet}).status_code
+        # success redirects; a 200 is the form back with errors
+        return 422 if status == 200 else status
+
+    def _reconcile(self, i, opts):
+        call_command('reconcile_roll_counts', stdout=io.StringIO())
+        return 200
+
+    # ── report ──────────────────────────────────────────────────────────
+
+    def _write(self, report, path):
+        if path is None:
+            folder = settings.LOGS_DIR / 'benchmarks'
+            folder.mkdir(parents=True, exist_ok=True)
+            path = folder / f"{timezone.localtime():%Y%m%d-%H%M%S}.json"
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return path
+
+    def _compare(self, report, path):
+        with open(path) as f:
+            before = json.load(f)
+        old = {(s['scale'], r['case']): r for s in before['scales'] for r in s['results']}
+        self.stdout.write(f"\nChange against {path} ({before.get('git') or 'unknown revision'}):")
+        for scale in report['scales']:
+            for r in scale['results']:
+                prev = old.get((scale['scale'], r['case']))
+                if not prev or not prev['median_ms']:
+                    continue
+                change = (r['median_ms'] - prev['median_ms']) / prev['median_ms'] * 100
+                line = (f"  {scale['scale']:>8} {r['case']:20} {prev['median_ms']:9.1f} → "
+                        f"{r['median_ms']:9.1f} ms  {change:+6.1f}%")
+                style = self.style.ERROR if change > 10 else self.style.SUCCESS if change < -10 else str
+                self.stdout.write(style(line))
+
+
+CASES = {
+    'dashboard':          lambda cmd, i, o: cmd._get('/dashboard/'),
+    'dashboard_dept':     lambda cmd, i, o: cmd._get(f"/dashboard/?dept={cmd.fixture['dept']}"),
+    'print_search':       lambda cmd, i, o: cmd._get('/print/'),
+    'print_search_q':     lambda cmd, i, o: cmd._get(f"/print/?q={cmd.fixture['word']}"),
+    'roll_detail':        lambda cmd, i, o: cmd._get(f"/api/rolls/{cmd.fixture['roll']}/"),
+    'roll_history':       lambda cmd, i, o: cmd._get(f"/api/rolls/{cmd.fixture['roll']}/history/"),
+    'location_rolls':     lambda cmd, i, o: cmd._get(f"/api/locations/{cmd.fixture['rack']}/rolls/"),
+    'transaction_commit': Command._commit,
+    'sap_import':         Command._import,
+    'master_export':      lambda cmd, i, o: cmd._get('/admin/warehouse/master_export/'),
+    'reconciliation':     Command._reconcile,
+}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
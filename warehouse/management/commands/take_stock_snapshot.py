@@ -0,0 +1,24 @@
+# warehouse/management/commands/take_stock_snapshot.py
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from warehouse import snapshots
+
+
+class Command(BaseCommand):
+    help = 'Record where every roll is right now (or at --at) as a StockSnapshot.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--at', help='ISO timestamp to snapshot instead of now')
+
+    def handle(self, *args, **options):
+        at = None
+        if options['at']:
+            at = parse_datetime(options['at'])
+            if at is None:
+                raise CommandError(f"Can't parse --at {options['at']!r}")
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+        snap = snapshots.take_snapshot(at)
+        self.stdout.write(self.style.SUCCESS(f"Snapshot {snap}"))
@@ -0,0 +1,236 @@
+# warehouse/metrics.py
+"""
+Operational metrics, served in the Prometheus text format at GET /metrics.
+
+    its_scan_commits_total{action,outcome}      scans committed / refused
+    its_scan_commit_seconds{action}             time to commit one
+    its_scan_queue_wait_seconds                 … of which waiting for the write queue
+    its_roll_verify_seconds{api,result}         roll look-ups by the scanners
+    its_import_rows_total{result}               BatchEntryView rows imported / skipped
+    its_import_seconds                          time per import
+    its_import_rows_per_second                  throughput of the last import
+    its_qr_render_seconds{target}               QR code renders (file / png)
+    its_label_print_seconds{result}             BarTender calls
+    its_label_print_failures_total              BarTender calls that failed
+    its_reconcile_seconds                       reconciliation runs
+    its_reconcile_mismatches                    mismatches found by the last run
+    its_reconcile_mismatches_total              … and by all of them
+    its_dashboard_build_seconds{view}           dashboard page / live round
+
+Cheap enough to leave on: every thread writes into a shard of its own, so
+recording is a dict lookup and a few additions with no lock taken; the lock
+is only held when a thread records its very first sample and when /metrics
+adds the shards up.  Shards of threads that have finished (the ASGI handler
+runs each request's sync code on a fresh one) are folded into one retired
+total at those moments, so their number stays at the live thread count.
+
+Values live in the process that recorded them.  With several workers,
+scrape each one (or run one); runs of a command from cron in a process of
+its own are not seen.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds; scans and look-ups sit at the low end, imports at the high end
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = []
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name   = name
+        self.help   = help
+        self.labels = tuple(labels)
+        self._local   = threading.local()
+        self._shards  = []          # (thread, shard)
+        self._retired = {}          # shards of finished threads, folded together
+        self._lock    = threading.Lock()
+        _registry.append(self)
+
+    def _shard(self):
+        shard = getattr(self._local, 'values', None)
+        if shard is None:
+            shard = self._local.values = {}
+            with self._lock:
+                self._retire()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire(self):
+        """Fold the shards of finished threads into _retired; hold the lock."""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._fold(self._retired, shard)
+        self._shards = live
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _label_text(self, key, extra=()):
+        pairs = [*zip(self.labels, key), *extra]
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+    def _merged(self):
+        with self._lock:
+            self._retire()
+            shards = [shard for _, shard in self._shards]
+            retired = {key: list(v) if isinstance(v, list) else v
+                       for key, v in self._retired.items()}
+        # a copy per shard: its thread may be adding a key meanwhile
+        return [retired, *(dict(shard) for shard in shards)]
+
+    def expose(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}',
+                *self._samples()]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard, key = self._shard(), self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    @staticmethod
+    def _fold(into, shard):
+        for key, value in shard.items():
+            into[key] = into.get(key, 0) + value
+
+    def _samples(self):
+        totals = {}
+        for shard in self._merged():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return [f'{self.name}{self._label_text(key)} {_number(v)}'
+                for key, v in sorted(totals.items())]
+
+
+class Gauge(_Metric):
+    """Last value set, whichever thread set it."""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        shard, key = self._shard(), self._key(labels)
+        shard[key] = (time.monotonic(), value)
+
+    @staticmethod
+    def _fold(into, shard):
+        for key, entry in shard.items():
+            if key not in into or entry[0] > into[key][0]:
+                into[key] = entry
+
+    def _samples(self):
+        latest = {}
+        for shard in self._merged():
+            for key, entry in shard.items():
+                if key not in latest or entry[0] > latest[key][0]:
+                    latest[key] = entry
+        return [f'{self.name}{self._label_text(key)} {_number(v)}'
+                for key, (_, v) in sorted(latest.items())]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        shard, key = self._shard(), self._key(labels)
+        entry = shard.get(key)
+        if entry is None:
+            # per bucket (last one is +Inf), then sum
+            entry = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    @staticmethod
+    def _fold(into, shard):
+        for key, entry in shard.items():
+            total = into.setdefault(key, [0] * len(entry))
+            for i, v in enumerate(entry):
+                total[i] += v
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the ``with`` block; labels may be filled in inside."""
+        start = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        totals = {}
+        for shard in self._merged():
+            for key, entry in shard.items():
+                total = totals.setdefault(key, [0] * len(entry))
+                for i, v in enumerate(entry):
+                    total[i] += v
+        lines = []
+        for key, entry in sorted(totals.items()):
+            running = 0
+            for bound, n in zip((*self.buckets, '+Inf'), entry[:-1]):
+                running += n
+                le = bound if bound == '+Inf' else _number(bound)
+                lines.append(f'{self.name}_bucket{self._label_text(key, [("le", le)])} {running}')
+            lines.append(f'{self.name}_sum{self._label_text(key)} {_number(entry[-1])}')
+            lines.append(f'{self.name}_count{self._label_text(key)} {running}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def expose():
+    """Every metric, in the Prometheus text format."""
+    return '\n'.join(line for metric in _registry for line in metric.expose()) + '\n'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# The metrics
+# ─────────────────────────────────────────────────────────────────────────────
+
+SCAN_COMMITS   = Counter('its_scan_commits_total', 'Scans committed or refused.',
+                         ['action', 'outcome'])
+SCAN_SECONDS   = Histogram('its_scan_commit_seconds', 'Time to commit one scan.', ['action'])
+SCAN_QUEUE_SECONDS = Histogram('its_scan_queue_wait_seconds', 'Wait for the scan write queue.')
+ROLL_VERIFY    = Histogram('its_roll_verify_seconds', 'Roll look-ups by the scanners.',
+                           ['api', 'result'])
+IMPORT_ROWS    = Counter('its_import_rows_total', 'Rows of batch imports.', ['result'])
+IMPORT_SECONDS = Histogram('its_import_seconds', 'Time per batch import.')
+IMPORT_RATE    = Gauge('its_import_rows_per_second', 'Rows per second of the last batch import.')
+QR_SECONDS     = Histogram('its_qr_render_seconds', 'QR code renders.', ['target'])
+PRINT_SECONDS  = Histogram('its_label_print_seconds', 'BarTender print calls.', ['result'])
+PRINT_FAILURES = Counter('its_label_print_failures_total', 'BarTender print calls that failed.')
+RECONCILE_SECONDS    = Histogram('its_reconcile_seconds', 'Roll-count reconciliation runs.')
+RECONCILE_MISMATCHES = Gauge('its_reconcile_mismatches', 'Mismatches found by the last reconciliation.')
+RECONCILE_MISMATCHES_TOTAL = Counter('its_reconcile_mismatches_total',
+                                     'Mismatches found by all reconciliations.')
+DASHBOARD_SECONDS    = Histogram('its_dashboard_build_seconds', 'Dashboard builds.', ['view'])
+
+
+def reconciled(seconds, mismatches):
+    RECONCILE_SECONDS.observe(seconds)
+    RECONCILE_MISMATCHES.set(mismatches)
+    RECONCILE_MISMATCHES_TOTAL.inc(mismatches)
@@ -1,5 +1,16 @@
 # warehouse/middleware.py
+import cProfile
 import logging
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from whitenoise.middleware import WhiteNoiseMiddleware
 
 logger = logging.getLogger(__name__)
 
@@ -17,3 +28,237 @@ class DebugCSRFOriginMiddleware:
             origin, xf_proto, host, is_secure
         )
         return self.get_response(request)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, able to run under ASGI.  WhiteNoiseMiddleware is sync-only:
+    Django would run everything behind it (the async scan views, the
+    dashboard stream) through a thread for the whole request.  Here
+    anything that isn't a static file is awaited straight through; static
+    files are looked up and opened on a worker thread.
+    """
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(
+                request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Request profiling
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class RequestStats:
+    """
+    The last PROFILING_WINDOW requests per view, in memory (per process):
+    enough to see which dashboards and scans are slow right now.
+    """
+
+    def __init__(self, window):
+        self.window   = window
+        self._lock    = threading.Lock()
+        self._samples = {}      # view name → deque of (total, view, tpl, db, queries) ms
+
+    def add(self, view, total, view_ms, tpl, db, queries):
+        with self._lock:
+            samples = self._samples.get(view)
+            if samples is None:
+                samples = self._samples[view] = deque(maxlen=self.window)
+            samples.append((total, view_ms, tpl, db, queries))
+
+    def table(self):
+        """One row per view, slowest p95 first."""
+        with self._lock:
+            snapshot = {view: list(samples) for view, samples in self._samples.items()}
+        rows = []
+        for view, samples in snapshot.items():
+            totals = sorted(s[0] for s in samples)
+            n = len(samples)
+            rows.append({
+                'view':        view,
+                'requests':    n,
+                'p50_ms':      round(statistics.median(totals), 1),
+                'p95_ms':      round(totals[max(int(n * 0.95) - 1, 0)], 1),
+                'max_ms':      round(totals[-1], 1),
+                'view_ms':     round(sum(s[1] for s in samples) / n, 1),
+                'template_ms': round(sum(s[2] for s in samples) / n, 1),
+                'db_ms':       round(sum(s[3] for s in samples) / n, 1),
+                'queries':     round(sum(s[4] for s in samples) / n, 1),
+            })
+        return sorted(rows, key=lambda r: r['p95_ms'], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+stats = RequestStats(settings.PROFILING_WINDOW)
+
+
+class _QueryTimer:
+    """execute_wrapper that counts queries and their time on this thread."""
+
+    def __init__(self):
+        self.count   = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count   += 1
+
+
+class ProfilingMiddleware:
+    """
+    Times every request: total, view, template rendering and database
+    (queries and their time).  Sent back as a Server-Timing header, which
+    the browser's network tab shows, and kept in ``stats``.
+
+    Template time is the rendering of a TemplateResponse, which Django does
+    after the view returns; views calling render() themselves count it as
+    view time.
+
+    Staff can add ``?profile=1`` or an ``X-Profile: 1`` header to get the
+    request run under cProfile, dumped to LOGS_DIR/profiles/ (the file name
+    comes back in X-Profile-Dump; open it with snakeviz or pstats).
+    """
+
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = settings.PROFILING_ENABLED
+        # under ASGI the async scan views and the dashboard stream are
+        # awaited here, not run through sync_to_async on a thread
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # the hooks as well, or Django would hop to a thread for each
+            self.process_view = self._aprocess_view
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        timer, profiler, start = self._start(request, getattr(request, 'user', None))
+        with ExitStack() as stack:
+            self._enter(stack, timer, profiler)
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler:
+                    profiler.disable()
+        return self._finish(request, response, timer, profiler, start)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        # request.user would hit the database on the event loop
+        user = await request.auser() if self._asked(request) else None
+        timer, profiler, start = self._start(request, user)
+        with ExitStack() as stack:
+            self._enter(stack, timer, profiler)
+            try:
+                response = await self.get_response(request)
+            finally:
+                if profiler:
+                    profiler.disable()
+        return self._finish(request, response, timer, profiler, start)
+
+    def _start(self, request, user):
+        request._profiling = {'view_start': None, 'render_start': None}
+        wanted = self._asked(request) and user is not None and user.is_staff
+        profiler = cProfile.Profile() if wanted else None
+        return _QueryTimer(), profiler, time.perf_counter()
+
+    @staticmethod
+    def _enter(stack, timer, profiler):
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(timer))
+        if profiler:
+            profiler.enable()
+
+    def _finish(self, request, response, timer, profiler, start):
+        end = time.perf_counter()
+        marks = request._profiling
+        view_start   = marks['view_start'] or start
+        render_start = marks['render_start'] or end
+        total   = (end - start) * 1000
+        view_ms = (render_start - view_start) * 1000
+        tpl     = (end - render_start) * 1000
+        db      = timer.seconds * 1000
+
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={total:.1f}',
+            f'view;dur={view_ms:.1f}',
+            f'tpl;dur={tpl:.1f}',
+            f'db;dur={db:.1f};desc="{timer.count} queries"',
+        ])
+        match = request.resolver_match
+        # one bucket for every 404, or each scanned-for URL would get its own
+        view = match.view_name if match else '<unresolved>'
+        stats.add(view, total, view_ms, tpl, db, timer.count)
+        if profiler:
+            response['X-Profile-Dump'] = self._dump(profiler, view)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self._mark(request, 'view_start')
+
+    def process_template_response(self, request, response):
+        # last hook before Django renders it
+        self._mark(request, 'render_start')
+        return response
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self._mark(request, 'view_start')
+
+    async def _aprocess_template_response(self, request, response):
+        self._mark(request, 'render_start')
+        return response
+
+    @staticmethod
+    def _mark(request, key):
+        if hasattr(request, '_profiling'):
+            request._profiling[key] = time.perf_counter()
+
+    @staticmethod
+    def _asked(request):
+        return request.GET.get('profile') == '1' or request.headers.get('X-Profile') == '1'
+
+    @staticmethod
+    def _dump(profiler, view):
+        folder = settings.LOGS_DIR / 'profiles'
+        folder.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S') + f"{time.time() % 1:.3f}"[1:]
+        name = f"{stamp}-{view.replace(':', '_').replace('/', '_').strip('<>')}.prof"
+        profiler.dump_stats(str(folder / name))
+        return name
@@ -4,7 +4,7 @@ def set_legacy_department(apps, schema_editor):
     Material   = apps.get_model('warehouse', 'Material')
     Department = apps.get_model('warehouse', 'Department')
     # find your Legacy/Admin department
-    legacy = Department.objects.get(code='LG')
+    legacy, _ = Department.objects.get_or_create(code='LG', defaults={'name': 'Legacy'})
     # assign it to all Materials where department is NULL
     Material.objects.filter(department__isnull=True).update(department=legacy)
 
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+
+TRGM_COLUMNS = [
+    ('warehouse_material', 'material_number'),
+    ('warehouse_material', 'description'),
+    ('warehouse_batch',    'batch_number'),
+]
+
+
+def create_search_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE warehouse_roll_search USING fts5("
+                "material_number, batch_number, description, tokenize='trigram')"
+            )
+        except Exception:
+            # SQLite built without FTS5/trigram: search falls back to icontains
+            return
+        schema_editor.execute("""
+            INSERT INTO warehouse_roll_search (rowid, material_number, batch_number, description)
+            SELECT r.id, m.material_number, b.batch_number, m.description
+              FROM warehouse_roll r
+              JOIN warehouse_batch b    ON b.id = r.batch_id
+              JOIN warehouse_material m ON m.id = b.material_id
+        """)
+    elif conn.vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table, column in TRGM_COLUMNS:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm '
+                f'ON {table} USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS warehouse_roll_search")
+    elif conn.vendor == 'postgresql':
+        for table, column in TRGM_COLUMNS:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0006_importlog'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0007_roll_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['created_at'], name='batch_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roll',
+            index=models.Index(fields=['current_location'], name='roll_location_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['roll', 'scanned_at'], name='tx_roll_scanned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['action', 'location', 'scanned_at'], name='tx_action_loc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['action', 'user'], name='tx_action_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['scanned_at'], name='tx_scanned_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+import re
+
+from django.db import migrations, models
+
+
+RACK_CODE = re.compile(r'^(?P<dept>[A-Z]{2})(?P<row>[A-Z])(?P<col>\d{2})$')
+
+
+def backfill_locations(apps, schema_editor):
+    """
+    Every Roll.current_location string must name a Location row before the
+    column becomes a foreign key: create the missing racks, blank out what
+    can't be one, and fill row/column from the code where they're empty.
+    """
+    Department = apps.get_model('warehouse', 'Department')
+    Location   = apps.get_model('warehouse', 'Location')
+    Roll       = apps.get_model('warehouse', 'Roll')
+
+    Roll.objects.filter(current_location='').update(current_location=None)
+
+    known = set(Location.objects.values_list('location_code', flat=True))
+    max_len = Location._meta.get_field('location_code').max_length
+    depts = {d.code: d for d in Department.objects.all()}
+
+    codes = set(Roll.objects.exclude(current_location=None)
+                            .values_list('current_location', flat=True))
+    for code in codes - known:
+        if len(code) > max_len:
+            Roll.objects.filter(current_location=code).update(current_location=None)
+            continue
+        m = RACK_CODE.match(code)
+        Location.objects.create(
+            location_code=code,
+            department=depts.get(m['dept']) if m else None,
+            type='STORAGE',
+        )
+
+    for loc in Location.objects.filter(models.Q(row='') | models.Q(column='')):
+        m = RACK_CODE.match(loc.location_code)
+        if m:
+            loc.row    = loc.row or m['row']
+            loc.column = loc.column or m['col']
+            loc.save(update_fields=['row', 'column'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0008_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='roll_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='total_kg',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_locations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def recount(apps, schema_editor):
+    Location = apps.get_model('warehouse', 'Location')
+    Roll     = apps.get_model('warehouse', 'Roll')
+    Location.objects.update(roll_count=0, total_kg=0)
+    totals = (Roll.objects.exclude(current_location=None)
+                          .values('current_location')
+                          .annotate(n=Count('id'), kg=Sum('weight_kg')))
+    for row in totals:
+        Location.objects.filter(location_code=row['current_location']).update(
+            roll_count=row['n'], total_kg=row['kg'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0009_location_occupancy'),
+    ]
+
+    operations = [
+        # the foreign key brings its own index
+        migrations.RemoveIndex(
+            model_name='roll',
+            name='roll_location_idx',
+        ),
+        migrations.AlterField(
+            model_name='roll',
+            name='current_location',
+            field=models.ForeignKey(blank=True, db_column='current_location', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rolls', to='warehouse.location', to_field='location_code'),
+        ),
+        migrations.RunPython(recount, migrations.RunPython.noop),
+    ]
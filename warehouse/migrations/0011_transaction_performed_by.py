@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    """Match the free‑text Transaction.user to an account, one UPDATE per user."""
+    User        = apps.get_model(settings.AUTH_USER_MODEL)
+    Profile     = apps.get_model('warehouse', 'Profile')
+    Transaction = apps.get_model('warehouse', 'Transaction')
+
+    dept_of = dict(Profile.objects.values_list('user_id', 'department_id'))
+    names = set(Transaction.objects.values_list('user', flat=True).distinct())
+    for user_id, username in User.objects.filter(username__in=names).values_list('id', 'username'):
+        Transaction.objects.filter(user=username, performed_by__isnull=True).update(
+            performed_by_id=user_id,
+            department_id=dept_of.get(user_id),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0010_roll_current_location_fk'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='department',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Home department of that user at scan time', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='warehouse.department'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='performed_by',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Logged‑in user who posted this scan', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['action', 'department', 'roll'], name='tx_action_dept_idx'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
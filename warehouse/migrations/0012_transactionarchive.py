@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0011_transaction_performed_by'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month archived')),
+                ('tx_count', models.PositiveIntegerField(default=0)),
+                ('payload', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+                ('roll', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archives', to='warehouse.roll')),
+            ],
+            options={
+                'unique_together': {('roll', 'month')},
+            },
+        ),
+    ]
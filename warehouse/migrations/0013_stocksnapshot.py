@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0012_transactionarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(unique=True)),
+                ('roll_count', models.PositiveIntegerField(default=0)),
+                ('payload', models.BinaryField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transactionarchive',
+            index=models.Index(fields=['month'], name='txarchive_month_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:12
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill(apps, schema_editor):
+    Roll        = apps.get_model('warehouse', 'Roll')
+    Transaction = apps.get_model('warehouse', 'Transaction')
+    newest = (Transaction.objects.filter(roll=OuterRef('pk'))
+                                 .order_by('-scanned_at', '-id')
+                                 .values('action')[:1])
+    Roll.objects.update(last_action=Subquery(newest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0014_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roll',
+            name='last_action',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
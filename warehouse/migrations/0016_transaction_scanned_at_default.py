@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0015_roll_last_action'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='scanned_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
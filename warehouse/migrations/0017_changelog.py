@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0016_transaction_scanned_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('roll', 'Roll'), ('location', 'Location'), ('transaction', 'Transaction')], max_length=12)),
+                ('key', models.CharField(help_text='roll_id, location_code or transaction id', max_length=64)),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
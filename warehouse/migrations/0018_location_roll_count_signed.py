@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 01:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0017_changelog'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='location',
+            name='roll_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 01:42
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0018_location_roll_count_signed'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='tx_action_user_idx',
+        ),
+    ]
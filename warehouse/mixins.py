@@ -4,6 +4,9 @@ from django.shortcuts import redirect
 from django.contrib import messages
 from django.db.models import Q
 
+from . import routers
+from .access import get_access
+
 class DeptPermissionMixin(LoginRequiredMixin, UserPassesTestMixin):
     """
     – Superuser, Factory Admin, Forklift Driver: full access.
@@ -12,27 +15,24 @@ class DeptPermissionMixin(LoginRequiredMixin, UserPassesTestMixin):
     """
 
     def test_func(self):
-        user = self.request.user
+        access = get_access(self.request)
 
         # 1) Superuser, Admin, Forklift Driver bypass
-        if user.is_superuser or user.groups.filter(
-            name__in=['Factory Admin','Forklift Driver']
-        ).exists():
+        if access.has_full_access:
             return True
 
         # 2) Everyone else: must have a home department
-        prof = getattr(user, 'profile', None)
-        if not prof or not prof.department:
+        if not access.has_department:
             return False
 
         # 3) Plant Manager & Operator: can only act in prof.department
-        if user.groups.filter(name__in=['Plant Manager','Operator']).exists():
+        if access.in_group('Plant Manager','Operator'):
             # we'll enforce in dispatch() below
             return True
 
         # 4) Stock Keeper: can create/print in home dept, 
         #    but may receive transfers into extra_access
-        if user.groups.filter(name='Stock Keeper').exists():
+        if access.in_group('Stock Keeper'):
             return True
 
         return False  # any other roles denied
@@ -48,47 +48,42 @@ class DeptPermissionMixin(LoginRequiredMixin, UserPassesTestMixin):
         )
         return redirect('root')
 
-    def dispatch(self, request, *args, **kwargs):
-        # 0) If not logged in, let Mixin redirect to login
-        if not request.user.is_authenticated:
-            return super().dispatch(request, *args, **kwargs)
+    # Lookup path from the view's model to Department.code; views over
+    # other models can override it.
+    dept_scope_field = 'batch__material__department__code'
 
-        # now it's safe to touch request.user.profile
-        user = request.user
-        prof = user.profile
+    def scope_queryset(self, qs):
+        """
+        Limit ``qs`` to the departments this user may see. Lazy: it only
+        adds a WHERE clause, evaluated wherever the queryset is.
+        """
+        access = get_access(self.request)
 
         # Skip for admin/drivers
-        if user.is_superuser or user.groups.filter(
-            name__in=['Factory Admin','Forklift Driver']
-        ).exists():
-            return super().dispatch(request, *args, **kwargs)
-
-        home = prof.department.code  # two‑letter code
-
-        # For list & search views: filter querysets
-        if hasattr(self, 'get_queryset'):
-            qs = super().get_queryset()
-
-            # build the list of codes this user can see
-            allowed = [home]
-            if user.groups.filter(name='Stock Keeper').exists():
-                allowed += prof.get_extra_access_list()
-
-            # now scope on material.department.code
-            qs = qs.filter(batch__material__department__code__in=allowed)
-
-            self.queryset = qs
-
-        # For forms that ask department, lock it down
-        if hasattr(self, 'get_form'):
-            form = self.get_form()
-            if 'department' in form.fields:
-#                form.fields['department'].choices = [(home, home)]
-#                form.fields['department'].initial   = home
-                # show “FM – Film” instead of just “FM”
-                label = f"{home} – {prof.department.name}"
-                form.fields['department'].choices = [(home, label)]
-                form.fields['department'].initial   = home
-                form.fields['department'].widget.attrs['readonly'] = True
-
-        return super().dispatch(request, *args, **kwargs)
+        if access.has_full_access:
+            return qs
+
+        # home dept (+ extra_access for Stock Keepers)
+        return qs.filter(**{
+            f'{self.dept_scope_field}__in': access.allowed_departments
+        })
+
+    def get_queryset(self):
+        # For list & search views: applied once, when the view asks for it.
+        # Forms lock their own department field from the same access
+        # context (see BatchDataForm), so nothing is built up front here.
+        return self.scope_queryset(super().get_queryset())
+
+
+class ReplicaReadsMixin:
+    """
+    Run a read-only view's queries on the replica (see routers.py),
+    including those of a TemplateResponse, which renders after dispatch.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with routers.replica():
+            response = super().dispatch(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render = routers.replica()(response.render)
+        return response
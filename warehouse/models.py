@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 import uuid
 from django.utils import timezone
+from django.core.serializers.json import DjangoJSONEncoder
 
 class Department(models.Model):
     code = models.CharField(max_length=4, unique=True)  # e.g. "FM", "LM"
@@ -47,6 +48,10 @@ class Batch(models.Model):
 
     class Meta:
         unique_together = [('material', 'batch_number')]
+        indexes = [
+            # print search / dashboard order and filter rolls by batch date
+            models.Index(fields=['created_at'], name='batch_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.batch_number} – {self.material.material_number}"
@@ -67,10 +72,28 @@ class Roll(models.Model):
     customer          = models.ForeignKey(Customer,
                                           on_delete=models.SET_NULL,
                                           null=True, blank=True)
-    current_location  = models.CharField(max_length=20,
-                                         blank=True, null=True)
+    # keyed by location_code (same column as the old free‑text field), so
+    # current_location_id is the rack code itself – no join needed to show it
+    current_location  = models.ForeignKey('Location',
+                                          to_field='location_code',
+                                          db_column='current_location',
+                                          related_name='rolls',
+                                          on_delete=models.SET_NULL,
+                                          blank=True, null=True)
     status            = models.CharField(max_length=20,
                                          default='IN_STOCK')
+    # action of the newest Transaction, kept by stock.commit_scan so the
+    # next scan can be validated from the (locked) roll row alone
+    last_action       = models.CharField(max_length=20, blank=True, null=True,
+                                         editable=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        roll = super().from_db(db, field_names, values)
+        # what's stored now, so stock.py can move the occupancy counters
+        if 'current_location_id' in roll.__dict__ and 'weight_kg' in roll.__dict__:
+            roll._stored = (roll.current_location_id, roll.weight_kg)
+        return roll
 
     def __str__(self):
         return str(self.roll_id)
@@ -100,6 +123,11 @@ class Location(models.Model):
     ]
     type     = models.CharField(max_length=20, choices=TYPE_CHOICES)
 
+    # occupancy, kept up to date by stock.py on every roll move; signed so a
+    # counter that has drifted low never fails a scan (recount() fixes it)
+    roll_count = models.IntegerField(default=0, editable=False)
+    total_kg   = models.FloatField(default=0, editable=False)
+
     def __str__(self):
         return self.location_code
 
@@ -118,7 +146,8 @@ class Transaction(models.Model):
                                    on_delete=models.SET_NULL,
                                    null=True, blank=True)
     user       = models.CharField(max_length=50)
-    scanned_at = models.DateTimeField(auto_now_add=True)
+    # set by the server, or by the handheld for scans queued offline
+    scanned_at = models.DateTimeField(default=timezone.now, editable=False)
     customer = models.ForeignKey(
         'Customer',
         on_delete=models.SET_NULL,
@@ -126,6 +155,37 @@ class Transaction(models.Model):
         blank=True,
         help_text="Who this roll was dispatched to (if action=DISPATCH)."
     )
+    # stamped from the authenticated request; `user` above is whatever
+    # name the scanner sent and is kept for display
+    performed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        editable=False,
+        related_name='transactions',
+        help_text="Logged‑in user who posted this scan",
+    )
+    department   = models.ForeignKey(
+        Department,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        editable=False,
+        related_name='transactions',
+        help_text="Home department of that user at scan time",
+    )
+
+    class Meta:
+        indexes = [
+            # last tx of a roll (scan validation, status) and the
+            # latest-per-roll Max(scanned_at) aggregate, index-only
+            models.Index(fields=['roll', 'scanned_at'], name='tx_roll_scanned_idx'),
+            # dashboard “stored” counts, LocationScanView history
+            models.Index(fields=['action', 'location', 'scanned_at'], name='tx_action_loc_idx'),
+            # department‑scoped counts, index‑only distinct rolls
+            models.Index(fields=['action', 'department', 'roll'], name='tx_action_dept_idx'),
+            # latest_txs scanned_at__in lookups, date-range reports
+            models.Index(fields=['scanned_at'], name='tx_scanned_idx'),
+        ]
 
     def __str__(self):
         return f"{self.roll.roll_id} – {self.action}"
@@ -226,3 +286,84 @@ class ImportLog(models.Model):
         blank=True,
         help_text="One line per skipped row: material|batch"
     )
+
+
+class TransactionArchive(models.Model):
+    """
+    Cold storage for old scans: one row per roll per calendar month, the
+    transactions themselves zlib‑compressed JSON.  Filled by archive.py;
+    read back through archive.history().
+    """
+    roll        = models.ForeignKey(Roll, on_delete=models.CASCADE,
+                                    related_name='archives')
+    month       = models.DateField(help_text="First day of the month archived")
+    tx_count    = models.PositiveIntegerField(default=0)
+    payload     = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [('roll', 'month')]
+        indexes = [
+            # as‑of replays read whole months across all rolls
+            models.Index(fields=['month'], name='txarchive_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.roll_id} – {self.month:%Y-%m} ({self.tx_count})"
+
+
+class StockSnapshot(models.Model):
+    """
+    Where every roll was at ``taken_at``: zlib‑compressed JSON list of
+    [roll pk, location code, last action].  Written by snapshots.py;
+    as‑of queries start from the nearest one and replay the scans after it.
+    """
+    taken_at   = models.DateTimeField(unique=True)
+    roll_count = models.PositiveIntegerField(default=0)
+    payload    = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.taken_at:%Y-%m-%d %H:%M} ({self.roll_count} rolls)"
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client‑supplied Idempotency-Key and the response it produced, so a
+    retried POST gets the original answer instead of a second scan.
+    """
+    user        = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key         = models.CharField(max_length=100)
+    fingerprint = models.CharField(max_length=64, help_text="sha256 of the request body")
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True,
+                                                   help_text="Empty while the request is in flight")
+    response    = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at  = models.DateTimeField(auto_now_add=True)
+    expires_at  = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = [('user', 'key')]
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code or 'pending'})"
+
+
+
+class ChangeLog(models.Model):
+    """
+    One row per write to a roll, location or scan.  The id is the change
+    sequence that mirrors (handhelds, the ERP bridge) pull from; see
+    changes.py.
+    """
+    KIND_CHOICES = [
+        ('roll',        'Roll'),
+        ('location',    'Location'),
+        ('transaction', 'Transaction'),
+    ]
+    id         = models.BigAutoField(primary_key=True)
+    kind       = models.CharField(max_length=12, choices=KIND_CHOICES)
+    key        = models.CharField(max_length=64, help_text="roll_id, location_code or transaction id")
+    deleted    = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} {self.key}{' (deleted)' if self.deleted else ''}"
@@ -0,0 +1,147 @@
+# warehouse/pagination.py
+"""
+Keyset (“seek”) pagination.
+
+Instead of ``OFFSET n`` plus a ``COUNT(*)`` per page, each page remembers
+the sort key of its first and last row in an opaque cursor and the next
+query asks for rows strictly after (or before) it.  Page 500 costs the
+same as page 1.  Totals are optional and cached, never counted per page.
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+def _encode(values, direction):
+    raw = json.dumps([direction] + [
+        {'dt': v.isoformat()} if isinstance(v, datetime) else v for v in values
+    ])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _field(model, path):
+    """The model field at the end of a ``__``-separated path."""
+    *hops, name = path.split('__')
+    for hop in hops:
+        model = model._meta.get_field(hop).related_model
+    return model._meta.get_field(name)
+
+
+def _coerce(field, value):
+    if isinstance(value, dict):
+        value = value['dt']
+    value = field.to_python(value)
+    if value is None or (isinstance(value, datetime) and timezone.is_naive(value)):
+        raise ValueError(value)
+    return value
+
+
+def _decode(cursor, fields):
+    """``(direction, values)`` with each value of its field's type, or Nones."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, *values = json.loads(raw)
+        if direction not in ('next', 'prev') or len(values) != len(fields):
+            return None, None
+        # a cursor comes from the client: anything off means page 1, not a 500
+        return direction, [_coerce(f, v) for f, v in zip(fields, values)]
+    except (KeyError, TypeError, ValueError, ValidationError):
+        return None, None
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, prev_cursor, total=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total       = total
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    ``ordering`` is a tuple of field paths, all descending or all ascending,
+    ending in a unique field (e.g. ``('-batch__created_at', '-id')``).
+    """
+
+    def __init__(self, queryset, per_page, ordering, total_ttl=0):
+        self.queryset  = queryset
+        self.per_page  = per_page
+        self.ordering  = tuple(ordering)
+        self.desc      = self.ordering[0].startswith('-')
+        self.fields    = [o.lstrip('-') for o in self.ordering]
+        self.total_ttl = total_ttl
+        self.model_fields = [_field(queryset.model, f) for f in self.fields]
+
+    def _after(self, values, forward):
+        """Q for rows strictly after ``values`` in the requested direction."""
+        op = 'lt' if self.desc == forward else 'gt'
+        cond = Q()
+        for i, field in enumerate(self.fields):
+            step = Q(**{f'{field}__{op}': values[i]})
+            for prev_field, prev_value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{prev_field: prev_value})
+            cond |= step
+        return cond
+
+    def _key(self, obj):
+        return [getattr(obj, f'_keyset_{i}') for i in range(len(self.fields))]
+
+    def total(self):
+        """Cached total (None when disabled); one COUNT per TTL per query."""
+        if not self.total_ttl:
+            return None
+        sql = str(self.queryset.order_by().query)
+        key = 'its:keyset:count:' + hashlib.sha1(sql.encode()).hexdigest()
+        return cache.get_or_set(key, self.queryset.count, self.total_ttl)
+
+    def page(self, cursor=None):
+        direction, values = _decode(cursor, self.model_fields) if cursor else (None, None)
+        forward = direction != 'prev'
+
+        # carry the sort key on each row so cursors need no related lookups
+        qs = self.queryset.annotate(**{
+            f'_keyset_{i}': F(field) for i, field in enumerate(self.fields)
+        })
+        if values is not None:
+            qs = qs.filter(self._after(values, forward))
+        if forward:
+            qs = qs.order_by(*self.ordering)
+        else:
+            qs = qs.order_by(*[o[1:] if o.startswith('-') else '-' + o
+                               for o in self.ordering])
+
+        rows = list(qs[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if forward:
+            has_next, has_prev = more, values is not None
+        else:
+            has_next, has_prev = True, more
+
+        next_cursor = _encode(self._key(rows[-1]), 'next') if rows and has_next else None
+        prev_cursor = _encode(self._key(rows[0]), 'prev') if rows and has_prev else None
+        return KeysetPage(rows, next_cursor, prev_cursor, self.total())
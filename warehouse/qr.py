@@ -0,0 +1,46 @@
+# warehouse/qr.py
+"""
+Roll QR codes: the short link printed on every label, rendered to
+MEDIA_ROOT/qrcodes/<roll_id>.png.
+
+Rendering is CPU work with no database access, so async views call
+apng() which runs it on a worker thread instead of the event loop.
+qrcode (and PIL under it) is imported on the first render, not at start.
+"""
+import os
+from io import BytesIO
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import metrics
+
+
+def _make(data):
+    import qrcode
+    return qrcode.make(data)
+
+
+def roll_url(roll_id):
+    return f"{settings.SITE_URL}/r/{roll_id}"
+
+
+def png(roll_id):
+    """The roll's QR code as PNG bytes."""
+    buf = BytesIO()
+    with metrics.QR_SECONDS.time(target='png'):
+        _make(roll_url(roll_id)).save(buf)
+    return buf.getvalue()
+
+
+def save_roll_qr(roll_id):
+    """Render the roll's QR code and save it; returns the file path."""
+    qr_dir = os.path.join(settings.MEDIA_ROOT, 'qrcodes')
+    os.makedirs(qr_dir, exist_ok=True)
+    path = os.path.join(qr_dir, f"{roll_id}.png")
+    with metrics.QR_SECONDS.time(target='file'):
+        _make(roll_url(roll_id)).save(path)
+    return path
+
+
+apng = sync_to_async(png, thread_sensitive=False)
@@ -0,0 +1,121 @@
+# warehouse/refdata.py
+"""
+In‑process registry for slow‑changing reference data: the SiteConfig row,
+departments and locations.
+
+The tables are loaded once per process and then served from memory.  Any
+save/delete on them stamps a new version into the shared cache; every
+process compares its own stamp against that on access and reloads when
+they differ.  Use a shared CACHES backend (file, memcached, redis …) when
+running several worker processes so they all see the same stamp.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Department, Location, SiteConfig
+from .routers import primary
+
+VERSION_KEY = 'its:refdata:version'
+
+
+class _Registry:
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._version = None
+        self._data    = None
+
+    def _shared_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            version = time.time_ns()
+            # another process may have raced us; theirs wins
+            if not cache.add(VERSION_KEY, version, None):
+                version = cache.get(VERSION_KEY, version)
+        return version
+
+    @primary()      # kept until the next change: never from a lagging replica
+    def _load(self):
+        depts = list(Department.objects.order_by('code'))
+        locs  = list(Location.objects.order_by('location_code'))
+        return {
+            'site_config':   SiteConfig.objects.first(),
+            'departments':   depts,
+            'dept_by_code':  {d.code: d for d in depts},
+            'locations':     locs,
+            'loc_by_code':   {l.location_code: l for l in locs},
+            'loc_by_id':     {l.pk: l for l in locs},
+        }
+
+    def data(self):
+        version = self._shared_version()
+        # read once into a local: another thread may swap it meanwhile
+        data = self._data
+        if data is None or self._version != version:
+            with self._lock:
+                data = self._data
+                if data is None or self._version != version:
+                    data = self._load()
+                    self._data, self._version = data, version
+        return data
+
+    @property
+    def version(self):
+        return self._version
+
+    def invalidate(self):
+        cache.set(VERSION_KEY, time.time_ns(), None)
+        # only the stamp: readers may still be holding the old tables
+        self._version = None
+
+
+registry = _Registry()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Public helpers
+# ─────────────────────────────────────────────────────────────────────────────
+
+def site_config():
+    return registry.data()['site_config']
+
+
+def departments(order_by='code'):
+    depts = registry.data()['departments']
+    if order_by == 'code':
+        return depts
+    return sorted(depts, key=lambda d: getattr(d, order_by))
+
+
+def department(code):
+    return registry.data()['dept_by_code'].get(code)
+
+
+def locations():
+    return registry.data()['locations']
+
+
+def location(code):
+    return registry.data()['loc_by_code'].get(code)
+
+
+def location_by_id(pk):
+    return registry.data()['loc_by_id'].get(pk)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Invalidation
+# ─────────────────────────────────────────────────────────────────────────────
+
+@receiver([post_save, post_delete], sender=SiteConfig)
+@receiver([post_save, post_delete], sender=Department)
+@receiver([post_save, post_delete], sender=Location)
+def _reference_data_changed(sender, **kwargs):
+    # drop our copy now (this connection already sees the write) and stamp
+    # again once it's committed and visible to every other connection
+    registry.invalidate()
+    transaction.on_commit(registry.invalidate)
@@ -0,0 +1,75 @@
+# warehouse/routers.py
+"""
+Read routing: the read-heavy pages (dashboard, print search, master export,
+reconciliation) run their queries on the "replica" alias; everything else,
+and every write, on "default".
+
+    with replica():           # or @replica() on a function
+        ...                   # reads here go to the replica, if there is one
+
+The scope is a contextvar, so it follows a request into sync_to_async and
+back and doesn't leak into the next request on the thread.  Reads stay on
+default outside a scope, with no replica configured, and inside a
+transaction on default, which has to see its own writes.  Only warehouse
+models are routed: sessions and users are read from the primary, so a
+user who has just logged in isn't sent back to the login page.
+
+A replica trails its primary: only put pages in a scope where data a few
+seconds old is fine.  Anything a page loads into a cache that outlives the
+request (access contexts, refdata, the autocomplete indexes) is read
+under primary() instead, or a stale copy would be kept for everyone.
+Outside a scope reads go to default even for instances the replica
+loaded, so their lazy relations don't stay on it.
+
+To try it locally, two SQLite files stand in for primary and replica –
+copy the one to the other (no replication between them):
+
+    sqlite3 db.sqlite3 ".backup /tmp/replica.sqlite3"
+    DB_REPLICA_NAME=/tmp/replica.sqlite3 manage.py runserver
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+
+_reading = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica():
+    """Send the reads of the block (or decorated function) to the replica."""
+    token = _reading.set(True)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+@contextmanager
+def primary():
+    """Read from the primary in the block, even inside a replica() scope."""
+    token = _reading.set(False)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (_reading.get() and model._meta.app_label == 'warehouse'
+                and REPLICA in settings.DATABASES
+                and not connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return REPLICA
+        # not None: Django would fall back to the instance hint's database
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # same data on both sides
+        return True
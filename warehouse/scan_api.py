@@ -0,0 +1,215 @@
+# warehouse/scan_api.py
+"""
+Async scan endpoints, for running the handhelds on the ASGI app.
+
+    GET  /api/scan/rolls/<roll_id>/              verify a roll
+    GET  /api/scan/rolls/<roll_id>/qr.png        its label QR code
+    GET  /api/scan/locations/<code>/rolls/       rolls on a rack
+    POST /api/scan/transactions/                 commit a scan
+    POST /api/scan/rolls/<roll_id>/print/        reprint its label
+
+A scanner waiting on the label printer holds a coroutine here rather than
+a worker thread.  Database work doesn't get that far: the async ORM and
+submit_scan() (one atomic block under a row lock, which the async ORM
+can't do) run on the request's own sync thread, which ASGIHandler gives
+every request, so threads still grow with the scanners in flight
+(benchmark_scan_api).  BarTender calls and QR rendering touch no database
+and go to a thread pool of their own.
+
+Responses match the DRF endpoints they shadow, including Idempotency-Key
+handling and the de‑dup window (idempotency.py).
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.db.models import Max
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET, require_POST
+
+from . import idempotency, metrics, qr, stock
+from .access import get_access
+from .bartender import print_roll_label
+from .models import Roll
+from .serializers import TransactionSerializer
+
+# how long a repeat scan waits for the identical one still in flight
+DEDUP_WAIT = 5
+
+
+def record_scan(data, access):
+    """
+    Validate and commit one scan; ``(status, body)`` as the API answers
+    it.  Sync – both scan endpoints reach it through submit_scan().
+    """
+    serializer = TransactionSerializer(data=data, context={'commit_scan': True})
+    if not serializer.is_valid():
+        if any(e.code == 'does_not_exist' for e in serializer.errors.get('roll', [])):
+            return 404, {"detail": "No Roll matches the given query."}
+        return 400, serializer.errors
+    data = serializer.validated_data
+
+    # validate, insert, move the roll and its counters: one atomic block
+    try:
+        tx, created = stock.commit_scan(
+            data['roll'], data['action'],
+            location=data.get('location'),
+            customer=data.get('customer'),
+            user=data['user'],
+            performed_by_id=access.user_id,
+            department_id=access.department_id,
+        )
+    except stock.ScanRejected as e:
+        return e.status, e.detail
+    # a repeat PUTAWAY to the same rack answers with the existing tx, 200 OK
+    return (201 if created else 200), TransactionSerializer(tx).data
+
+
+def submit_scan(data, access, key=''):
+    """
+    record_scan() the way both scan POST endpoints run it: a retry carrying
+    an Idempotency-Key gets the original answer, and the same QR decoded
+    again within the de-dup window folds into the first.  Sync;
+    ``(status, body, replayed)``.
+    """
+    if not key:
+        return _deduplicated(data, access)
+    try:
+        record, replay = idempotency.begin(access.user_id, key, idempotency.fingerprint(data))
+    except idempotency.KeyConflict as e:
+        return 409, {"detail": str(e)}, False
+    if replay:
+        return (*replay, True)
+    try:
+        status, body, replayed = _deduplicated(data, access)
+    except Exception:
+        idempotency.abandon(record)
+        raise
+    idempotency.finish(record, status, body)
+    return status, body, replayed
+
+
+def _deduplicated(data, access):
+    # everything the scan records: a different customer or operator is a new scan
+    scan = (str(data.get('roll')), data.get('action'), data.get('location') or None,
+            data.get('customer') or None, data.get('user'), access.user_id)
+    owner, entry = idempotency.window.claim(scan)
+    if not owner:
+        entry.done.wait(DEDUP_WAIT)
+        if entry.response:
+            return (*entry.response, True)
+        # the first one failed or is stuck; fall back to the checks below
+
+    try:
+        status, body = record_scan(data, access)
+    except Exception:
+        if owner:
+            idempotency.window.release(scan, entry)
+        raise
+    if owner:
+        if 200 <= status < 300:
+            idempotency.window.resolve(entry, status, body)
+        else:
+            idempotency.window.release(scan, entry)
+    return status, body, False
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Views
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _reply(status, body, replayed=False):
+    response = JsonResponse(body, status=status, safe=False)
+    if replayed:
+        response[idempotency.REPLAY_HEADER] = 'true'
+    return response
+
+
+async def _logged_in(request):
+    return (await request.auser()).is_authenticated
+
+
+async def _access(request):
+    """The caller's access context, or None when not logged in."""
+    if not await _logged_in(request):
+        return None
+    return await sync_to_async(get_access)(request)
+
+
+_FORBIDDEN = {"detail": "Authentication credentials were not provided."}
+
+
+@require_GET
+async def verify_roll(request, roll_id):
+    if not await _logged_in(request):
+        return JsonResponse(_FORBIDDEN, status=403)
+    with metrics.ROLL_VERIFY.time(api='async', result='missing') as labels:
+        try:
+            roll = await (Roll.objects.select_related('batch__material')
+                                      .aget(roll_id=roll_id))
+        except Roll.DoesNotExist:
+            return JsonResponse({"detail": "No Roll matches the given query."}, status=404)
+        labels['result'] = 'found'
+    return JsonResponse({
+        'roll_id':          str(roll.roll_id),
+        'description':      roll.batch.material.description,
+        'weight_kg':        roll.weight_kg,
+        'current_location': roll.current_location_id,
+        'last_action':      roll.last_action,
+        'status':           roll.status,
+    })
+
+
+@require_GET
+async def roll_qr(request, roll_id):
+    if not await _logged_in(request):
+        return JsonResponse(_FORBIDDEN, status=403)
+    if not await Roll.objects.filter(roll_id=roll_id).aexists():
+        return JsonResponse({"detail": "No Roll matches the given query."}, status=404)
+    return HttpResponse(await qr.apng(roll_id), content_type='image/png')
+
+
+@require_GET
+async def location_rolls(request, code):
+    if not await _logged_in(request):
+        return JsonResponse(_FORBIDDEN, status=403)
+    rows = [
+        dict(row, roll_id=str(row['roll_id']))
+        async for row in (Roll.objects.filter(current_location=code)
+                                      .annotate(scanned_at=Max('transaction__scanned_at'))
+                                      .order_by('id')
+                                      .values('roll_id', 'batch__material__description',
+                                              'weight_kg', 'last_action', 'scanned_at'))
+    ]
+    return JsonResponse({'location': code, 'count': len(rows), 'results': rows})
+
+
+@require_POST
+async def commit(request):
+    access = await _access(request)
+    if access is None:
+        return JsonResponse(_FORBIDDEN, status=403)
+    try:
+        data = json.loads(request.body) if request.content_type == 'application/json' \
+            else request.POST.dict()
+    except ValueError:
+        return JsonResponse({"detail": "Malformed JSON."}, status=400)
+    key = request.headers.get('Idempotency-Key', '').strip()[:100]
+    # a repeat waiting on the de-dup window holds this request's sync thread
+    return _reply(*await sync_to_async(submit_scan)(data, access, key))
+
+
+@require_POST
+async def print_label(request, roll_id):
+    if not await _logged_in(request):
+        return JsonResponse(_FORBIDDEN, status=403)
+    try:
+        roll = await (Roll.objects.select_related('batch__material')
+                                  .aget(roll_id=roll_id))
+    except Roll.DoesNotExist:
+        return JsonResponse({"detail": "No Roll matches the given query."}, status=404)
+    try:
+        # network call to the print server: off the loop, off the ORM thread
+        result = await sync_to_async(print_roll_label, thread_sensitive=False)(roll)
+    except Exception as e:
+        return JsonResponse({"detail": f"Print failed: {e}"}, status=502)
+    return JsonResponse({'job_id': result["JobIds"][0]})
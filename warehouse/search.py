@@ -0,0 +1,141 @@
+# warehouse/search.py
+"""
+Roll search index.
+
+On SQLite the searchable text of every roll (material number, batch
+number, material description) lives in an FTS5 table using the trigram
+tokenizer, so a MATCH answers the same “contains” question as icontains
+without scanning and joining the roll table.  Material/Batch/Roll writes
+keep it in sync through the signal receivers below.
+
+On PostgreSQL migration 0007 adds pg_trgm GIN indexes on the underlying
+columns instead, which the plain icontains filter already uses.  Any other
+backend (or a query shorter than one trigram) falls back to icontains.
+"""
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Batch, Material, Roll
+
+SEARCH_TABLE = 'warehouse_roll_search'
+MIN_TERM     = 3        # trigram tokenizer can't match anything shorter
+
+_available = None
+
+
+def fts_available():
+    """True when the FTS5 search table exists on this database."""
+    global _available
+    if _available is None:
+        _available = (
+            connection.vendor == 'sqlite'
+            and SEARCH_TABLE in connection.introspection.table_names()
+        )
+    return _available
+
+
+def _match_expr(q):
+    # one quoted phrase: substring match across all indexed columns
+    return '"' + q.replace('"', '""') + '"'
+
+
+def search_rolls(qs, q):
+    """Filter a Roll queryset to rows whose material/batch text contains q."""
+    q = q.strip()
+    if not q:
+        return qs
+    if len(q) >= MIN_TERM and fts_available():
+        return qs.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+            [_match_expr(q)],
+        ))
+    return qs.filter(
+        Q(batch__material__material_number__icontains=q) |
+        Q(batch__batch_number__icontains=q)                |
+        Q(batch__material__description__icontains=q)
+    )
+
+
+def rank_rolls(qs, q):
+    """
+    Order an already-filtered queryset best match first (BM25). Without the
+    FTS table the queryset is returned unchanged.
+    """
+    q = q.strip()
+    if len(q) < MIN_TERM or not fts_available():
+        return qs
+    rank = RawSQL(
+        f'SELECT bm25({SEARCH_TABLE}) FROM {SEARCH_TABLE} '
+        f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = {Roll._meta.db_table}.id',
+        [_match_expr(q)],
+    )
+    return qs.annotate(search_rank=rank).order_by('search_rank', '-id')
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Keeping the index in sync
+# ─────────────────────────────────────────────────────────────────────────────
+
+_REINDEX_SQL = f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, material_number, batch_number, description)
+    SELECT r.id, m.material_number, b.batch_number, m.description
+      FROM warehouse_roll r
+      JOIN warehouse_batch b    ON b.id = r.batch_id
+      JOIN warehouse_material m ON m.id = b.material_id
+"""
+
+_ROLLS_OF = {
+    'roll':     'SELECT %s',
+    'batch':    'SELECT id FROM warehouse_roll WHERE batch_id = %s',
+    'material': ('SELECT r.id FROM warehouse_roll r '
+                 'JOIN warehouse_batch b ON b.id = r.batch_id '
+                 'WHERE b.material_id = %s'),
+}
+
+
+def reindex(kind, pk):
+    """Refresh index rows for one roll, or every roll of a batch/material."""
+    if not fts_available():
+        return
+    ids = _ROLLS_OF[kind]
+    with connection.cursor() as cur:
+        cur.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({ids})', [pk])
+        cur.execute(f'{_REINDEX_SQL} WHERE r.id IN ({ids})', [pk])
+
+
+def rebuild():
+    """Rebuild the whole index, e.g. after bulk_create() bypassed signals."""
+    if not fts_available():
+        return
+    with connection.cursor() as cur:
+        cur.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cur.execute(_REINDEX_SQL)
+
+
+@receiver(post_save, sender=Roll)
+def _roll_saved(sender, instance, created, update_fields=None, **kwargs):
+    # scans only touch location/status; skip unless the batch may have moved
+    if created or update_fields is None or 'batch' in update_fields:
+        reindex('roll', instance.pk)
+
+
+@receiver(post_delete, sender=Roll)
+def _roll_deleted(sender, instance, **kwargs):
+    if fts_available():
+        with connection.cursor() as cur:
+            cur.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [instance.pk])
+
+
+@receiver(post_save, sender=Batch)
+def _batch_saved(sender, instance, created, **kwargs):
+    if not created:
+        reindex('batch', instance.pk)
+
+
+@receiver(post_save, sender=Material)
+def _material_saved(sender, instance, created, **kwargs):
+    if not created:
+        reindex('material', instance.pk)
@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from django.conf import settings
+from django.db.models import OuterRef, Subquery
 from .models import Material, Batch, Customer, Roll, Location, Transaction
+from . import refdata, stock
 
 class MaterialSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,6 +22,22 @@ class CustomerSerializer(serializers.ModelSerializer):
 
 
 
+def annotate_last_scan(qs):
+    """
+    What RollSerializer shows of a roll's scans, as columns of the roll
+    query itself rather than three queries per roll.
+    """
+    newest = Transaction.objects.filter(roll=OuterRef('pk')).order_by('-scanned_at')
+    dispatches = newest.filter(action='DISPATCH')
+    return qs.select_related('batch__material').annotate(
+        last_scan_at           = Subquery(newest.values('scanned_at')[:1]),
+        last_scan_action       = Subquery(newest.values('action')[:1]),
+        last_scan_location     = Subquery(newest.values('location__location_code')[:1]),
+        last_scan_customer     = Subquery(newest.values('customer__name')[:1]),
+        last_dispatch_customer = Subquery(dispatches.values('customer__name')[:1]),
+    )
+
+
 class RollSerializer(serializers.ModelSerializer):
     # existing QR fields
     qr_link       = serializers.SerializerMethodField()
@@ -38,6 +56,10 @@ class RollSerializer(serializers.ModelSerializer):
     )
     posting_date      = serializers.SerializerMethodField()
     dispatch_customer = serializers.SerializerMethodField()
+    # the FK is keyed by code, so the id already is the rack code
+    current_location  = serializers.CharField(
+        source='current_location_id', read_only=True
+    )
 
     class Meta:
         model = Roll
@@ -53,20 +75,34 @@ class RollSerializer(serializers.ModelSerializer):
             'posting_date', 'dispatch_customer',
             'qr_link', 'qr_image_url',
         ]
+    def _last_scan(self, obj):
+        """(action, location code, customer name, scanned_at) of the newest scan."""
+        if not hasattr(obj, 'last_scan_at'):
+            # a roll that didn't come through annotate_last_scan()
+            obj.last_scan_at = obj.last_scan_action = None
+            obj.last_scan_location = obj.last_scan_customer = None
+            last_tx = (obj.transaction_set.select_related('location', 'customer')
+                                          .order_by('-scanned_at').first())
+            if last_tx:
+                obj.last_scan_at, obj.last_scan_action = last_tx.scanned_at, last_tx.action
+                obj.last_scan_location = last_tx.location and last_tx.location.location_code
+                obj.last_scan_customer = last_tx.customer and last_tx.customer.name
+        return (obj.last_scan_action, obj.last_scan_location,
+                obj.last_scan_customer, obj.last_scan_at)
+
     def get_status(self, obj):
         # Look at the very last transaction
-        last_tx = obj.transaction_set.order_by('-scanned_at').first()
-        if not last_tx:
+        action, location, customer, _ = self._last_scan(obj)
+        if not action:
             return "Yet to store or dispatch"
 
-        if last_tx.action == 'DISPATCH' and last_tx.customer:
-            return f"Dispatched to {last_tx.customer.name}"
+        if action == 'DISPATCH' and customer:
+            return f"Dispatched to {customer}"
 
-        if last_tx.action in ('PUTAWAY', 'TRANSFER', 'TEMP_STORAGE') and last_tx.location:
-            # location is a FK to Location, so use its code
-            return f"In stock at {last_tx.location.location_code}"
+        if action in ('PUTAWAY', 'TRANSFER', 'TEMP_STORAGE') and location:
+            return f"In stock at {location}"
 
-        return "Yet to store or dispatch"     
+        return "Yet to store or dispatch"
 
     def get_qr_link(self, obj):
         return f"{settings.SITE_URL}/r/{obj.roll_id}"
@@ -76,23 +112,52 @@ class RollSerializer(serializers.ModelSerializer):
 
     def get_posting_date(self, obj):
         # last transaction timestamp, or None
-        last_tx = obj.transaction_set.order_by('-scanned_at').first()
-        return last_tx.scanned_at if last_tx else None
+        return self._last_scan(obj)[3]
 
     def get_dispatch_customer(self, obj):
-        # if the last action was a DISPATCH, return its customer name
-        last_dispatch = (
-            obj.transaction_set
-               .filter(action='DISPATCH')
-               .order_by('-scanned_at')
-               .first()
-        )
-        return getattr(last_dispatch, 'customer', None) and last_dispatch.customer.name or None
+        # customer of the latest DISPATCH, if any
+        if not hasattr(obj, 'last_dispatch_customer'):
+            last_dispatch = (
+                obj.transaction_set
+                   .filter(action='DISPATCH')
+                   .select_related('customer')
+                   .order_by('-scanned_at')
+                   .first()
+            )
+            obj.last_dispatch_customer = last_dispatch and last_dispatch.customer and last_dispatch.customer.name
+        return obj.last_dispatch_customer or None
 
 class LocationSerializer(serializers.ModelSerializer):
     class Meta:
         model  = Location
         fields = '__all__'
+        read_only_fields = ['roll_count', 'total_kg']
+
+
+
+class LocationCodeField(serializers.SlugRelatedField):
+    """
+    Location by location_code, resolved from the reference‑data registry
+    instead of a query per request.
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('queryset', Location.objects.all())
+        super().__init__(slug_field='location_code', **kwargs)
+
+    def to_internal_value(self, data):
+        loc = refdata.location(str(data))
+        if loc is None:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=str(data))
+        return loc
+
+    def get_attribute(self, instance):
+        # serve the related Location from memory rather than a query per row
+        loc_id = getattr(instance, f'{self.source}_id', None)
+        loc = refdata.location_by_id(loc_id) if loc_id else None
+        return loc or super().get_attribute(instance)
+
+    def to_representation(self, obj):
+        return obj.location_code
 
 
 
@@ -103,9 +168,7 @@ class TransactionSerializer(serializers.ModelSerializer):
         slug_field='roll_id'
     )
     # Accept the Location.location_code (string) instead of its integer PK
-    location = serializers.SlugRelatedField(
-        queryset=Location.objects.all(),
-        slug_field='location_code',
+    location = LocationCodeField(
         allow_null=True,
         required=False
     )
@@ -116,36 +179,17 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def validate(self, data):
+        # new scans are checked by stock.commit_scan, under the roll's lock
+        if self.context.get('commit_scan'):
+            return data
+
         roll = data['roll']
         next_action = data['action']
 
-        # Fetch the last transaction (if any)
-        last_tx = (
-            Transaction.objects
-            .filter(roll=roll)
-            .order_by('-scanned_at')
-            .first()
-        )
-        last_action = last_tx.action if last_tx else None
-
-        # Define your allowed transitions
-        allowed = {
-            None:      ['PUTAWAY','DISPATCH','TRANSFER'],  
-            'PUTAWAY': ['DISPATCH','TRANSFER'],
-            'TRANSFER':['PUTAWAY','DISPATCH'],
-            'QA_SCAN': ['PUTAWAY', 'DISPATCH', 'TRANSFER'],                   # if you support transfer→putaway
-            # no transitions allowed _from_ DISPATCH
-        }
-
-        legal_next = allowed.get(last_action, [])
-
-        if next_action not in legal_next:
-            raise ValidationError({
-                'action': (
-                    f"Invalid transition: cannot do '{next_action}' after "
-                    f"'{last_action}'. Allowed: {legal_next or 'none'}."
-                )
-            })
+        # Allowed transitions live in stock.ALLOWED_NEXT
+        error = stock.transition_error(roll.last_action, next_action)
+        if error:
+            raise ValidationError(error)
 
         return data
     def create(self, validated_data):
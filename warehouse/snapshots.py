@@ -0,0 +1,122 @@
+# warehouse/snapshots.py
+"""
+Point‑in‑time stock.
+
+A StockSnapshot records where every roll was (rack code and last action)
+at one moment.  stock_as_of(t) loads the newest snapshot taken at or
+before t and replays only the scans between the two, so answering “what
+was in FMA03 on the 1st” reads one snapshot row plus a day's scans rather
+than the whole ledger.  Archived scans are replayed too when the window
+reaches back into archived months.
+
+take_snapshot() is run nightly by the scheduler (see apps.py) and by the
+take_stock_snapshot command.  An offline scan synced after a snapshot it
+predates is written into that snapshot by amend(), from commit_scan.
+"""
+from datetime import datetime
+
+from django.db.models import F
+from django.utils import timezone
+
+from .archive import pack, unpack
+from .models import Roll, StockSnapshot, Transaction, TransactionArchive
+# what a scan does to a roll's location (QA_SCAN and unknowns leave it)
+from .stock import CLEARS_LOCATION, MOVES_TO_LOCATION
+
+
+def _apply(state, roll_id, action, location):
+    loc = state.get(roll_id, (None, None))[0]
+    if action in MOVES_TO_LOCATION:
+        loc = location
+    elif action in CLEARS_LOCATION:
+        loc = None
+    state[roll_id] = (loc, action)
+
+
+def _events(after, until):
+    """Scans in (after, until], hot and archived, oldest first."""
+    hot = Transaction.objects.filter(scanned_at__lte=until)
+    if after is not None:
+        hot = hot.filter(scanned_at__gt=after)
+    events = [
+        (ts, pk, roll_id, action, loc)
+        for pk, roll_id, action, loc, ts in hot.values_list(
+            'id', 'roll_id', 'action', F('location__location_code'), 'scanned_at')
+    ]
+
+    cold = TransactionArchive.objects.filter(
+        month__lte=timezone.localtime(until).date().replace(day=1))
+    if after is not None:
+        cold = cold.filter(month__gte=timezone.localtime(after).date().replace(day=1))
+    for roll_id, payload in cold.values_list('roll_id', 'payload'):
+        for tx in unpack(payload):
+            ts = datetime.fromisoformat(tx['scanned_at'])
+            if ts <= until and (after is None or ts > after):
+                events.append((ts, tx['id'], roll_id, tx['action'], tx['location']))
+
+    events.sort(key=lambda e: (e[0], e[1]))
+    return events
+
+
+def _state_at(when):
+    """({roll pk: (location, last action)}, snapshot used, scans replayed)."""
+    snap = (StockSnapshot.objects.filter(taken_at__lte=when)
+                                 .order_by('-taken_at').first())
+    state = {}
+    if snap is not None:
+        state = {pk: (loc, action) for pk, loc, action in unpack(snap.payload)}
+    events = _events(snap.taken_at if snap else None, when)
+    for _, _, roll_id, action, loc in events:
+        _apply(state, roll_id, action, loc)
+    return state, snap, len(events)
+
+
+def take_snapshot(at=None):
+    """Write (or rewrite) the snapshot for ``at``, default now."""
+    at = at or timezone.now()
+    state, _, _ = _state_at(at)
+    rows = sorted([pk, loc, action] for pk, (loc, action) in state.items())
+    snap, _ = StockSnapshot.objects.update_or_create(
+        taken_at=at,
+        defaults={'roll_count': len(rows), 'payload': pack(rows)},
+    )
+    return snap
+
+
+def amend(roll_pk, location, action, scanned_at):
+    """
+    Put a roll's new state into every snapshot taken at or after
+    ``scanned_at``, which missed the scan.  Only right for the roll's
+    newest scan – commit_scan refuses offline scans older than that.
+    Call it inside the scan's transaction.
+    """
+    for snap in StockSnapshot.objects.select_for_update().filter(taken_at__gte=scanned_at):
+        rows = {pk: [pk, loc, act] for pk, loc, act in unpack(snap.payload)}
+        rows[roll_pk] = [roll_pk, location, action]
+        snap.payload    = pack(sorted(rows.values()))
+        snap.roll_count = len(rows)
+        snap.save(update_fields=['payload', 'roll_count'])
+
+
+def stock_as_of(when, location=None):
+    """
+    Where rolls were at ``when``.  Returns ``(rows, meta)``: rows are
+    ``{'roll_id', 'location', 'status'}`` dicts for rolls in stock (or only
+    those on ``location``); meta says which snapshot was used and how many
+    scans were replayed on top of it.
+    """
+    state, snap, replayed = _state_at(when)
+    placed = {pk: (loc, action) for pk, (loc, action) in state.items()
+              if loc is not None and (location is None or loc == location)}
+    uuids = dict(Roll.objects.filter(pk__in=placed).values_list('pk', 'roll_id'))
+    rows = [
+        {'roll_id': uuids[pk], 'location': loc, 'status': action}
+        for pk, (loc, action) in sorted(placed.items(), key=lambda i: (i[1][0], i[0]))
+        if pk in uuids
+    ]
+    meta = {
+        'as_of':    when,
+        'snapshot': snap.taken_at if snap else None,
+        'replayed': replayed,
+    }
+    return rows, meta
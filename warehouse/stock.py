@@ -0,0 +1,294 @@
+# warehouse/stock.py
+"""
+Rack occupancy.
+
+Every Location carries a roll_count / total_kg pair so “what's on this
+rack” is a single row read.  The counters move in the same database
+transaction as the roll itself: any Roll save that changes its location or
+weight (scan, admin edit, API) shifts them with an F() update, and a
+deleted roll is taken off its rack.
+
+The counters are updated with queryset.update(), so they don't fire the
+Location signals and don't invalidate refdata – read them from the
+database (occupancy()), not from the registry copies.
+
+commit_scan() is the one way a scan gets recorded: validation, the new
+Transaction, the roll's new state and the counters in one atomic block
+under a row lock on the roll.
+
+None of these updates fire signals, so they log their own entries in the
+change feed (changes.py), and commit_scan sends scan_committed once the
+scan is committed.
+
+With settings.SCAN_WRITE_QUEUE, commit_scan() calls of one process take
+turns on a lock before opening their transaction: SQLite has one writer
+at a time anyway, and a thread parked on a lock is woken the moment the
+one before commits, where SQLite's busy handler sleeps and polls.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from . import changes, metrics
+from .models import Customer, Location, Roll, Transaction
+
+# Roll fields whose change moves the counters
+TRACKED = {'current_location', 'current_location_id', 'weight_kg'}
+
+# sent after commit: transaction, old (rack code or None), new (same)
+scan_committed = Signal()
+
+
+def _shift(code, rolls, kg):
+    if code and (rolls or kg):
+        Location.objects.filter(location_code=code).update(
+            roll_count=F('roll_count') + rolls,
+            total_kg=F('total_kg') + kg,
+        )
+        changes.record([('location', code)])
+
+
+# scan state machine: what may follow the roll's last action
+ALLOWED_NEXT = {
+    None:      ['PUTAWAY','DISPATCH','TRANSFER'],
+    'PUTAWAY': ['DISPATCH','TRANSFER'],
+    'TRANSFER':['PUTAWAY','DISPATCH'],
+    'QA_SCAN': ['PUTAWAY', 'DISPATCH', 'TRANSFER'],
+    # no transitions allowed _from_ DISPATCH
+}
+MOVES_TO_LOCATION = {'PUTAWAY', 'TRANSFER', 'TEMP_STORAGE'}
+CLEARS_LOCATION   = {'DISPATCH'}
+
+
+class ScanRejected(Exception):
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def transition_error(last_action, next_action):
+    """Error dict for an illegal transition, or None if it's allowed."""
+    legal_next = ALLOWED_NEXT.get(last_action, [])
+    if next_action in legal_next:
+        return None
+    return {
+        'action': (
+            f"Invalid transition: cannot do '{next_action}' after "
+            f"'{last_action}'. Allowed: {legal_next or 'none'}."
+        )
+    }
+
+
+def _shift_pair(old, new, kg):
+    """Move one roll's worth of occupancy from ``old`` to ``new`` in one UPDATE."""
+    codes = [c for c in (old, new) if c]
+    if old == new or not codes:
+        return
+    Location.objects.filter(location_code__in=codes).update(
+        roll_count=F('roll_count') + Case(When(location_code=new, then=Value(1)),
+                                          default=Value(-1)),
+        total_kg=F('total_kg') + Case(When(location_code=new, then=Value(kg)),
+                                      default=Value(-kg)),
+    )
+
+
+def commit_scan(roll, action, location=None, customer=None, user='',
+                performed_by_id=None, department_id=None, scanned_at=None):
+    """
+    Record one scan of ``roll``.  Returns ``(transaction, created)``;
+    created is False when it repeats a PUTAWAY to the same rack, which
+    answers with the existing transaction.  Raises ScanRejected.
+
+    ``scanned_at`` is for scans made offline and synced later: one older
+    than the roll's newest recorded scan is refused with status 409, since
+    applying it would rewrite history the floor has already acted on, and
+    so is one past TRANSACTION_RETENTION_DAYS.  Snapshots taken since it
+    was made are amended.
+
+    Statements: lock the roll, insert the transaction, update the roll,
+    shift the counters, log the changes (plus the customer lookup on a
+    dispatch).
+    """
+    outcome = 'error'
+    with metrics.SCAN_SECONDS.time(action=action):
+        try:
+            with _write_turn():
+                tx, created = _commit_scan(roll, action, location, customer, user,
+                                           performed_by_id, department_id, scanned_at)
+            outcome = 'created' if created else 'repeat'
+        except ScanRejected as e:
+            outcome = 'conflict' if e.status == 409 else 'rejected'
+            raise
+        finally:
+            metrics.SCAN_COMMITS.inc(action=action, outcome=outcome)
+    return tx, created
+
+
+_write_queue = threading.Lock()
+
+
+@contextmanager
+def _write_turn():
+    """Wait for this process's turn to write a scan (see the module docstring)."""
+    # inside someone else's transaction we may already hold the write lock
+    if not settings.SCAN_WRITE_QUEUE or transaction.get_connection().in_atomic_block:
+        yield
+        return
+    start = time.perf_counter()
+    if not _write_queue.acquire(timeout=settings.SCAN_WRITE_QUEUE_WAIT):
+        raise OperationalError("database is locked: no turn in the scan write queue")
+    metrics.SCAN_QUEUE_SECONDS.observe(time.perf_counter() - start)
+    try:
+        yield
+    finally:
+        _write_queue.release()
+
+
+def _commit_scan(roll, action, location, customer, user,
+                 performed_by_id, department_id, scanned_at):
+    code = location.location_code if location else None
+    with transaction.atomic():
+        state = (Roll.objects.select_for_update()
+                             .values('current_location_id', 'last_action', 'weight_kg')
+                             .get(pk=roll.pk))
+        last, here = state['last_action'], state['current_location_id']
+
+        if scanned_at is not None:
+            # its month may already be packed into the archive
+            cutoff = timezone.now() - timedelta(days=settings.TRANSACTION_RETENTION_DAYS)
+            if scanned_at < cutoff:
+                raise ScanRejected(
+                    {"detail": f"Offline scan is older than the "
+                               f"{settings.TRANSACTION_RETENTION_DAYS}-day retention window."},
+                    status=409)
+            newer = (Transaction.objects.filter(roll_id=roll.pk, scanned_at__gt=scanned_at)
+                                        .order_by('-scanned_at')
+                                        .values_list('scanned_at', flat=True).first())
+            if newer is not None:
+                raise ScanRejected(
+                    {"detail": f"Roll was scanned again at {newer:%Y-%m-%d %H:%M:%S} "
+                               f"after this offline scan."},
+                    status=409)
+
+        if last == action:
+            # allow idempotent PUTAWAY → same rack
+            if action == 'PUTAWAY' and here and here == code:
+                prev = (Transaction.objects.filter(roll_id=roll.pk)
+                                           .order_by('-scanned_at', '-id').first())
+                if prev is not None:
+                    return prev, False
+            # for everything else, block duplicates
+            if action != 'TRANSFER' or (here and here == code):
+                raise ScanRejected(
+                    {"detail": f"Roll already has action {action} at this location."})
+
+        error = transition_error(last, action)
+        if error:
+            raise ScanRejected(error)
+
+        if isinstance(customer, str):
+            customer, _ = Customer.objects.get_or_create(name=customer)
+        tx = Transaction(
+            roll=roll, action=action, location=location, customer=customer,
+            user=user, performed_by_id=performed_by_id, department_id=department_id,
+            **({'scanned_at': scanned_at} if scanned_at else {}),
+        )
+        tx._change_logged = True        # with the rest, below
+        tx.save(force_insert=True)
+
+        new = code if action in MOVES_TO_LOCATION else None if action in CLEARS_LOCATION else here
+        # queryset update: no Roll signals, the counters are moved right here
+        Roll.objects.filter(pk=roll.pk).update(current_location=new, last_action=action)
+        _shift_pair(here, new, state['weight_kg'] or 0)
+        if scanned_at is not None:
+            # snapshots taken since the scan was made don't have it yet
+            from . import snapshots
+            snapshots.amend(roll.pk, new, action, scanned_at)
+        moved = [('location', here), ('location', new)] if here != new else []
+        changes.record([('transaction', tx.pk), ('roll', roll.roll_id), *moved])
+        transaction.on_commit(lambda: scan_committed.send(
+            sender=Transaction, transaction=tx, old=here, new=new))
+
+    roll.current_location_id = new
+    roll.last_action         = action
+    roll._stored             = (new, state['weight_kg'])
+    return tx, True
+
+
+def move_roll(roll, location):
+    """Put ``roll`` on ``location`` (a Location or None) and save it."""
+    with transaction.atomic():
+        roll.current_location = location
+        roll.save(update_fields=['current_location'])
+
+
+def occupancy(codes=None):
+    """{location_code: (roll_count, total_kg)} straight from the counters."""
+    qs = Location.objects.all()
+    if codes is not None:
+        qs = qs.filter(location_code__in=codes)
+    return {code: (n, kg) for code, n, kg
+            in qs.values_list('location_code', 'roll_count', 'total_kg')}
+
+
+def recount():
+    """Rebuild every counter from the roll table; returns racks that were off."""
+    actual = {
+        row['current_location']: (row['n'], row['kg'] or 0)
+        for row in (Roll.objects.exclude(current_location=None)
+                                .values('current_location')
+                                .annotate(n=Count('id'), kg=Sum('weight_kg')))
+    }
+    fixed = []
+    with transaction.atomic():
+        for loc in Location.objects.select_for_update():
+            n, kg = actual.get(loc.location_code, (0, 0))
+            if loc.roll_count != n or abs(loc.total_kg - kg) > 1e-6:
+                fixed.append(loc.location_code)
+                Location.objects.filter(pk=loc.pk).update(roll_count=n, total_kg=kg)
+        changes.record(('location', code) for code in fixed)
+    return fixed
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Signals
+# ─────────────────────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Roll)
+def _roll_saved(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not TRACKED & set(update_fields):
+        return
+    new = (instance.current_location_id, instance.weight_kg or 0)
+    if created:
+        old = (None, 0)
+    elif hasattr(instance, '_stored'):
+        old = instance._stored
+    else:
+        # saved without being loaded first; we don't know where it was
+        instance._stored = new
+        transaction.on_commit(recount)
+        return
+    instance._stored = new
+    if old == new:
+        return
+    with transaction.atomic():
+        _shift(old[0], -1, -(old[1] or 0))
+        _shift(new[0], +1, new[1])
+
+
+@receiver(post_delete, sender=Roll)
+def _roll_deleted(sender, instance, **kwargs):
+    code, kg = getattr(instance, '_stored',
+                       (instance.current_location_id, instance.weight_kg))
+    _shift(code, -1, -(kg or 0))
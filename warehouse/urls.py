@@ -1,11 +1,12 @@
 from django.urls import path
-from .views import PrintLabelView, LocationScanView, DashboardView, BatchEntryView, MaterialPrintView, PrintSearchView, RollScanView, StoreView, DispatchView, RootRedirectView, UniversalScanView, LocationViewSet  # once you define it
+from .views import PrintLabelView, LocationScanView, DashboardView, DashboardStreamView, BatchEntryView, MaterialPrintView, PrintSearchView, RollScanView, StoreView, DispatchView, RootRedirectView, UniversalScanView, ScanServiceWorkerView, LocationViewSet  # once you define it
 from rest_framework.routers import DefaultRouter
 router = DefaultRouter()
 router.register(r'locations', LocationViewSet, basename='location')
 urlpatterns = [
     path('', RootRedirectView.as_view(), name='root'),
     path('dashboard/',  DashboardView.as_view(),       name='dashboard'),
+    path('dashboard/stream/', DashboardStreamView.as_view(), name='dashboard-stream'),
     path('entry/', BatchEntryView.as_view(), name='material-entry'),
     path('print/',  PrintSearchView.as_view(),     name='material-print-search'),
     path('print/<uuid:roll_id>/', MaterialPrintView.as_view(), name='material-print'),
@@ -16,4 +17,5 @@ urlpatterns = [
     path('scan/dispatch/', DispatchView.as_view(), name='dispatch'),
     path('loc/<str:location_code>/', LocationScanView.as_view(), name='location-scan'),
     path('scan/view/', UniversalScanView.as_view(), name='scan-view'),
+    path('scan-sw.js', ScanServiceWorkerView.as_view(), name='scan-sw'),
 ]
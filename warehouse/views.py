@@ -5,29 +5,40 @@ from rest_framework import viewsets
 from .models import Material, ImportLog, ReconciliationLog, Batch, Customer, Roll, Location, Transaction, Department
 from .serializers import (
     MaterialSerializer, BatchSerializer, CustomerSerializer,
-    RollSerializer, LocationSerializer, TransactionSerializer
+    RollSerializer, LocationSerializer, TransactionSerializer, annotate_last_scan
 )
 from django.conf import settings
-import qrcode, os
 from django.db.models import Q, Max
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.utils.decorators import method_decorator
 
 from django.views.generic import CreateView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from .forms import SignUpForm
 from django.views import View
 from django.contrib import messages
-from .mixins import DeptPermissionMixin
-
-from rest_framework.permissions import IsAuthenticated
+from .mixins import DeptPermissionMixin, ReplicaReadsMixin
+from .access import FULL_ACCESS_GROUPS, get_access
+from . import (archive, autocomplete, changes, dashboard, idempotency, live, metrics, qr,
+               refdata, scan_api, search, snapshots, stock)
+from django.db import DatabaseError, transaction as db_transaction
+from .pagination import KeysetPaginator
+from .middleware import stats as profiling_stats
+
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.authentication import SessionAuthentication
-import pandas as pd
 
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.views import APIView
+from django.http import HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from datetime import datetime, time, timedelta
+from time import perf_counter
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 
 class MaterialViewSet(viewsets.ModelViewSet):
@@ -52,7 +63,7 @@ class LocationViewSet(viewsets.ModelViewSet):
     def rolls(self, request, *args, **kwargs):
         loc = self.get_object()
         # all rolls currently at this rack
-        qs = Roll.objects.filter(current_location=loc)
+        qs = annotate_last_scan(Roll.objects.filter(current_location=loc)).order_by('id')
         page = self.paginate_queryset(qs)
         if page is not None:
             ser = RollSerializer(page, many=True, context={'request': request})
@@ -64,54 +75,223 @@ class LocationViewSet(viewsets.ModelViewSet):
 class TransactionViewSet(viewsets.ModelViewSet):
     authentication_classes = [SessionAuthentication]
     permission_classes     = [IsAuthenticated]
-    queryset               = Transaction.objects.all().order_by('-scanned_at')
+    # roll for its roll_id, customer for its name (location comes from refdata)
+    queryset               = (Transaction.objects.select_related('roll', 'customer')
+                                                 .order_by('-scanned_at'))
     serializer_class       = TransactionSerializer
+    # scans are only recorded (create, sync) through stock.commit_scan; an
+    # edit or delete here would leave the roll's state and counters behind
+    http_method_names      = ['get', 'post', 'head', 'options']
 
     def create(self, request, *args, **kwargs):
-        roll_id  = request.data.get('roll')
-        action   = request.data.get('action')
-        loc_code = request.data.get('location')  # may be None
-
-        # 1) Validate roll exists
-        roll = get_object_or_404(Roll, roll_id=roll_id)
-
-        # 2) Check last tx
-        last = (
-            Transaction.objects
-            .filter(roll=roll)
-            .order_by('-scanned_at')
-            .first()
-        )
+        # Idempotency-Key retries and de-dup window: same path as scan_api.commit
+        key = request.headers.get('Idempotency-Key', '').strip()[:100]
+        status_code, body, replayed = scan_api.submit_scan(request.data, get_access(request), key)
+        if replayed:
+            headers = {idempotency.REPLAY_HEADER: 'true'}
+        else:
+            headers = self.get_success_headers(body) if status_code == 201 else None
+        return Response(body, status=status_code, headers=headers)
 
-        if last and last.action == action:
-            # allow idempotent PUTAWAY → same rack
-            if action == 'PUTAWAY' and last.location and last.location.location_code == loc_code:
-                # return the existing tx data as a 200 OK
-                ser = self.get_serializer(last)
-                return Response(ser.data, status=200)
+    def get_serializer_context(self):
+        ctx = super().get_serializer_context()
+        ctx['commit_scan'] = self.action in ('create', 'sync')
+        return ctx
 
-            # for everything else, block duplicates
-            if action != 'TRANSFER' or (last.location and last.location.location_code == loc_code):
-                return Response(
-                    {"detail": f"Roll already has action {action} at this location."},
-                    status=400
-                )
+    # ── offline queue upload ────────────────────────────────────────────
+    sync_batch_limit = 200
+
+    @action(detail=False, methods=['post'], url_path='sync')
+    def sync(self, request):
+        """
+        POST /api/transactions/sync/
+        {"scans": [{"id", "roll", "action", "location", "customer", "user", "scanned_at"}, …]}
+
+        Scans the handheld queued while it had no signal.  They're applied
+        oldest first, each on its own, and every one gets an outcome:
+        applied | duplicate | conflict | rejected | invalid | retry.
+        Only "retry" should stay in the client's queue.  The scan id is an
+        idempotency key, so uploading the same batch twice is harmless.
+        """
+        scans = request.data.get('scans')
+        if not isinstance(scans, list):
+            return Response({"detail": "Expected {\"scans\": [...]}."}, status=400)
+        if len(scans) > self.sync_batch_limit:
+            return Response({"detail": f"At most {self.sync_batch_limit} scans per sync."},
+                            status=400)
+
+        access, now = get_access(request), timezone.now()
+        parsed = [self._sync_parse(scan, now) for scan in scans]
+        order = sorted(range(len(parsed)),
+                       key=lambda i: (parsed[i][1] is None, parsed[i][1] or now, i))
+        results = [None] * len(parsed)
+        for i in order:
+            results[i] = self._sync_one(request, access, scans[i], *parsed[i])
+        return Response({'results': results})
+
+    @staticmethod
+    def _sync_parse(scan, now):
+        """``(id, scanned_at, error)`` for one queued scan."""
+        if not isinstance(scan, dict) or not str(scan.get('id') or '').strip():
+            return None, None, "Each scan needs an id."
+        scan_id = str(scan['id']).strip()[:100]
+        try:
+            when = parse_datetime(str(scan.get('scanned_at') or ''))
+        except ValueError:
+            when = None
+        if when is None:
+            return scan_id, None, "scanned_at must be an ISO datetime."
+        if timezone.is_naive(when):
+            when = timezone.make_aware(when)
+        # a handheld clock running fast can't put scans in the future
+        return scan_id, min(when, now), None
+
+    def _sync_one(self, request, access, scan, scan_id, when, error):
+        if error:
+            return {'id': scan_id, 'status': 'invalid', 'http_status': 400,
+                    'errors': {'detail': error}}
+        try:
+            record, replay = idempotency.begin(
+                request.user.pk, f'sync:{scan_id}', idempotency.fingerprint(scan))
+        except idempotency.KeyConflict as e:
+            return {'id': scan_id, 'status': 'conflict', 'http_status': 409,
+                    'errors': {'detail': str(e)}}
+        if replay:
+            return dict(replay[1], replayed=True)
 
-        # 3) Otherwise fall back to normal create
-        return super().create(request, *args, **kwargs)
+        try:
+            outcome = self._sync_apply(scan, scan_id, when, access)
+        except DatabaseError:
+            idempotency.abandon(record)
+            return {'id': scan_id, 'status': 'retry', 'http_status': 503,
+                    'errors': {'detail': "Database busy, send it again."}}
+        idempotency.finish(record, outcome['http_status'], outcome)
+        return outcome
+
+    def _sync_apply(self, scan, scan_id, when, access):
+        payload = {k: v for k, v in scan.items() if k not in ('id', 'scanned_at')}
+        serializer = self.get_serializer(data=payload)
+        if not serializer.is_valid():
+            return {'id': scan_id, 'status': 'invalid', 'http_status': 400,
+                    'errors': serializer.errors}
+        data = serializer.validated_data
+        try:
+            tx, created = stock.commit_scan(
+                data['roll'], data['action'],
+                location=data.get('location'),
+                customer=data.get('customer'),
+                user=data['user'],
+                performed_by_id=access.user_id,
+                department_id=access.department_id,
+                scanned_at=when,
+            )
+        except stock.ScanRejected as e:
+            return {'id': scan_id, 'http_status': e.status, 'errors': e.detail,
+                    'status': 'conflict' if e.status == 409 else 'rejected'}
+        return {'id': scan_id, 'status': 'applied' if created else 'duplicate',
+                'http_status': 201 if created else 200,
+                'transaction': self.get_serializer(tx).data}
+
+class AutocompleteView(APIView):
+    """
+    GET /api/autocomplete/<kind>/?q=<prefix>&limit=10
+    kind: materials | batches | customers | locations
+    Served from the in‑memory prefix indexes (see autocomplete.py), scoped
+    to the user's departments like DeptPermissionMixin.scope_queryset.
+    """
+    authentication_classes = [SessionAuthentication]
+    permission_classes     = [IsAuthenticated]
 
-    def perform_create(self, serializer):
-        # actually save the new Transaction
-        tx = serializer.save()
-
-        # update the Roll.current_location
-        roll = tx.roll
-        if tx.action in ('PUTAWAY', 'TRANSFER', 'TEMP_STORAGE'):
-            roll.current_location = tx.location.location_code
-        elif tx.action == 'DISPATCH':
-            roll.current_location = None
-        # for QA_SCAN or others, leave as‑is
-        roll.save(update_fields=['current_location'])
+    def get(self, request, kind):
+        if kind not in autocomplete.INDEXES:
+            return Response({"detail": f"Unknown list '{kind}'."}, status=404)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+        except ValueError:
+            limit = 10
+        q = request.query_params.get('q', '')
+        access = get_access(request)
+        departments = None
+        if not access.has_full_access:
+            departments = {dept.pk for dept in map(refdata.department, access.allowed_departments)
+                           if dept is not None}
+        return Response({'results': autocomplete.suggest(kind, q, limit, departments)})
+
+class StockAsOfView(APIView):
+    """
+    GET /api/stock/as-of/?at=<ISO date or datetime>&location=<code>
+    Rolls in stock at that moment, from the nearest StockSnapshot plus the
+    scans after it (see snapshots.py).
+    """
+    authentication_classes = [SessionAuthentication]
+    permission_classes     = [IsAuthenticated]
+
+    def get(self, request):
+        raw = request.query_params.get('at', '').strip()
+        try:
+            when = parse_datetime(raw)      # a bare date parses as its midnight
+        except ValueError:
+            when = None
+        if not when:
+            return Response({"detail": "Pass ?at= as an ISO date or datetime."}, status=400)
+        if timezone.is_naive(when):
+            when = timezone.make_aware(when)
+
+        location = request.query_params.get('location') or None
+        rows, meta = snapshots.stock_as_of(when, location)
+        return Response(dict(meta, location=location, count=len(rows), results=rows))
+
+class ChangesView(APIView):
+    """
+    GET /api/changes/?since=<cursor>&limit=500
+    Rolls, locations and scans changed after ``since``, latest state only,
+    plus the cursor to pass next time (see changes.py).  Start from 0; a
+    410 means the log no longer goes back that far: reload the full lists
+    and carry on from the ``cursor`` in the 410 body.
+    """
+    authentication_classes = [SessionAuthentication]
+    permission_classes     = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            cursor = max(0, int(request.query_params.get('since', 0)))
+            limit  = max(1, min(int(request.query_params.get('limit', 500)), 5000))
+        except ValueError:
+            return Response({"detail": "since and limit must be integers."}, status=400)
+        try:
+            return Response(changes.since(cursor, limit))
+        except changes.CursorExpired as e:
+            return Response({"detail": "Cursor too old, resync required.", "cursor": e.head},
+                            status=410)
+
+class ProfilingStatsView(APIView):
+    """
+    GET /api/profiling/   (staff)
+    Recent request timings per view in this process, slowest p95 first
+    (see ProfilingMiddleware).  DELETE starts a fresh window.
+    """
+    authentication_classes = [SessionAuthentication]
+    permission_classes     = [IsAdminUser]
+
+    def get(self, request):
+        return Response({'window': profiling_stats.window, 'results': profiling_stats.table()})
+
+    def delete(self, request):
+        profiling_stats.clear()
+        return Response(status=204)
+
+class MetricsView(View):
+    """
+    GET /metrics
+    Prometheus text format (see metrics.py).  Scrapers send
+    ``Authorization: Bearer <METRICS_TOKEN>``; staff can also just open it.
+    """
+    def get(self, request):
+        token = settings.METRICS_TOKEN
+        bearer = request.headers.get('Authorization', '') == f'Bearer {token}'
+        if not ((token and bearer) or request.user.is_staff):
+            return HttpResponse(status=403)
+        return HttpResponse(metrics.expose(), content_type=metrics.CONTENT_TYPE)
 
 class RollViewSet(viewsets.ModelViewSet):
     queryset = Roll.objects.all()
@@ -120,21 +300,34 @@ class RollViewSet(viewsets.ModelViewSet):
     lookup_field = 'roll_id'
     lookup_value_regex = '[0-9a-f\\-]+'  # to match a UUID
 
+    def get_queryset(self):
+        # status / posting date / dispatch customer without queries per roll
+        return annotate_last_scan(super().get_queryset())
+
     def perform_create(self, serializer):
         # 1) Save the roll record to get its roll_id
         roll = serializer.save()
 
-        # 2) Build the short‑link payload
-        url = f"{settings.SITE_URL}/r/{roll.roll_id}"
+        # 2) QR of its short link under MEDIA_ROOT/qrcodes/{roll_id}.png
+        qr.save_roll_qr(roll.roll_id)
 
-        # 3) Generate the QR image
-        img = qrcode.make(url)
+    def retrieve(self, request, *args, **kwargs):
+        # what a scanner asks before every scan
+        with metrics.ROLL_VERIFY.time(api='rest', result='missing') as labels:
+            response = super().retrieve(request, *args, **kwargs)
+            labels['result'] = 'found'
+        return response
 
-        # 4) Save it under MEDIA_ROOT/qrcodes/{roll_id}.png
-        qr_dir = os.path.join(settings.MEDIA_ROOT, 'qrcodes')
-        os.makedirs(qr_dir, exist_ok=True)
-        path = os.path.join(qr_dir, f"{roll.roll_id}.png")
-        img.save(path)
+    @action(detail=True, methods=['get'], url_path='history')
+    def history(self, request, *args, **kwargs):
+        # every scan of the roll, archived ones included, newest first
+        roll = self.get_object()
+        data = [
+            dict(TransactionSerializer(tx, context={'request': request}).data,
+                 archived=tx.archived)
+            for tx in archive.history(roll)
+        ]
+        return Response(data)
 
 
 
@@ -217,6 +410,8 @@ class BatchEntryView(DeptPermissionMixin, FormView):
 
         # 1) file‐upload branch
         if cd['data_file']:
+            # pandas costs ~0.3 s to import: only when a sheet comes in
+            import pandas as pd
             f   = cd['data_file']
             ext = f.name.rsplit('.',1)[-1].lower()
             df  = pd.read_excel(f) if ext in ['xls','xlsx'] else pd.read_csv(f)
@@ -254,9 +449,10 @@ class BatchEntryView(DeptPermissionMixin, FormView):
             })
 
         # 2b) Permission check: same as before
-        user = self.request.user
-        if not user.groups.filter(name__in=['Factory Admin','Forklift Driver']).exists():
-            user_dept = user.profile.department.code
+        user   = self.request.user
+        access = get_access(self.request)
+        if not access.in_group(*FULL_ACCESS_GROUPS):
+            user_dept = access.department_code
             for data in rows:
                 if data.get('department') != user_dept:
                     form.add_error(
@@ -271,9 +467,11 @@ class BatchEntryView(DeptPermissionMixin, FormView):
         skipped = []
 
         # 3) Process every row
+        started = perf_counter()
         for data in rows:
-            from .models import Department
-            dept_obj = Department.objects.get(code=data['department'])
+            dept_obj = refdata.department(data['department'])
+            if dept_obj is None:
+                raise Department.DoesNotExist(data['department'])
 
             mat, _ = Material.objects.get_or_create(
                 material_number=data['material_number'],
@@ -301,13 +499,16 @@ class BatchEntryView(DeptPermissionMixin, FormView):
                 weight_kg=data['weight_kg'],
                 customer=cust
             )
-            url   = f"{settings.SITE_URL}/r/{roll.roll_id}"
-            img   = qrcode.make(url)
-            qrdir = os.path.join(settings.MEDIA_ROOT, 'qrcodes')
-            os.makedirs(qrdir, exist_ok=True)
-            img.save(os.path.join(qrdir, f"{roll.roll_id}.png"))
+            qr.save_roll_qr(roll.roll_id)
             created.append(roll)
 
+        elapsed = perf_counter() - started
+        metrics.IMPORT_SECONDS.observe(elapsed)
+        metrics.IMPORT_ROWS.inc(len(created), result='imported')
+        metrics.IMPORT_ROWS.inc(len(skipped), result='skipped')
+        if elapsed:
+            metrics.IMPORT_RATE.set(len(rows) / elapsed)
+
         # 4) Persist an ImportLog for audit
         ImportLog.objects.create(
             total_rows = len(rows),
@@ -473,38 +674,63 @@ from django.views.generic import ListView
 
 
 
-class PrintSearchView(DeptPermissionMixin, ListView):
+def _parse_day(value):
+    try:
+        return parse_date(value.strip())
+    except ValueError:          # well-formed but impossible, e.g. 2025-02-30
+        return None
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class PrintSearchView(ReplicaReadsMixin, DeptPermissionMixin, ListView):
     model               = Roll
     template_name       = 'warehouse/material_search.html'
     context_object_name = 'rolls'
     paginate_by         = 20
+    keyset_ordering     = ('-batch__created_at', '-id')
+
+    def paginate_queryset(self, queryset, page_size):
+        # ?page=N and relevance ordering keep classic OFFSET paging;
+        # everything else pages by cursor with no COUNT/OFFSET per page
+        if 'page' in self.request.GET or self.request.GET.get('sort') == 'relevance':
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(
+            queryset, page_size, self.keyset_ordering,
+            total_ttl=getattr(settings, 'PRINT_SEARCH_TOTAL_TTL', 60),
+        )
+        page = paginator.page(self.request.GET.get('cursor'))
+        return (paginator, page, page.object_list, page.has_other_pages())
 
     def get_queryset(self):
-        user = self.request.user
+        access = get_access(self.request)
 #        print(f"[DEBUG] PrintSearchView: user={user.username!r}, groups={list(user.groups.values_list('name', flat=True))!r}")
 
-        # 1) Let the mixin already have scoped `qs` to the user's department(s)
-        qs = super().get_queryset().order_by('-batch__created_at')
+        # 1) The mixin scopes `qs` to the user's department(s)
+        qs = (super().get_queryset()
+              .select_related('batch__material')
+              .order_by('-batch__created_at', '-id'))
 
         # 2) Date range filters
-        df = self.request.GET.get('date_from','').strip()
-        dt = self.request.GET.get('date_to',  '').strip()
+        #    (as a datetime range, so batch_created_idx can be used)
+        df = _parse_day(self.request.GET.get('date_from',''))
+        dt = _parse_day(self.request.GET.get('date_to',  ''))
         if df:
-            qs = qs.filter(batch__created_at__date__gte=df)
+            qs = qs.filter(batch__created_at__gte=_day_start(df))
         if dt:
-            qs = qs.filter(batch__created_at__date__lte=dt)
+            qs = qs.filter(batch__created_at__lt=_day_start(dt + timedelta(days=1)))
 
-        # 3) Free‑text search
+        # 3) Free‑text search (FTS index where available, see search.py)
         q = self.request.GET.get('q','').strip()
         if q:
-            qs = qs.filter(
-                Q(batch__material__material_number__icontains=q) |
-                Q(batch__batch_number__icontains=q)                |
-                Q(batch__material__description__icontains=q)
-            )
+            qs = search.search_rolls(qs, q)
+            if self.request.GET.get('sort') == 'relevance':
+                qs = search.rank_rolls(qs, q)
 
         # 4) Admin override: allow Factory Admin & superuser to add ?dept=XX
-        if user.is_superuser or user.groups.filter(name='Factory Admin').exists():
+        if access.is_admin:
             dept = self.request.GET.get('dept','').upper().strip()
             if dept:
                 print(f"[DEBUG] Admin override: filtering dept={dept!r}")
@@ -515,23 +741,32 @@ class PrintSearchView(DeptPermissionMixin, ListView):
 
     def get_context_data(self, **ctx):
         ctx = super().get_context_data(**ctx)
-        user = self.request.user
+        access = get_access(self.request)
 
         # echo back filter values
         ctx['search_query'] = self.request.GET.get('q','')
         ctx['date_from']    = self.request.GET.get('date_from','')
         ctx['date_to']      = self.request.GET.get('date_to','')
+        ctx['sort']         = self.request.GET.get('sort','')
+        ctx['keyset']       = isinstance(ctx.get('paginator'), KeysetPaginator)
+        ctx['base_query']   = self._query_without('page', 'cursor')
 
         # only superuser/Factory Admin sees the dept dropdown
-        if user.is_superuser or user.groups.filter(name='Factory Admin').exists():
-            ctx['departments']   = Department.objects.order_by('name')
+        if access.is_admin:
+            ctx['departments']   = refdata.departments(order_by='name')
             ctx['selected_dept'] = self.request.GET.get('dept','').upper().strip()
         else:
             ctx['departments']   = None
-            ctx['selected_dept'] = user.profile.department.code
+            ctx['selected_dept'] = access.department_code
 
         return ctx
 
+    def _query_without(self, *keys):
+        params = self.request.GET.copy()
+        for key in keys:
+            params.pop(key, None)
+        return params.urlencode()
+
 
 
 
@@ -578,17 +813,34 @@ class DispatchView(DeptPermissionMixin, TemplateView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         # supply the dropdown list of all departments
-        ctx['departments'] = Department.objects.order_by('code')
+        ctx['departments'] = refdata.departments()
         return ctx
 
 
+class ScanServiceWorkerView(TemplateView):
+    """
+    The scan pages' service worker.  Served from the site root rather than
+    /static/ so its scope covers /scan/; see templates/mobile/scan-sw.js.
+    """
+    template_name = 'mobile/scan-sw.js'
+    content_type  = 'application/javascript'
+
+
 # Dashboard for Managers & Stock Keepers
 
 
 
 from django.db.models import Max, Q
 
-class DashboardView(DeptPermissionMixin, TemplateView):
+def _grid_cell(code):
+    """(row, column) of a rack on the dashboard grid, or None if it has none."""
+    loc = refdata.location(code)
+    if loc is None or not loc.row or not loc.column.isdigit():
+        return None
+    return loc.row, int(loc.column)
+
+
+class DashboardView(ReplicaReadsMixin, DeptPermissionMixin, TemplateView):
     template_name = 'warehouse/dashboard.html'
     allowed_roles = [
         'Factory Admin',
@@ -597,84 +849,40 @@ class DashboardView(DeptPermissionMixin, TemplateView):
     ]
 
     def get_context_data(self, **kwargs):
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
+        with metrics.DASHBOARD_SECONDS.time(view='page'):
+            return self._build_context(super().get_context_data(**kwargs))
 
-
-        ctx = super().get_context_data(**kwargs)
-
-        user = self.request.user
-        is_admin = user.groups.filter(name='Factory Admin').exists()
+    def _build_context(self, ctx):
+        access = get_access(self.request)
+        is_admin = access.in_group('Factory Admin')
 
         # Determine effective department filter:
         if is_admin:
             selected_dept = self.request.GET.get('dept', '').upper().strip()
         else:
             # non-admins are locked to their own department
-            selected_dept = getattr(getattr(user, 'profile', None), 'department', None)
-            selected_dept = selected_dept.code if selected_dept else ''
-        # --- summary cards logic with dept scoping ---
-        # Produced: rolls whose material was created/registered by that department
-        produced_qs = Roll.objects.all()
-        if selected_dept:
-            produced_qs = produced_qs.filter(batch__material__department__code=selected_dept)
-        produced = produced_qs.count()
-
-        # Stored: PUTAWAYs into locations prefixed by the department code
-        stored_qs = Transaction.objects.filter(action='PUTAWAY')
-        if selected_dept:
-            stored_qs = stored_qs.filter(location__location_code__startswith=selected_dept)
-        stored = stored_qs.values('roll').distinct().count()
-
-        # Dispatched: dispatches performed by users of that department
-        # Dispatched: dispatches performed by users of that department
-        dispatched_qs = Transaction.objects.filter(action='DISPATCH')
-        if selected_dept:
-            # get usernames of users who belong to that department
-            dept_usernames = list(
-                User.objects.filter(profile__department__code=selected_dept)
-                            .values_list('username', flat=True)
-            )
-            dispatched_qs = dispatched_qs.filter(user__in=dept_usernames)
-        dispatched = dispatched_qs.values('roll').distinct().count()
-
-
-        pending_storage = produced - stored
-        pending_dispatch = stored - dispatched
+            selected_dept = access.department_code
+        # --- summary cards with dept scoping (shared with the live push) ---
+        cards = dashboard.cards(selected_dept)
 
         # Build latest transaction per roll (then scope for grid visibility)
         latest = Transaction.objects.values('roll').annotate(last_ts=Max('scanned_at'))
         latest_txs = Transaction.objects.filter(
             scanned_at__in=[l['last_ts'] for l in latest]
-        )
+        ).select_related('location', 'roll__batch__material')
 
         # Apply department-level visibility to latest_txs for the grid
+        # (admins without ?dept= see everything; everyone else is locked
+        #  to selected_dept, their own department)
         if selected_dept:
-            if is_admin:
-                if selected_dept:
-                    dept_usernames = list(
-                        User.objects.filter(profile__department__code=selected_dept)
-                                    .values_list('username', flat=True)
-                    )
-                    latest_txs = latest_txs.filter(
-                        Q(location__location_code__startswith=selected_dept) |
-                        (Q(action='DISPATCH') & Q(user__in=dept_usernames))
-                    )
-             # else: no dept filter for admin → leave latest_txs as-is
-            else:
-                # non-admin: lock to their own department
-                dept_usernames = list(
-                    User.objects.filter(profile__department__code=selected_dept)
-                                .values_list('username', flat=True)
-                )
-                latest_txs = latest_txs.filter(
-                    Q(location__location_code__startswith=selected_dept) |
-                    (Q(action='DISPATCH') & Q(user__in=dept_usernames))
-                )
+            latest_txs = latest_txs.filter(
+                Q(location__location_code__startswith=selected_dept) |
+                (Q(action='DISPATCH') & Q(department__code=selected_dept))
+            )
 
 
         # build location map from the filtered latest_txs
-        location_map = {loc.location_code: [] for loc in Location.objects.all()}
+        location_map = {loc.location_code: [] for loc in refdata.locations()}
         location_map['DISPATCHED'] = []
         for tx in latest_txs:
             key = tx.location.location_code if tx.location else 'DISPATCHED'
@@ -684,19 +892,11 @@ class DashboardView(DeptPermissionMixin, TemplateView):
                 'posting_date':     tx.scanned_at,
             })
 
-        cards = [
-            {'label':'Produced',        'count':produced,        'bg':'#cce5ff'},
-            {'label':'Stored',          'count':stored,          'bg':'#d4edda'},
-            {'label':'Dispatched',      'count':dispatched,      'bg':'#f8d7da'},
-            {'label':'Pending Storage', 'count':pending_storage, 'bg':'#fff3cd'},
-            {'label':'Pending Dispatch','count':pending_dispatch,'bg':'#e2e3e5'},
-        ]
-
         # flatten to list of tuples for any-dept view
         full_locations = list(location_map.items())
 
         # department picker + grid setup
-        all_depts     = Department.objects.order_by('code')
+        all_depts     = refdata.departments()
         # selected_dept already determined above; for filtering the grid:
         if selected_dept:
             filtered = [
@@ -707,17 +907,17 @@ class DashboardView(DeptPermissionMixin, TemplateView):
         else:
             filtered = full_locations
 
-        # build rows/cols with minimum 2 logic (unchanged)
-        real_rows = sorted({
-            loc[2]
+        # grid position comes from the Location row, not the code's spelling
+        cells = {
+            loc: _grid_cell(loc)
             for loc, _ in filtered
             if loc != 'DISPATCHED'
-        })
-        real_cols = sorted({
-            int(loc[-2:])
-            for loc, _ in filtered
-            if loc != 'DISPATCHED'
-        })
+        }
+        cells = {loc: rc for loc, rc in cells.items() if rc}
+
+        # build rows/cols with minimum 2 logic (unchanged)
+        real_rows = sorted({r for r, _ in cells.values()})
+        real_cols = sorted({c for _, c in cells.values()})
 
         rows = real_rows[:]
         if not rows:
@@ -731,17 +931,16 @@ class DashboardView(DeptPermissionMixin, TemplateView):
         elif len(cols) == 1:
             cols.append(cols[0] + 1)
 
-        cell_map = {}
+        cell_map, cell_code = {}, {}
         for loc, entries in filtered:
-            if loc == 'DISPATCHED':
-                continue
-            r = loc[2]
-            c = int(loc[-2:])
-            cell_map.setdefault((r,c), []).extend(entries)
+            if loc in cells:
+                cell_map.setdefault(cells[loc], []).extend(entries)
+                cell_code[cells[loc]] = loc
 
+        # (location code, entries) per cell; the code lets live updates find it
         grid_matrix = []
         for r in rows:
-            row_cells = [ cell_map.get((r,c), []) for c in cols ]
+            row_cells = [ (cell_code.get((r,c), ''), cell_map.get((r,c), [])) for c in cols ]
             grid_matrix.append((r, row_cells))
 
         ctx.update({
@@ -749,10 +948,14 @@ class DashboardView(DeptPermissionMixin, TemplateView):
             'departments':   all_depts,
             'selected_dept': selected_dept,
             'is_admin':      is_admin,
+            'access':        access,
             'grid_cols':     cols,
             'grid_matrix':   grid_matrix,
             'real_row_count': len(real_rows),
             'real_col_count': len(real_cols),
+            'live_url':      reverse('dashboard-stream') + (f'?dept={selected_dept}' if selected_dept else ''),
+            # where the polling fallback starts reading the change feed
+            'changes_cursor': changes.head(),
         })
 
         # reconciliation log (unchanged)
@@ -769,6 +972,30 @@ class DashboardView(DeptPermissionMixin, TemplateView):
 
 
 
+class DashboardStreamView(DeptPermissionMixin, View):
+    """
+    GET /dashboard/stream/?dept=<code>
+    Server-Sent Events for an open dashboard: card counts and changed rack
+    cells after each scan (see live.py).  Same scoping as DashboardView.
+    ASGI only: under WSGI it answers 204 and the page polls the change feed.
+    """
+    allowed_roles = DashboardView.allowed_roles
+
+    def get(self, request):
+        access = get_access(request)
+        if access.in_group('Factory Admin'):
+            scope = request.GET.get('dept', '').upper().strip()
+        else:
+            scope = access.department_code
+        if not isinstance(request, ASGIRequest):
+            # would tie up a WSGI worker thread for as long as the tab is open
+            return HttpResponse(status=204)
+        response = StreamingHttpResponse(live.astream(scope), content_type='text/event-stream')
+        response['Cache-Control']     = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'      # nginx: don't hold events back
+        return response
+
+
 # Location
 
 
@@ -781,6 +1008,7 @@ class LocationScanView(TemplateView):
         # show rolls at this location
         latest = (Transaction.objects
                   .filter(location=loc, action='PUTAWAY')
+                  .select_related('roll')
                   .order_by('-scanned_at'))
         # you can dedupe/scoped as you like
         ctx.update({
@@ -817,7 +1045,7 @@ class RootRedirectView(View):
             return redirect('login')
         if request.user.is_superuser:
             return redirect('dashboard')
-        grp = {g.name for g in request.user.groups.all()}
+        grp = get_access(request).groups
         if 'Factory Admin' in grp or 'Plant Manager' in grp or 'Stock Keeper' in grp:
             return redirect('dashboard')
         if 'Operator' in grp: